@@ -1,8 +1,9 @@
 let selectedTitle = "";
 let finalIdea = "";
 let scriptText = "";
-let audioFilename = ""; // This will now store paths like "assets/audio_local/voiceover_....mp3"
+let audioFilename = ""; // This will now store paths like "assets/audio_local/voiceover_....wav"
 let lastGeneratedVideoPath = ""; // NEW: To store the path of the last generated video
+let lastVideoJob = null; // { id, idea } of the last render, so re-rendering the same idea only re-encodes what changed
 
 function setStageActive(stageId) {
     document.querySelectorAll(".stage").forEach(el => el.classList.remove("active"));
@@ -121,32 +122,50 @@ async function generateIdeaVariations() {
     }
 }
 
-async function generateScript() {
+// Streams the script over server-sent events so text appears as soon as the first tokens arrive.
+// regenerate=true skips the server's LLM response cache and asks for a fresh script
+function generateScript(regenerate = false) {
     if (!finalIdea) return alert("Please select an idea first.");
     setStageActive("stage-script");
 
-    // Add loader
     const loader = document.getElementById("loader");
     loader.textContent = "✍️ Generating script...";
     loader.style.display = "block";
 
-    const res = await fetch("/generate_script", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ idea: finalIdea })
-    });
+    const preview = document.getElementById("scriptPreview");
+    preview.value = "";
+    scriptText = "";
 
-    loader.style.display = "none"; // Hide loader
+    const params = new URLSearchParams({ idea: finalIdea, regenerate: regenerate ? "1" : "0" });
+    const source = new EventSource(`/generate_script_stream?${params}`);
+    let started = false;
 
-    if (!res.ok) {
-        const errorData = await res.json();
-        return alert(`Failed to generate script: ${errorData.error || res.statusText}`);
-    }
+    source.onmessage = (event) => {
+        const data = JSON.parse(event.data);
+        if (!started) {
+            started = true;
+            loader.style.display = "none";
+            setStageActive("stage-audio");
+        }
+        preview.value += data.token;
+        preview.scrollTop = preview.scrollHeight;
+    };
+
+    source.addEventListener("done", (event) => {
+        source.close();
+        loader.style.display = "none";
+        scriptText = JSON.parse(event.data).script;
+        preview.value = scriptText;
+        setStageActive("stage-audio");
+    });
 
-    const data = await res.json();
-    scriptText = data.script;
-    document.getElementById("scriptPreview").value = scriptText;
-    setStageActive("stage-audio");
+    source.addEventListener("error", (event) => {
+        source.close();
+        loader.style.display = "none";
+        // Named 'error' events carry a message; plain connection errors do not
+        const message = event.data ? JSON.parse(event.data).error : "connection lost";
+        alert(`Failed to generate script: ${message}`);
+    });
 }
 
 async function generateAudio() {
@@ -189,6 +208,41 @@ async function generateAudio() {
     }
 }
 
+const STAGE_LABELS = {
+    queued: "⏳ Waiting for a free render worker...",
+    transcribing: "📝 Transcribing audio...",
+    fetching_background: "🌄 Fetching background video...",
+    encoding: "🎥 Encoding video...",
+    uploading: "📤 Uploading video...",
+    waiting_quota: "⏳ Daily YouTube quota used up, upload will start after the reset...",
+    thumbnail: "🖼️ Setting thumbnail..."
+};
+
+function sleep(ms) {
+    return new Promise(resolve => setTimeout(resolve, ms));
+}
+
+// Polls /jobs/<id> until the job finishes, showing stage, percent and ETA in the loader.
+async function pollJob(statusUrl, loader) {
+    while (true) {
+        const res = await fetch(statusUrl);
+        if (!res.ok) {
+            const errorData = await res.json();
+            throw new Error(errorData.error || res.statusText);
+        }
+        const job = await res.json();
+        if (job.status === "completed") return job.result;
+        if (job.status === "failed") throw new Error(job.error || "Job failed");
+
+        let text = STAGE_LABELS[job.stage] || `⚙️ ${job.stage}...`;
+        if (job.progress > 0) text += ` ${job.progress.toFixed(0)}%`;
+        if (job.eta_seconds) text += ` (about ${Math.ceil(job.eta_seconds)}s left)`;
+        loader.textContent = text;
+
+        await sleep(1000);
+    }
+}
+
 async function generateVideo() {
     setStageActive("stage-video");
 
@@ -201,23 +255,40 @@ async function generateVideo() {
     videoPlayer.style.display = "none";
     downloadLink.style.display = "none";
 
+    const body = {
+        script: scriptText,
+        audio_path: audioFilename,
+        profile: document.getElementById("profileSelector").value
+    };
+    if (lastVideoJob && lastVideoJob.idea === finalIdea) {
+        // Edit-and-rerender: only segments whose script or subtitles changed are re-encoded. A first
+        // render takes the faster single-pass path instead of paying for segments and a concat.
+        body.incremental = true;
+        body.base_job = lastVideoJob.id;
+    }
     const res = await fetch("/generate_video", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({
-            script: scriptText,
-            audio_path: audioFilename
-        })
+        body: JSON.stringify(body)
     });
 
-    loader.style.display = "none";
-
     if (!res.ok) {
+        loader.style.display = "none";
         const errorData = await res.json();
         return alert(`Failed to generate video: ${errorData.error || res.statusText}`);
     }
 
-    const data = await res.json();
+    const { job_id, status_url } = await res.json();
+    let data;
+    try {
+        data = await pollJob(status_url, loader);
+        lastVideoJob = { id: job_id, idea: finalIdea };
+    } catch (e) {
+        loader.style.display = "none";
+        return alert(`Failed to generate video: ${e.message}`);
+    }
+
+    loader.style.display = "none";
     const videoPath = data.video_path;
 
     if (videoPath) {
@@ -306,22 +377,31 @@ async function uploadVideo() {
         })
     });
     
-    loader.style.display = "none";
-
     const uploadSuccessDiv = document.getElementById("uploadSuccess");
     uploadSuccessDiv.style.display = "none"; // Hide initially in case of re-upload
     uploadSuccessDiv.style.removeProperty("color"); // Reset color
 
     if (!res.ok) {
+        loader.style.display = "none";
         const errorData = await res.json();
-        uploadSuccessDiv.innerHTML = `❌ Failed to upload video: ${errorData.error || res.statusText}`;
+        uploadSuccessDiv.innerHTML = `❌ Failed to upload video: ${errorData.error || errorData.message || res.statusText}`;
         uploadSuccessDiv.style.color = "#FF4444"; // Red for error
         uploadSuccessDiv.style.display = "block";
         return; // Stop execution on error
     }
 
-    const data = await res.json();
-    if (data.status === "uploaded" && data.video_id) {
+    // The upload waits in the persistent upload queue; poll it for quota holds and chunk progress
+    const { job_id, status_url } = await res.json();
+    let data;
+    try {
+        data = await pollJob(status_url, loader);
+        lastVideoJob = { id: job_id, idea: finalIdea };
+    } catch (err) {
+        data = { message: err.message };
+    }
+    loader.style.display = "none";
+
+    if (data.video_id) {
         // CORRECTED YOUTUBE LINK FORMAT
         const youtubeLink = `http://www.youtube.com/watch?v=${data.video_id}`;
         uploadSuccessDiv.innerHTML = `✅ Your video has been successfully uploaded! <a href="${youtubeLink}" target="_blank">View on YouTube</a>`;
@@ -0,0 +1,98 @@
+import os
+import re
+import uuid
+import wave
+import logging
+import subprocess
+import imageio_ffmpeg
+from agents import metrics
+
+AAC_EXTENSIONS = (".m4a", ".aac", ".mp4")  # Containers worth probing for an AAC stream
+
+
+def default_aac_bitrate():
+    """Bitrate of the AAC rendition muxed into videos (AUDIO_AAC_BITRATE); ffmpeg's own default is 128k."""
+    return os.getenv("AUDIO_AAC_BITRATE", "128k")
+
+
+def _probe(path):
+    """ffmpeg's stream and header summary of a file (stderr of `ffmpeg -i`)."""
+    result = subprocess.run(
+        [imageio_ffmpeg.get_ffmpeg_exe(), "-hide_banner", "-i", path],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    return result.stderr.decode(errors="replace")
+
+
+def is_aac(path):
+    """True when the first audio stream of the file is AAC, so it can be muxed with stream copy."""
+    if not path.lower().endswith(AAC_EXTENSIONS):
+        return False
+    match = re.search(r"Stream #\S+.*?: Audio: (\w+)", _probe(path))
+    return bool(match) and match.group(1) == "aac"
+
+
+def probe_duration(path):
+    """
+    Duration in seconds read from the file header, without decoding: the WAV header for our own
+    voiceovers, otherwise the container duration ffmpeg reports. None when unknown.
+    """
+    try:
+        with wave.open(path, "rb") as w:
+            return w.getnframes() / float(w.getframerate())
+    except (wave.Error, EOFError):
+        pass
+    match = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", _probe(path))
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def aac_rendition_path(audio_path):
+    """Where the AAC rendition of a voiceover lives: next to it, as <name>.m4a (<name>.aac.m4a for .m4a sources)."""
+    base, extension = os.path.splitext(audio_path)
+    return base + (".aac.m4a" if extension.lower() == ".m4a" else ".m4a")
+
+
+def find_aac(audio_path):
+    """
+    The audio as AAC without encoding anything: the file itself when its stream is AAC, the
+    up-to-date rendition ensure_aac() wrote next to it, or None.
+    """
+    if is_aac(audio_path):
+        return audio_path
+    rendition = aac_rendition_path(audio_path)
+    try:
+        if os.path.getsize(rendition) > 0 and os.path.getmtime(rendition) >= os.path.getmtime(audio_path):
+            return rendition
+    except OSError:
+        pass
+    return None
+
+
+@metrics.traced("audio.encode_aac")
+def ensure_aac(audio_path, bitrate=None):
+    """
+    Returns an AAC (.m4a) version of audio_path, encoding it once if there is none yet. Renders then
+    mux it with stream copy instead of re-encoding the voiceover for every video and segment join.
+    """
+    existing = find_aac(audio_path)
+    if existing:
+        return existing
+    rendition = aac_rendition_path(audio_path)
+    # Encoded to a unique temporary name and renamed, so concurrent renders of one voiceover never
+    # see a half-written rendition
+    tmp_path = f"{rendition}.{uuid.uuid4().hex}.tmp.m4a"
+    cmd = [
+        imageio_ffmpeg.get_ffmpeg_exe(), "-y", "-loglevel", "error", "-i", audio_path, "-vn",
+        "-c:a", "aac", "-b:a", bitrate or default_aac_bitrate(), "-movflags", "+faststart", tmp_path
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise RuntimeError(f"ffmpeg could not encode '{audio_path}' to AAC: {result.stderr.decode(errors='replace').strip()}")
+    os.replace(tmp_path, rendition)
+    logging.info(f"AudioAssets: Encoded AAC rendition '{rendition}'")
+    return rendition
@@ -1,33 +1,232 @@
 import pyttsx3
+import io
 import os
+import re
+import sys
+import json
+import wave
+import logging
+import threading
+import subprocess
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import imageio_ffmpeg
+from agents.media_cache import MediaCache
+from agents.audio_assets import ensure_aac
+from agents import metrics
+
+# One pyttsx3 engine per pool worker process (with its default voice and rate), created by _init_tts_worker
+_worker_engine = None
+_worker_defaults = (None, None)
+
+
+def _init_tts_worker():
+    global _worker_engine, _worker_defaults
+    _worker_engine = pyttsx3.init()
+    _worker_defaults = (_worker_engine.getProperty("voice"), _worker_engine.getProperty("rate"))
+
+
+def _apply_voice(engine, voice, rate, defaults):
+    """Sets the requested voice and rate, or restores the engine defaults so no request inherits another's."""
+    voice, rate = voice or defaults[0], rate or defaults[1]
+    if voice:
+        engine.setProperty("voice", voice)
+    if rate:
+        engine.setProperty("rate", rate)
+
+
+def _synthesize_chunk(text, path, voice=None, rate=None):
+    """Runs in a pool worker: renders one chunk of text to `path` with the worker's own engine."""
+    _apply_voice(_worker_engine, voice, rate, _worker_defaults)
+    _worker_engine.save_to_file(text, path)
+    _worker_engine.runAndWait()
+    return path
+
+
+def split_sentences(text, min_chars=40):
+    """
+    Splits text into sentence chunks for parallel synthesis. Very short sentences are merged into
+    the next one so each chunk is worth the per-chunk engine overhead.
+    """
+    sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+|\n+", text) if s.strip()]
+    chunks = []
+    for sentence in sentences:
+        if chunks and len(chunks[-1]) < min_chars:
+            chunks[-1] = f"{chunks[-1]} {sentence}"
+        else:
+            chunks.append(sentence)
+    return chunks
+
 
 class AudioGenerator:
     def __init__(self):
         self.engine = pyttsx3.init()
+        self._engine_defaults = (self.engine.getProperty("voice"), self.engine.getProperty("rate"))
+        # pyttsx3 engines are not thread-safe; the shared one is only used under this lock
+        self._engine_lock = threading.Lock()
         self.output_dir = "assets/audio_local"
         os.makedirs(self.output_dir, exist_ok=True)
+        self.tts_workers = int(os.getenv("TTS_WORKERS", str(min(4, os.cpu_count() or 1))))
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self.ffmpeg = imageio_ffmpeg.get_ffmpeg_exe()
+        self.rate = int(os.getenv("TTS_RATE", "0")) or None  # Words per minute; engine default when unset
+        # pyttsx3 picks its driver per platform (sapi5, nsss, espeak), so audio differs between them
+        self.engine_id = f"pyttsx3-{sys.platform}"
+        # Synthesized sentences, so a script edit only re-synthesizes the sentences that changed
+        self.cache = MediaCache(
+            os.getenv("TTS_CACHE_DIR", "assets/cache/tts"),
+            max_size_gb=float(os.getenv("TTS_CACHE_MAX_GB", "1"))
+        )
 
-    def generate_with_pyttsx3(self, text):
-        if not text:
-            print("❌ Missing text for pyttsx3 generation.")
+    def resolve_voice(self, voice_id):
+        """Returns voice_id if the local engine has it; None (engine default) for 'local_default' or unknown ids."""
+        if not voice_id or voice_id == "local_default":
             return None
+        with self._engine_lock:
+            available = {v.id for v in (self.engine.getProperty("voices") or [])}
+        if voice_id not in available:
+            logging.warning(f"AudioGenerator: Voice '{voice_id}' is not installed locally, using the default voice")
+            return None
+        return voice_id
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"voiceover_local_{timestamp}.mp3"
-        filepath = os.path.join(self.output_dir, filename)
+    def _cache_key(self, sentence, voice, rate):
+        return "tts:" + json.dumps([sentence, voice, rate, self.engine_id])
 
-        print(f"DEBUG: Attempting to save audio to: {filepath}") # ADD THIS LINE
-        print(f"DEBUG: Absolute path for saving: {os.path.abspath(filepath)}") # ADD THIS LINE
-        print(f"DEBUG: Does output_dir exist before saving? {os.path.exists(self.output_dir)}") # ADD THIS LINE
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.tts_workers, initializer=_init_tts_worker)
+            return self._pool
 
-        try:
-            self.engine.save_to_file(text, filepath)
+    def _synthesize_local(self, text, path, voice=None, rate=None):
+        with self._engine_lock:
+            _apply_voice(self.engine, voice, rate, self._engine_defaults)
+            self.engine.save_to_file(text, path)
             self.engine.runAndWait()
 
-            print(f"DEBUG: After runAndWait(). Does file exist? {os.path.exists(filepath)}") # ADD THIS LINE
-            print(f"DEBUG: File size after runAndWait(): {os.path.getsize(filepath) if os.path.exists(filepath) else 'N/A'}") # ADD THIS LINE
+    def _read_pcm(self, path, params=None):
+        """Returns (wave params, frames). Non-WAV engine output (e.g. AIFF on macOS) is decoded with ffmpeg."""
+        try:
+            with wave.open(path, "rb") as w:
+                if params is None or w.getparams()[:3] == params[:3]:
+                    return w.getparams(), w.readframes(w.getnframes())
+        except wave.Error:
+            pass
+        channels, sample_width, rate = params[:3] if params else (1, 2, 22050)
+        result = subprocess.run(
+            [self.ffmpeg, "-loglevel", "error", "-i", path, "-ac", str(channels), "-ar", str(rate),
+             "-c:a", "pcm_s16le", "-f", "wav", "-"],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg could not decode '{path}': {result.stderr.decode(errors='replace').strip()}")
+        with wave.open(io.BytesIO(result.stdout), "rb") as w:
+            return w.getparams(), w.readframes(w.getnframes())
 
+    def _concatenate(self, chunk_paths, chunks, filepath):
+        """Joins chunk WAVs into filepath and returns each chunk's exact offsets in milliseconds."""
+        params, offsets, position = None, [], 0
+        with wave.open(filepath, "wb") as out:
+            for text, path in zip(chunks, chunk_paths):
+                chunk_params, frames = self._read_pcm(path, params)
+                if params is None:
+                    params = chunk_params
+                    out.setparams(params)
+                out.writeframes(frames)
+                length = len(frames) // (params.nchannels * params.sampwidth)
+                offsets.append({
+                    "text": text,
+                    "start": round(position * 1000 / params.framerate),
+                    "end": round((position + length) * 1000 / params.framerate),
+                })
+                position += length
+        return offsets
+
+    @metrics.traced("tts.synthesize")
+    def synthesize(self, text, voice_id=None):
+        """
+        Synthesizes text sentence by sentence and joins the chunks into one WAV. Sentences already in
+        the TTS cache (same text, voice, rate and engine) are reused; the rest are rendered in a process
+        pool with one engine per worker. Returns {'path', 'chunks', 'cached'} where chunks carry
+        per-sentence offsets in ms, also written next to the audio as <audio>.chunks.json for the aligner.
+        The WAV is the canonical PCM copy (alignment reads it); an AAC rendition (<audio>.m4a, returned
+        as 'aac_path') is encoded once here and muxed into videos without re-encoding.
+        """
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        filepath = os.path.join(self.output_dir, f"voiceover_local_{timestamp}.wav")
+        voice = self.resolve_voice(voice_id)
+        chunks = split_sentences(text)
+        keys = [self._cache_key(chunk, voice, self.rate) for chunk in chunks]
+        chunk_paths = [self.cache.get(key, ".wav") for key in keys]
+        missing = [i for i, path in enumerate(chunk_paths) if path is None]
+        metrics.inc("tts_sentences_total", len(chunks) - len(missing), cache="hit")
+        metrics.inc("tts_sentences_total", len(missing), cache="miss")
+
+        tmp_paths = {i: self.cache.temp_path(".wav") for i in missing}
+        try:
+            texts = [chunks[i] for i in missing]
+            paths = [tmp_paths[i] for i in missing]
+            with metrics.span("tts.render_sentences"):
+                if len(missing) > 1 and self.tts_workers > 1:
+                    pool = self._get_pool()
+                    try:
+                        list(pool.map(
+                            _synthesize_chunk, texts, paths, [voice] * len(texts), [self.rate] * len(texts)
+                        ))
+                    except BrokenProcessPool as e:
+                        # A crashed worker (e.g. a dead engine) breaks the pool: shut it down so its
+                        # processes exit, and let the next request start a fresh one
+                        logging.error(f"AudioGenerator: TTS worker pool broke ({e}), retrying sequentially")
+                        with self._pool_lock:
+                            if self._pool is pool:
+                                self._pool = None
+                        pool.shutdown(wait=False, cancel_futures=True)
+                        for chunk, path in zip(texts, paths):
+                            self._synthesize_local(chunk, path, voice, self.rate)
+                    except Exception as e:
+                        # One sentence failed in a worker; the pool itself is fine and is kept
+                        logging.error(f"AudioGenerator: Parallel synthesis failed ({e}), retrying sequentially")
+                        for chunk, path in zip(texts, paths):
+                            self._synthesize_local(chunk, path, voice, self.rate)
+                else:
+                    for chunk, path in zip(texts, paths):
+                        self._synthesize_local(chunk, path, voice, self.rate)
+
+            empty = [p for p in paths if not os.path.exists(p) or os.path.getsize(p) == 0]
+            if empty:
+                raise RuntimeError(f"pyttsx3 produced no audio for {len(empty)} of {len(chunks)} chunks")
+            for i in missing:
+                chunk_paths[i] = self.cache.put_file(keys[i], tmp_paths[i], ".wav")
+        finally:
+            for path in tmp_paths.values():
+                if os.path.exists(path):
+                    os.remove(path)
+
+        with metrics.span("tts.concatenate"):
+            offsets = self._concatenate(chunk_paths, chunks, filepath)
+        with open(filepath + ".chunks.json", "w", encoding="utf-8") as f:
+            json.dump(offsets, f)
+        logging.info(
+            f"AudioGenerator: Joined {len(chunks)} chunks into '{filepath}' "
+            f"({len(chunks) - len(missing)} from cache, {len(missing)} synthesized)"
+        )
+        try:
+            aac_path = ensure_aac(filepath)
+        except Exception as e:
+            # Not fatal: the render encodes the rendition itself if it is still missing
+            logging.warning(f"AudioGenerator: Could not encode the AAC rendition: {e}")
+            aac_path = None
+        return {"path": filepath, "aac_path": aac_path, "chunks": offsets, "cached": len(chunks) - len(missing)}
+
+    def generate_with_pyttsx3(self, text, voice_id=None):
+        if not text:
+            print("❌ Missing text for pyttsx3 generation.")
+            return None
+
+        try:
+            filepath = self.synthesize(text, voice_id)["path"]
             if os.path.exists(filepath) and os.path.getsize(filepath) > 0:
                 print(f"✅ Local audio saved: {filepath}")
                 return filepath
@@ -36,4 +235,4 @@ class AudioGenerator:
                 return None
         except Exception as e:
             print("❌ Exception occurred while generating local audio:", str(e))
-            return None
\ No newline at end of file
+            return None
@@ -0,0 +1,165 @@
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from agents.registry import create_registry
+
+# Agents live in each worker process; registered by _init_worker, built once and reused for every item
+_worker_agents = None
+
+PIPELINE_AGENTS = ["idea_gen", "script_gen", "audio_gen", "video_gen", "seo_optimizer", "stt_gen"]
+
+
+def _init_worker(encoder_threads):
+    global _worker_agents
+    _worker_agents = create_registry(PIPELINE_AGENTS)
+
+    def configure_video(video_gen):
+        # Every worker encodes concurrently, so split the cores between them instead of oversubscribing
+        video_gen.encoder_threads = encoder_threads
+
+    def configure_audio(audio_gen):
+        # Batch workers already occupy every core; synthesize sentences in-process instead of a nested pool
+        audio_gen.tts_workers = 1
+
+    _worker_agents.register("video_gen", "agents.video_generator:VideoGenerator", configure=configure_video)
+    _worker_agents.register("audio_gen", "agents.audio_generator:AudioGenerator", configure=configure_audio)
+    # Warm-up hook: build every agent while the pool starts rather than inside the first item's timing.
+    # An agent that fails here is retried on first use, so only the items that need it fail.
+    _worker_agents.warm_up()
+
+
+def _slug(text, max_length=40):
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")[:max_length] or "video"
+
+
+def normalize_items(topics=None, ideas=None):
+    """Turns topic and idea lists into pipeline items. Ideas skip the title/variation stages."""
+    items = [{"topic": t.strip()} for t in (topics or []) if t and t.strip()]
+    items += [{"idea": i.strip()} for i in (ideas or []) if i and i.strip()]
+    return items
+
+
+def run_pipeline(item, output_name, profile=None):
+    """
+    Runs idea -> script -> audio -> STT -> video -> SEO for a single topic or idea.
+    Executes inside a worker process; returns a JSON-serializable result.
+    """
+    agents = _worker_agents
+    started = time.time()
+    result = {"item": item, "output_name": output_name, "status": "failed"}
+    try:
+        idea = item.get("idea")
+        if not idea:
+            titles = agents["idea_gen"].generate_trending_titles(item["topic"])
+            title = titles[0] if titles else item["topic"]
+            variations = agents["idea_gen"].generate_variations(title)
+            idea = variations[0] if variations else title
+        result["idea"] = idea
+
+        script = agents["script_gen"].generate_script(idea)
+        result["script"] = script
+
+        audio_path = agents["audio_gen"].generate_with_pyttsx3(script)
+        if not audio_path:
+            raise RuntimeError("Audio generation failed")
+        audio_path = os.path.abspath(audio_path)
+
+        word_timings = agents["stt_gen"].word_timings(audio_path, script)
+        video_path = agents["video_gen"].generate_video(
+            script, audio_path, word_timings, profile=profile, output_name=output_name
+        )
+        result["video_path"] = video_path
+        result["status"] = "completed"
+
+        # A failed SEO call should not throw away a rendered video
+        try:
+            result["seo"] = agents["seo_optimizer"].optimize(video_path, script)
+        except Exception as e:
+            logging.error(f"BatchRunner: SEO optimization failed for {item}: {e}")
+            result["seo_error"] = str(e)
+    except Exception as e:
+        logging.exception(f"BatchRunner: Pipeline failed for {item}")
+        result["error"] = str(e)
+    result["elapsed_seconds"] = round(time.time() - started, 2)
+    return result
+
+
+def run_batch(items, workers=None, profile=None, progress_callback=None):
+    """
+    Renders every item in a process pool sized to the machine's cores.
+    Each item gets a unique output file. Returns the per-item results plus a throughput summary.
+    """
+    if not items:
+        raise ValueError("No topics or ideas given for batch rendering")
+
+    cpu_count = os.cpu_count() or 1
+    workers = max(1, min(workers or cpu_count, len(items)))
+    encoder_threads = max(1, cpu_count // workers)
+    batch_id = uuid.uuid4().hex[:8]
+    logging.info(f"BatchRunner: Batch {batch_id}: {len(items)} items on {workers} worker processes")
+
+    started = time.time()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(encoder_threads,)) as pool:
+        futures = []
+        for index, item in enumerate(items):
+            output_name = f"batch_{batch_id}_{index:03d}_{_slug(item.get('idea') or item.get('topic', ''))}.mp4"
+            futures.append(pool.submit(run_pipeline, item, output_name, profile))
+        for future in as_completed(futures):
+            results.append(future.result())
+            if progress_callback:
+                progress_callback(len(results), len(items))
+
+    elapsed = time.time() - started
+    succeeded = sum(1 for r in results if r["status"] == "completed")
+    summary = {
+        "batch_id": batch_id,
+        "total": len(items),
+        "succeeded": succeeded,
+        "failed": len(items) - succeeded,
+        "workers": workers,
+        "elapsed_seconds": round(elapsed, 2),
+        "videos_per_hour": round(succeeded * 3600 / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+    logging.info(
+        f"BatchRunner: Batch {batch_id} done: {succeeded}/{len(items)} videos in {elapsed:.1f}s "
+        f"({summary['videos_per_hour']} videos/hour)"
+    )
+    return {"summary": summary, "results": sorted(results, key=lambda r: r["output_name"])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render many videos in one run.")
+    parser.add_argument("topics", nargs="*", help="topics to run through the full pipeline")
+    parser.add_argument("--ideas", nargs="*", default=[], help="video ideas (skips title/variation generation)")
+    parser.add_argument("--file", help="text file with one topic per line")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--profile", default=None, help="encoder profile: draft, publish or archive")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    topics = list(args.topics)
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as f:
+            topics += [line for line in f.read().splitlines() if line.strip()]
+
+    report = run_batch(normalize_items(topics, args.ideas), workers=args.workers, profile=args.profile)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    summary = report["summary"]
+    print(f"✅ {summary['succeeded']}/{summary['total']} videos in {summary['elapsed_seconds']}s "
+          f"— {summary['videos_per_hour']} videos/hour on {summary['workers']} workers")
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
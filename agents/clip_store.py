@@ -0,0 +1,103 @@
+import os
+import math
+import logging
+import subprocess
+import imageio_ffmpeg
+from agents.media_cache import MediaCache
+
+
+class NormalizedClipStore:
+    """
+    Transcodes each downloaded background clip once to the target resolution, fps and pixel format,
+    and keeps the result in a persistent cache. Renders then decode the normalized file directly with
+    no per-frame resize/crop, and short clips are looped with a stream-copy concat instead of vfx.loop.
+    """
+
+    def __init__(self, width, height, fps=24, root=None, max_size_gb=None):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.cache = MediaCache(
+            root or os.getenv("CLIP_STORE_DIR", "assets/cache/normalized"),
+            max_size_gb=max_size_gb if max_size_gb is not None else float(os.getenv("CLIP_STORE_MAX_GB", "4"))
+        )
+        self.ffmpeg = imageio_ffmpeg.get_ffmpeg_exe()
+
+    def _run(self, args):
+        cmd = [self.ffmpeg, "-y", "-loglevel", "error"] + args
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed ({result.returncode}): {result.stderr.decode(errors='replace').strip()}")
+
+    def _profile_key(self):
+        return f"{self.width}x{self.height}@{self.fps}:yuv420p"
+
+    def probe_duration(self, path):
+        """Clip duration in seconds, read by stream-copying the container (no decode)."""
+        frames, seconds = imageio_ffmpeg.count_frames_and_secs(path)
+        return seconds
+
+    def normalize(self, source_path, source_id=None):
+        """Returns the path of the normalized version of source_path, transcoding it on first use."""
+        source_id = source_id or os.path.basename(source_path)
+        key = f"normalized:{source_id}:{self._profile_key()}"
+        cached = self.cache.get(key, ".mp4")
+        if cached:
+            logging.info(f"NormalizedClipStore: Reusing normalized clip for '{source_id}'")
+            return cached
+
+        # Scale to cover the frame, then center-crop: the same result as the old vfx.resize + vfx.crop block
+        video_filter = (
+            f"scale={self.width}:{self.height}:force_original_aspect_ratio=increase,"
+            f"crop={self.width}:{self.height},fps={self.fps},format=yuv420p"
+        )
+        tmp_path = self.cache.temp_path(".mp4")
+        logging.info(f"NormalizedClipStore: Normalizing '{source_path}' to {self._profile_key()}")
+        try:
+            self._run([
+                "-i", source_path, "-an", "-vf", video_filter,
+                "-c:v", "libx264", "-preset", "veryfast", "-crf", "18",
+                "-g", str(self.fps),  # Regular keyframes keep stream-copy concat/trim clean
+                "-movflags", "+faststart", "-f", "mp4", tmp_path
+            ])
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return self.cache.put_file(key, tmp_path, ".mp4")
+
+    def loop_to_duration(self, normalized_path, duration):
+        """
+        Returns a clip at least `duration` seconds long. Short clips are repeated with the
+        concat demuxer and stream copy, so no frames are decoded or re-encoded.
+        """
+        clip_duration = self.probe_duration(normalized_path)
+        if clip_duration <= 0 or clip_duration >= duration:
+            return normalized_path
+
+        repeats = math.ceil(duration / clip_duration)
+        key = f"looped:{os.path.basename(normalized_path)}:{repeats}"
+        cached = self.cache.get(key, ".mp4")
+        if cached:
+            return cached
+
+        list_path = self.cache.temp_path(".txt")
+        tmp_path = self.cache.temp_path(".mp4")
+        try:
+            with open(list_path, "w", encoding="utf-8") as f:
+                for _ in range(repeats):
+                    f.write(f"file '{os.path.abspath(normalized_path)}'\n")
+            self._run(["-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", "-f", "mp4", tmp_path])
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        finally:
+            if os.path.exists(list_path):
+                os.remove(list_path)
+        logging.info(f"NormalizedClipStore: Looped clip {repeats}x by stream copy to cover {duration:.1f}s")
+        return self.cache.put_file(key, tmp_path, ".mp4")
+
+    def prepare(self, source_path, duration, source_id=None):
+        """Normalizes and loops a background clip so it can be decoded as-is for `duration` seconds."""
+        return self.loop_to_duration(self.normalize(source_path, source_id), duration)
@@ -0,0 +1,156 @@
+import os
+import re
+import logging
+import tempfile
+import subprocess
+import numpy as np
+import imageio_ffmpeg
+
+
+class ForcedAligner:
+    """
+    Offline word timing for audio whose text is already known (our own TTS output).
+    The audio is split into speech regions with an energy-based VAD, and the script's words are
+    laid out over the voiced time in proportion to their estimated spoken duration, so no word
+    lands in a pause. Returns the same [{'text', 'start', 'end'}] list (milliseconds) as AssemblyAI.
+    """
+
+    def __init__(self, sample_rate=16000, hop_ms=10, min_pause_ms=150, min_speech_ms=60):
+        self.sample_rate = sample_rate
+        self.hop_ms = hop_ms
+        self.min_pause_ms = min_pause_ms
+        self.min_speech_ms = min_speech_ms
+        self.ffmpeg = imageio_ffmpeg.get_ffmpeg_exe()
+
+    def _decode_pcm(self, audio_path, pcm_path):
+        """Decodes any audio file to a raw mono s16le file at sample_rate via ffmpeg."""
+        cmd = [
+            self.ffmpeg, "-y", "-loglevel", "error", "-i", audio_path,
+            "-ac", "1", "-ar", str(self.sample_rate), "-f", "s16le", pcm_path
+        ]
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg could not decode '{audio_path}': {result.stderr.decode(errors='replace').strip()}")
+
+    def _load_pcm(self, pcm_path):
+        """
+        Memory-maps decoded int16 samples instead of reading them into arrays, so a 30-minute voiceover
+        costs page cache rather than ~170 MB of process memory.
+        """
+        if os.path.getsize(pcm_path) < 2:
+            return np.zeros(0, dtype=np.int16)
+        return np.memmap(pcm_path, dtype=np.int16, mode="r")
+
+    def _frame_energy_db(self, samples, block_frames=6000):
+        """Per-hop energy of int16 samples, converted to float a block (one minute at 10 ms hops) at a time."""
+        hop = int(self.sample_rate * self.hop_ms / 1000)
+        frames = len(samples) // hop
+        if frames == 0:
+            return np.zeros(0, dtype=np.float32), hop
+        power = np.empty(frames, dtype=np.float64)
+        for first in range(0, frames, block_frames):
+            last = min(first + block_frames, frames)
+            block = samples[first * hop:last * hop].astype(np.float32) / 32768.0
+            power[first:last] = (block.reshape(last - first, hop) ** 2).mean(axis=1)
+        return 10.0 * np.log10(power + 1e-10), hop
+
+    def _runs(self, mask):
+        """(start, end) index pairs of consecutive True values."""
+        padded = np.concatenate(([False], mask, [False]))
+        edges = np.flatnonzero(padded[1:] != padded[:-1])
+        return list(zip(edges[::2], edges[1::2]))
+
+    def speech_segments(self, samples):
+        """Voiced regions as [(start_seconds, end_seconds)], with short pauses bridged."""
+        energy, hop = self._frame_energy_db(samples)
+        if len(energy) == 0:
+            return []
+        floor, peak = np.percentile(energy, 10), np.percentile(energy, 95)
+        if peak - floor < 6.0:
+            # Flat energy (no distinguishable pauses): treat the whole clip as speech
+            return [(0.0, len(samples) / self.sample_rate)]
+        threshold = floor + 0.3 * (peak - floor)
+        voiced = energy > threshold
+
+        # Bridge pauses shorter than min_pause_ms, then drop blips shorter than min_speech_ms
+        min_pause = self.min_pause_ms // self.hop_ms
+        for start, end in self._runs(~voiced):
+            if end - start < min_pause and start > 0 and end < len(voiced):
+                voiced[start:end] = True
+        min_speech = self.min_speech_ms // self.hop_ms
+        seconds_per_frame = hop / self.sample_rate
+        return [
+            (start * seconds_per_frame, end * seconds_per_frame)
+            for start, end in self._runs(voiced) if end - start >= min_speech
+        ]
+
+    @staticmethod
+    def _word_weight(word):
+        """Rough spoken length: syllables (vowel groups) plus a little for every character."""
+        letters = re.sub(r"[^a-z0-9]", "", word.lower())
+        syllables = max(1, len(re.findall(r"[aeiouy]+", letters)))
+        digits = sum(c.isdigit() for c in letters)  # Numbers are read out digit by digit or longer
+        return syllables + 0.1 * len(letters) + 0.5 * digits
+
+    def align(self, script, audio_path, chunks=None):
+        """
+        chunks: optional [{'text', 'start', 'end'}] sentence offsets (ms) from chunked synthesis.
+        When they cover the script, each sentence is aligned only within its own span.
+        """
+        words = script.split()
+        if not words:
+            return []
+        fd, pcm_path = tempfile.mkstemp(suffix=".s16le")
+        os.close(fd)
+        try:
+            self._decode_pcm(audio_path, pcm_path)
+            samples = self._load_pcm(pcm_path)
+            duration = len(samples) / self.sample_rate
+            segments = self.speech_segments(samples) or [(0.0, duration)]
+            del samples  # Unmap before the file is removed
+        finally:
+            os.remove(pcm_path)
+        if not chunks or [w for c in chunks for w in c["text"].split()] != words:
+            return self.align_words(words, segments)
+
+        timings = []
+        for chunk in chunks:
+            start, end = chunk["start"] / 1000.0, chunk["end"] / 1000.0
+            inside = [(max(s, start), min(e, end)) for s, e in segments if e > start and s < end]
+            timings += self.align_words(chunk["text"].split(), inside or [(start, end)])
+        return timings
+
+    def align_words(self, words, segments):
+        """Lays words out over the voiced segments in proportion to their weights."""
+        weights = np.array([self._word_weight(w) for w in words], dtype=np.float64)
+        seg_starts = np.array([s for s, _ in segments])
+        seg_lengths = np.array([e - s for s, e in segments])
+        voiced_offsets = np.concatenate(([0.0], np.cumsum(seg_lengths)))  # Voiced time before each segment
+        total_voiced = voiced_offsets[-1]
+
+        bounds = np.concatenate(([0.0], np.cumsum(weights))) / weights.sum() * total_voiced
+
+        def to_real(voiced_time):
+            i = min(np.searchsorted(voiced_offsets, voiced_time, side="right") - 1, len(segments) - 1)
+            return i, seg_starts[i] + (voiced_time - voiced_offsets[i])
+
+        timings = []
+        for n, word in enumerate(words):
+            seg_a, start = to_real(bounds[n])
+            seg_b, end = to_real(bounds[n + 1] - 1e-9)
+            if seg_a != seg_b:
+                # A word never spans a pause: keep it in the segment holding most of it
+                share_a = voiced_offsets[seg_a + 1] - bounds[n]
+                share_b = bounds[n + 1] - voiced_offsets[seg_b]
+                if share_a >= share_b:
+                    end = seg_starts[seg_a] + seg_lengths[seg_a]
+                else:
+                    start = seg_starts[seg_b]
+            timings.append({
+                "text": word,
+                "start": int(round(start * 1000)),
+                "end": int(round(max(end, start + 0.01) * 1000)),
+                "confidence": 1.0,
+            })
+        logging.debug(f"ForcedAligner: Aligned {len(words)} words over {len(segments)} speech segments")
+        return timings
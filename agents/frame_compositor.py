@@ -0,0 +1,115 @@
+import logging
+from bisect import bisect_right
+import numpy as np
+from moviepy.editor import VideoClip
+
+
+class SubtitleCompositor:
+    """
+    Single-pass compositor for word-level subtitles.
+    Instead of handing MoviePy one clip per word (which it scans on every frame), subtitle events
+    are kept in a time-sorted index. Each frame does an O(log n) bisect to find the active caption
+    and blends it into a reused frame buffer.
+    """
+
+    def __init__(self, renderer, frame_size, position_y):
+        self.renderer = renderer
+        self.width, self.height = frame_size
+        self.position_y = int(position_y)
+
+        self._starts = []
+        self._ends = []
+        self._texts = []
+        self._max_end = []  # running max of end times, lets overlapping events be found without a full scan
+
+        # Reused per-frame buffers: the output frame and a float32 scratch area for blending
+        self._frame = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+        self._scratch = np.empty((0, 0, 3), dtype=np.float32)
+
+    def set_events(self, events, preload=True):
+        """
+        Indexes subtitle events given as (start_seconds, end_seconds, text). With preload, every caption
+        is rasterized up front; otherwise each one is drawn when it first appears, so only the captions
+        the renderer's cache budget allows are held at once.
+        """
+        events = sorted((e for e in events if e[2] and e[1] > e[0]), key=lambda e: e[0])
+        self._starts = [e[0] for e in events]
+        self._ends = [e[1] for e in events]
+        self._texts = [e[2] for e in events]
+        self._max_end = []
+        running = float("-inf")
+        for end in self._ends:
+            running = max(running, end)
+            self._max_end.append(running)
+
+        if preload:
+            # Warm the renderer so no rasterization happens inside the frame loop
+            bitmaps = self.renderer.prepare(self._texts).values()
+            tallest = max((b.shape[0] for b in bitmaps), default=0)
+            widest = max((b.shape[1] for b in bitmaps), default=0)
+            self._scratch = np.empty((tallest, widest, 3), dtype=np.float32)
+        logging.info(f"SubtitleCompositor: Indexed {len(self._texts)} subtitle events ({len(set(self._texts))} unique).")
+        return self
+
+    @classmethod
+    def events_from_word_timings(cls, word_timings):
+        """Converts STT word timings (milliseconds) to (start, end, text) events in seconds."""
+        events = []
+        for word_info in word_timings:
+            text = word_info.get('text', word_info.get('word', ''))
+            events.append((word_info['start'] / 1000.0, word_info['end'] / 1000.0, text))
+        return events
+
+    def active_text(self, t):
+        """Returns the caption visible at time t, or None."""
+        i = bisect_right(self._starts, t) - 1
+        # Walk back only while an earlier event could still be running (usually zero or one step)
+        while i >= 0 and self._max_end[i] > t:
+            if self._ends[i] > t:
+                return self._texts[i]
+            i -= 1
+        return None
+
+    def _blend(self, text):
+        premult, inv_alpha = self.renderer.blend_arrays(text)
+        h, w = inv_alpha.shape[:2]
+        x = (self.width - w) // 2
+        y = self.position_y
+        # Clip against the frame edges
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + w, self.width), min(y + h, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        sx, sy = x0 - x, y0 - y
+        if self._scratch.shape[0] < y1 - y0 or self._scratch.shape[1] < x1 - x0:
+            # Captions rasterized lazily: grow the scratch area to the largest one seen so far
+            self._scratch = np.empty(
+                (max(self._scratch.shape[0], y1 - y0), max(self._scratch.shape[1], x1 - x0), 3), dtype=np.float32
+            )
+        region = self._frame[y0:y1, x0:x1]
+        scratch = self._scratch[:y1 - y0, :x1 - x0]
+        np.multiply(region, inv_alpha[sy:sy + (y1 - y0), sx:sx + (x1 - x0)], out=scratch)
+        np.add(scratch, premult[sy:sy + (y1 - y0), sx:sx + (x1 - x0)], out=scratch)
+        np.copyto(region, scratch, casting='unsafe')
+
+    def composite(self, background_frame, t):
+        """
+        Writes the background plus the active caption into the shared frame buffer and returns it.
+        The buffer is overwritten on the next call, so consumers must copy it if they keep it.
+        """
+        if background_frame.shape == self._frame.shape:
+            np.copyto(self._frame, background_frame, casting='unsafe')
+        else:
+            h = min(background_frame.shape[0], self.height)
+            w = min(background_frame.shape[1], self.width)
+            self._frame.fill(0)
+            self._frame[:h, :w] = background_frame[:h, :w, :3]
+
+        text = self.active_text(t)
+        if text:
+            self._blend(text)
+        return self._frame
+
+    def make_clip(self, background_clip, duration):
+        """Wraps the compositor in a MoviePy VideoClip driven by the background clip."""
+        return VideoClip(lambda t: self.composite(background_clip.get_frame(t), t), duration=duration)
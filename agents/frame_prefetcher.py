@@ -0,0 +1,179 @@
+import os
+import time
+import queue
+import logging
+import threading
+import contextvars
+import subprocess
+import numpy as np
+import imageio_ffmpeg
+from agents import metrics
+from agents import memory_budget
+
+
+def default_queue_depth():
+    """Frames buffered between pipeline stages (RENDER_PREFETCH_DEPTH); 0 runs every stage in lockstep."""
+    return max(0, int(os.getenv("RENDER_PREFETCH_DEPTH", "4")))
+
+
+class FrameRing:
+    """
+    Bounded ring of preallocated frame buffers between one producer thread and one consumer thread.
+    Buffer indices cycle free -> filled -> free, so frames are never allocated per step, and the time
+    each side spends blocked on the other is accumulated to show which stage is the bottleneck.
+    """
+
+    _END = -1
+
+    def __init__(self, depth, shape, dtype=np.uint8):
+        self.buffers = [np.empty(shape, dtype=dtype) for _ in range(depth)]
+        self._free = queue.Queue()
+        self._filled = queue.Queue()
+        for i in range(depth):
+            self._free.put(i)
+        self._cancelled = threading.Event()
+        self.error = None
+        self.producer_wait = 0.0  # Producer blocked on a full ring: the consumer is the slower stage
+        self.consumer_wait = 0.0  # Consumer blocked on an empty ring: the producer is the slower stage
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def acquire(self):
+        """Producer side: index of a free buffer to fill, or None once the consumer has gone away."""
+        started = time.perf_counter()
+        i = self._free.get()
+        self.producer_wait += time.perf_counter() - started
+        return None if self.cancelled else i
+
+    def publish(self, i):
+        self._filled.put(i)
+
+    def close(self, error=None):
+        """Producer side: no more frames. An error is re-raised in the consumer."""
+        self.error = error
+        self._filled.put(self._END)
+
+    def take(self):
+        """Consumer side: index of the next filled buffer, or None at the end of the stream."""
+        started = time.perf_counter()
+        i = self._filled.get()
+        self.consumer_wait += time.perf_counter() - started
+        if i == self._END:
+            if self.error is not None:
+                raise self.error
+            return None
+        return i
+
+    def release(self, i):
+        self._free.put(i)
+
+    def cancel(self):
+        """Consumer side: stop the producer early (it may be blocked waiting for a free buffer)."""
+        self._cancelled.set()
+        self._free.put(0)
+
+
+class PrefetchingFrameSource:
+    """
+    Decodes frames [start_frame, start_frame + frame_count) of a background clip that is already at the
+    output size and fps (see NormalizedClipStore) on a background thread. ffmpeg writes raw RGB straight
+    into a FrameRing of preallocated buffers, so decoding runs ahead of compositing and encoding instead
+    of in lockstep with them. If the clip ends early its last frame is repeated, like MoviePy does.
+
+    Iterating yields each frame as a ring buffer that stays valid until the next frame is requested.
+    """
+
+    def __init__(self, path, size, fps, start_frame=0, frame_count=None, depth=None):
+        self.path = path
+        self.width, self.height = size
+        self.fps = fps
+        self.start_frame = start_frame
+        self.frame_count = frame_count
+        self.depth = max(2, depth if depth is not None else default_queue_depth())
+        self.ffmpeg = imageio_ffmpeg.get_ffmpeg_exe()
+        self.ring = None
+
+    def _command(self):
+        cmd = [self.ffmpeg, "-v", "error", "-nostdin"]
+        if self.start_frame:
+            cmd += ["-ss", f"{self.start_frame / self.fps:.6f}"]  # Input seek, frame accurate for CFR clips
+        cmd += ["-i", self.path]
+        if self.frame_count is not None:
+            cmd += ["-frames:v", str(self.frame_count)]
+        return cmd + ["-an", "-f", "rawvideo", "-pix_fmt", "rgb24", "-"]
+
+    def _decode(self, process):
+        ring = self.ring
+        frame_bytes = self.width * self.height * 3
+        produced = 0
+        last = None
+        exhausted = False
+        try:
+            while self.frame_count is None or produced < self.frame_count:
+                i = ring.acquire()
+                if i is None:
+                    break
+                buffer = ring.buffers[i]
+                if not exhausted:
+                    view = memoryview(buffer).cast("B")
+                    got = 0
+                    while got < frame_bytes:
+                        n = process.stdout.readinto(view[got:])
+                        if not n:
+                            break
+                        got += n
+                    if got < frame_bytes:
+                        if self.frame_count is None:
+                            ring.release(i)
+                            break
+                        exhausted = True
+                        if last is None:
+                            buffer.fill(0)  # Nothing decodable at all: black frames
+                if exhausted and last is not None:
+                    # Until the consumer takes a later frame, the last published buffer is never reused
+                    np.copyto(buffer, ring.buffers[last])
+                ring.publish(i)
+                last = i
+                produced += 1
+            ring.close()
+        except Exception as e:
+            ring.close(e)
+
+    def __iter__(self):
+        self.ring = FrameRing(self.depth, (self.height, self.width, 3))
+        process = subprocess.Popen(self._command(), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                   bufsize=0)
+        memory_budget.track(process.pid)
+        # The decoder runs in a copy of this context, so anything it records lands in the job's timeline
+        decoder = threading.Thread(target=contextvars.copy_context().run, args=(self._decode, process),
+                                   name="frame-prefetch", daemon=True)
+        decoder.start()
+        started_at = time.time()
+        previous = None
+        frames = 0
+        try:
+            while True:
+                i = self.ring.take()
+                if previous is not None:
+                    self.ring.release(previous)
+                if i is None:
+                    break
+                previous = i
+                frames += 1
+                yield self.ring.buffers[i]
+        finally:
+            self.ring.cancel()
+            if process.poll() is None:
+                process.kill()
+            process.stdout.close()
+            process.wait()
+            decoder.join()
+            metrics.record_span("prefetch.wait_for_decoder", self.ring.consumer_wait, started_at)
+            metrics.record_span("prefetch.decoder_blocked", self.ring.producer_wait, started_at)
+            logging.info(
+                f"FramePrefetcher: {frames} frames through a {self.depth}-frame ring; consumer waited "
+                f"{self.ring.consumer_wait:.1f}s for decoded frames, decoder waited {self.ring.producer_wait:.1f}s "
+                f"for free buffers"
+            )
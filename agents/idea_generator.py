@@ -1,12 +1,17 @@
 import os
 from dotenv import load_dotenv
-import groq
+from agents.llm_gateway import get_gateway
+from agents.metrics import traced
 
 load_dotenv()
 
 class IdeaGenerator:
     def __init__(self):
-        self.client = groq.Client(api_key=os.getenv("GROQ_API_KEY"))
+        self.llm = get_gateway() # Shared pooled Groq client with rate limiting
+        self.model = "llama3-70b-8192"
+        # Response cache lifetimes: trends move quickly, variations of a fixed title do not
+        self.titles_cache_ttl = int(os.getenv("LLM_CACHE_TTL_TITLES", str(6 * 3600)))
+        self.variations_cache_ttl = int(os.getenv("LLM_CACHE_TTL_VARIATIONS", str(24 * 3600)))
 
     def _extract_list_items(self, raw_text):
         lines = raw_text.strip().split("\n")
@@ -21,34 +26,58 @@ class IdeaGenerator:
                     items.append(cleaned)
         return items
 
-    def generate_trending_titles(self, niche):
-        prompt = (
+    def _titles_prompt(self, niche):
+        return (
             f"Generate 5 trending YouTube video title ideas about '{niche}'. "
             f"Make them catchy and viral. Number them."
         )
 
+    @traced("ideas.titles")
+    def generate_trending_titles(self, niche, regenerate=False):
+        prompt = self._titles_prompt(niche)
+
         try:
-            response = self.client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model="llama3-70b-8192"
+            raw = self.llm.complete(
+                [{"role": "user", "content": prompt}], model=self.model,
+                cache_ttl=self.titles_cache_ttl, bypass_cache=regenerate
             )
-            raw = response.choices[0].message.content
             return self._extract_list_items(raw)
         except Exception as e:
             print("❌ Error generating trending titles:", e)
             return [f"{niche} Idea {i}" for i in range(1, 6)]
 
-    def generate_variations(self, selected_title):
+    @traced("ideas.titles_many")
+    def generate_trending_titles_many(self, niches, regenerate=False):
+        """Generates titles for several niches concurrently. Returns {niche: [titles]}."""
+        requests = [
+            {
+                "messages": [{"role": "user", "content": self._titles_prompt(niche)}],
+                "model": self.model,
+                "cache_ttl": self.titles_cache_ttl,
+                "bypass_cache": regenerate,
+            }
+            for niche in niches
+        ]
+        results = {}
+        for niche, raw in zip(niches, self.llm.complete_many(requests)):
+            if isinstance(raw, Exception):
+                print(f"❌ Error generating trending titles for '{niche}':", raw)
+                results[niche] = [f"{niche} Idea {i}" for i in range(1, 6)]
+            else:
+                results[niche] = self._extract_list_items(raw)
+        return results
+
+    @traced("ideas.variations")
+    def generate_variations(self, selected_title, regenerate=False):
         prompt = (
             f"Take this YouTube title: '{selected_title}' and generate 5 new unique and creative variations. Number them."
         )
 
         try:
-            response = self.client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model="llama3-70b-8192"
+            raw = self.llm.complete(
+                [{"role": "user", "content": prompt}], model=self.model,
+                cache_ttl=self.variations_cache_ttl, bypass_cache=regenerate
             )
-            raw = response.choices[0].message.content
             return self._extract_list_items(raw)
         except Exception as e:
             print("❌ Error generating variations:", e)
@@ -0,0 +1,220 @@
+import os
+import json
+import math
+import hashlib
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from agents.media_cache import MediaCache
+from agents import metrics
+from agents.segment_renderer import (
+    SegmentedRenderer, plan_segments_by_content, render_segment, wait_for_segments, worker_memory_limit
+)
+
+
+def _file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def segment_events(events, start, end, fps):
+    """
+    The captions of the segment [start, end) with times relative to its start, snapped to the frames
+    that show them and clipped to the segment: exactly what its frames draw, whatever its position.
+    """
+    relative = []
+    for s, e, text in events:
+        if e <= start or s >= end:
+            continue
+        first = max(0, math.ceil((s - start) * fps - 1e-6))
+        last = min(math.ceil((end - start) * fps - 1e-6), math.ceil((e - start) * fps - 1e-6))
+        if first < last:
+            relative.append((first / fps, last / fps, text))
+    return relative
+
+
+class IncrementalRenderer:
+    """
+    Renders the timeline as content-defined segments (cut at sentence boundaries, see
+    plan_segments_by_content) and keeps every encoded segment in a persistent cache keyed by what it
+    shows: its captions relative to its own start, its frame count, the background frames under it,
+    styling and encoder settings. Each segment is rendered on its own frame grid and placed at its
+    exact start time by the concat, so a script edit that lengthens or shortens the voiceover only
+    shifts the later segments and they are reused as they are. Given the manifest of the render being
+    edited, segments that reappear also keep the background frames they had there. Stale segments are
+    encoded in parallel, and everything is joined with a stream-copy concat plus a single audio mux.
+    A JSON manifest of the inputs and per-segment keys is written next to the output.
+    """
+
+    def __init__(self, video_generator, root=None, max_size_gb=None, segment_seconds=None):
+        self.video_generator = video_generator
+        self.cache = MediaCache(
+            root or os.getenv("RENDER_CACHE_DIR", "assets/cache/segments"),
+            max_size_gb=max_size_gb if max_size_gb is not None else float(os.getenv("RENDER_CACHE_MAX_GB", "4"))
+        )
+        self.segment_seconds = segment_seconds or float(os.getenv("RENDER_SEGMENT_SECONDS", "10"))
+
+    def _style(self):
+        """Everything besides the events that changes how a frame looks."""
+        gen = self.video_generator
+        return {
+            "size": [gen.video_width, gen.video_height],
+            "fps": gen.fps,
+            "font": gen.font,
+            "fontsize": gen.fontsize,
+            "text_color": gen.text_color,
+            "stroke_color": gen.stroke_color,
+            "stroke_width": gen.stroke_width,
+        }
+
+    def _background_span(self, background, background_start, frame_count):
+        """The background frames under a segment, as [source, normalized, first frame, frame count] per clip."""
+        if background.get("parts"):
+            # Montage: only the clips under this segment matter, so a changed clip elsewhere keeps it cached
+            end = background_start + frame_count
+            return [
+                [p["source"], True, max(background_start, p["start_frame"]) - p["start_frame"],
+                 min(end, p["end_frame"]) - max(background_start, p["start_frame"])]
+                for p in background["parts"] if p["end_frame"] > background_start and p["start_frame"] < end
+            ]
+        if not background.get("path"):
+            return []  # Black background: every span looks the same
+        return [[background.get("source"), background.get("normalized", False), background_start, frame_count]]
+
+    @staticmethod
+    def _digest(payload):
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def segment_signature(self, events, frame_count):
+        """Identifies a segment's captions and length independently of its position on the timeline."""
+        return self._digest({"events": [[s, e, text] for s, e, text in events], "frames": frame_count})
+
+    def segment_key(self, background, events, frame_count, background_start, profile, crf):
+        payload = {
+            "background": self._background_span(background, background_start, frame_count),
+            "frames": frame_count,
+            "events": [[s, e, text] for s, e, text in events],
+            "style": self._style(),
+            "profile": profile,
+            "crf": crf,
+        }
+        return "segment:" + self._digest(payload)
+
+    def _previous_backgrounds(self, base_manifest, background):
+        """
+        Background start frame of each segment signature in the manifest of an earlier render of the
+        same background, so segments that survive an edit are drawn over the frames they had.
+        """
+        if not base_manifest or background.get("parts") or not background.get("path"):
+            return {}
+        try:
+            with open(base_manifest, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.info(f"IncrementalRenderer: No usable manifest at '{base_manifest}' ({e})")
+            return {}
+        if manifest.get("background") != background.get("source"):
+            return {}
+        previous = {}
+        for segment in manifest.get("segments", []):
+            if "signature" in segment and "background_start" in segment:
+                previous.setdefault(segment["signature"], []).append(segment["background_start"])
+        return previous
+
+    def render(self, background, events, duration, audio_path, output_path,
+               profile=None, crf=None, progress_callback=None, base_manifest=None):
+        """
+        base_manifest is the manifest of the render this one edits (optional). Returns the manifest
+        of this render.
+        """
+        fps = self.video_generator.fps
+        total_frames = int(duration * fps)
+        previous = self._previous_backgrounds(base_manifest, background)
+        plan = []
+        for start, end in plan_segments_by_content(events, duration, self.segment_seconds):
+            relative = segment_events(events, start, end, fps)
+            frame_count = int((end - start) * fps + 1e-6)
+            signature = self.segment_signature(relative, frame_count)
+            background_start = min(int(round(start * fps)), total_frames)
+            for candidate in previous.get(signature, []):
+                if candidate + frame_count <= total_frames:
+                    previous[signature].remove(candidate)
+                    background_start = candidate
+                    break
+            frame_count = min(frame_count, total_frames - background_start)
+            if frame_count <= 0:
+                continue
+            plan.append({
+                "start": start, "end": end, "events": relative, "frames": frame_count, "signature": signature,
+                "background_start": background_start,
+                "key": self.segment_key(background, relative, frame_count, background_start, profile, crf),
+            })
+        plan_frames = sum(segment["frames"] for segment in plan)
+        # Reused segments must survive until the concat reads them: pin them (and the ones about to be
+        # encoded) so storing the new segments cannot evict them from the cache
+        with self.cache.pinned([segment["key"] for segment in plan], ".mp4"):
+            paths = [self.cache.get(segment["key"], ".mp4") for segment in plan]
+            stale = [i for i, path in enumerate(paths) if path is None]
+            logging.info(
+                f"IncrementalRenderer: {len(plan)} segments, {len(plan) - len(stale)} reused, {len(stale)} to encode"
+            )
+
+            frames_done = sum(segment["frames"] for i, segment in enumerate(plan) if i not in stale)
+            if progress_callback:
+                progress_callback(frames_done, plan_frames)
+
+            if stale:
+                workers = max(1, min(len(stale), os.cpu_count() or 1))
+                threads = max(1, (os.cpu_count() or 1) // workers)
+                memory_limit_mb = worker_memory_limit(self.video_generator, workers)
+                tmp_paths = {i: self.cache.temp_path(".mp4") for i in stale}
+                try:
+                    with metrics.span("render.segments"), ProcessPoolExecutor(max_workers=workers) as pool:
+                        futures = {
+                            pool.submit(render_segment, background, plan[i]["events"], duration, 0, plan[i]["frames"],
+                                        tmp_paths[i], profile, crf, threads, memory_limit_mb,
+                                        plan[i]["background_start"]): i
+                            for i in stale
+                        }
+
+                        def segment_done(future):
+                            nonlocal frames_done
+                            i = futures[future]
+                            frames = future.result()
+                            frames_done += frames
+                            metrics.inc("frames_encoded_total", frames)  # Worker-process counters are lost with them
+                            paths[i] = self.cache.put_file(plan[i]["key"], tmp_paths[i], ".mp4")
+                            if progress_callback:
+                                progress_callback(frames_done, plan_frames)
+
+                        wait_for_segments(pool, futures, segment_done)
+                finally:
+                    for path in tmp_paths.values():
+                        if os.path.exists(path):
+                            os.remove(path)
+
+            SegmentedRenderer(self.video_generator).concat_and_mux(
+                paths, audio_path, output_path, durations=[segment["end"] - segment["start"] for segment in plan]
+            )
+
+        manifest = {
+            "audio_sha256": _file_digest(audio_path) if audio_path else None,
+            "background": background.get("source"),
+            "profile": profile,
+            "crf": crf,
+            "style": self._style(),
+            "segments": [
+                {
+                    "start": round(segment["start"], 3), "frames": segment["frames"],
+                    "background_start": segment["background_start"], "signature": segment["signature"],
+                    "key": segment["key"], "reused": i not in stale,
+                }
+                for i, segment in enumerate(plan)
+            ],
+        }
+        with open(output_path + ".manifest.json", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        logging.info(f"IncrementalRenderer: Joined {len(plan)} segments into '{output_path}'")
+        return manifest
@@ -0,0 +1,133 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from agents import metrics
+from agents.memory_budget import MemoryWatch
+
+
+class Job:
+    """State of one background job, safe to read from request threads while a worker updates it."""
+
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = "queued"  # queued -> running -> completed | failed
+        self.stage = "queued"
+        self.progress = 0.0      # Percent complete of the current stage
+        self.eta_seconds = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.peak_rss_mb = None  # Peak RSS of the job: server growth while it ran plus its own child processes
+        self._stage_started_at = None
+        self.timeline = metrics.Timeline()  # Stages and spans recorded while the job runs
+        self._lock = threading.Lock()
+
+    def _close_stage(self):
+        if self._stage_started_at is not None:
+            self.timeline.add(f"stage.{self.stage}", self._stage_started_at, time.time() - self._stage_started_at)
+
+    def set_stage(self, stage):
+        with self._lock:
+            self._close_stage()
+            self.stage = stage
+            self.progress = 0.0
+            self.eta_seconds = None
+            self._stage_started_at = time.time()
+        logging.info(f"JobQueue: Job {self.id} entered stage '{stage}'")
+
+    def set_progress(self, done, total):
+        """Progress callback (e.g. encoder frames written / total frames); also derives the ETA."""
+        if not total:
+            return
+        with self._lock:
+            fraction = min(done / total, 1.0)
+            self.progress = round(fraction * 100, 1)
+            elapsed = time.time() - (self._stage_started_at or time.time())
+            if 0 < fraction < 1 and elapsed > 0:
+                self.eta_seconds = round(elapsed * (1 - fraction) / fraction, 1)
+            elif fraction >= 1:
+                self.eta_seconds = 0
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "stage": self.stage,
+                "progress": self.progress,
+                "eta_seconds": self.eta_seconds,
+                "result": self.result,
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "peak_rss_mb": self.peak_rss_mb,
+                "timeline": self.timeline.to_list(),
+            }
+
+
+class JobQueue:
+    """
+    Runs long pipeline stages on a bounded worker pool so request threads return immediately.
+    Submitted functions receive the Job as their first argument to report stage and progress;
+    their return value becomes job.result.
+    """
+
+    def __init__(self, max_workers=None, max_finished_jobs=200):
+        self.max_workers = max_workers or int(os.getenv("JOB_WORKERS", "2"))
+        self.max_finished_jobs = max_finished_jobs
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job-worker")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, kind="job", **kwargs):
+        job = Job(kind)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        logging.info(f"JobQueue: Submitted {kind} job {job.id}")
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = "running"
+        job.started_at = time.time()
+        job.timeline.started_at = job.started_at
+        memory_watch = MemoryWatch(name=f"Job {job.id}")
+        try:
+            # Spans opened anywhere in this worker thread land in the job's timeline
+            with memory_watch, metrics.bind_timeline(job.timeline), metrics.span(f"job.{job.kind}"):
+                job.result = fn(job, *args, **kwargs)
+            job.status = "completed"
+        except Exception as e:
+            logging.exception(f"JobQueue: Job {job.id} failed")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            with job._lock:
+                job._close_stage()
+                job._stage_started_at = None
+                if job.status == "completed":
+                    job.stage = "done"
+            job.finished_at = time.time()
+            job.peak_rss_mb = memory_watch.peak_mb
+            logging.info(f"JobQueue: Job {job.id} {job.status}, peak RSS {job.peak_rss_mb} MB")
+            metrics.inc("jobs_total", kind=job.kind, status=job.status)
+
+    def _prune(self):
+        """Drops the oldest finished jobs once more than max_finished_jobs are kept."""
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished_at is not None]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
@@ -0,0 +1,87 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+
+def normalize_prompt(messages):
+    """Collapses whitespace so prompts that differ only in formatting share a cache entry."""
+    return [{"role": m.get("role"), "content": " ".join(str(m.get("content", "")).split())} for m in messages]
+
+
+def cache_key(model, messages, params, backend="groq"):
+    """Backend is part of the key so offline (fake) answers are never served to Groq callers."""
+    payload = json.dumps(
+        {"backend": backend, "model": model, "messages": normalize_prompt(messages), "params": params},
+        sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    SQLite-backed cache of LLM responses keyed by backend + model + normalized prompt + parameters.
+    Each lookup passes its own TTL, so agents can keep trending titles fresher than SEO copy.
+    Tracks hits, misses and the upstream latency that hits avoided.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, model TEXT, response TEXT, created_at REAL, latency REAL)"
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def get(self, key, ttl):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at, latency FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row and (ttl is None or time.time() - row[1] <= ttl):
+                self.hits += 1
+                self.saved_seconds += row[2] or 0.0
+                return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, key, model, response, latency):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created_at, latency) VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, time.time(), latency)
+            )
+            self._conn.commit()
+
+    def purge_expired(self, max_age):
+        with self._lock:
+            deleted = self._conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (time.time() - max_age,)
+            ).rowcount
+            self._conn.commit()
+        logging.info(f"ResponseCache: Purged {deleted} expired responses")
+        return deleted
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "saved_seconds": round(self.saved_seconds, 2),
+        }
@@ -0,0 +1,351 @@
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from dotenv import load_dotenv
+import groq
+from agents.llm_cache import ResponseCache, cache_key
+from agents import metrics
+
+load_dotenv()
+
+DEFAULT_MODEL = "llama3-70b-8192"
+
+# Errors worth retrying with backoff; anything else (bad request, auth) fails immediately
+RETRYABLE_ERRORS = (groq.RateLimitError, groq.APIConnectionError, groq.APITimeoutError, groq.InternalServerError)
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` requests per second with bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """Takes a token and returns how long the caller must wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self._reserve()
+        if wait:
+            await asyncio.sleep(wait)
+
+
+class FakeBackend:
+    """
+    Offline stand-in for Groq (LLM_BACKEND=fake). Returns deterministic, well-formed answers:
+    numbered lists for list prompts, JSON for json_object requests, and prose otherwise.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def reply(self, messages, model, **params):
+        prompt = messages[-1]["content"]
+        seed = hashlib.sha256(f"{model}:{prompt}".encode("utf-8")).hexdigest()[:6]
+        if (params.get("response_format") or {}).get("type") == "json_object":
+            return json.dumps({
+                "title": f"Fake SEO title {seed}",
+                "description": "Fake description generated offline. " * 10,
+                "hashtags": [f"#tag{i}" for i in range(1, 11)],
+                "tags": [f"tag{i}" for i in range(1, 6)],
+            })
+        if "Number them" in prompt:
+            return "\n".join(f"{i}. Fake idea {seed}-{i}" for i in range(1, 6))
+        return (f"Hey everyone, welcome back! Today's fake script {seed} walks through the topic step by step. "
+                "Stick around to the end, and don't forget to subscribe and leave a comment.")
+
+    def complete(self, messages, model, **params):
+        if self.latency:
+            time.sleep(self.latency)
+        return self.reply(messages, model, **params)
+
+    def stream(self, messages, model, **params):
+        for word in self.reply(messages, model, **params).split(" "):
+            if self.latency:
+                time.sleep(self.latency / 50)
+            yield word + " "
+
+    async def complete_async(self, messages, model, **params):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self.reply(messages, model, **params)
+
+
+class LLMGateway:
+    """
+    Single entry point for chat completions shared by every Groq-backed agent.
+    Holds one pooled sync client and one async client, limits concurrency, paces requests with a
+    token bucket and retries rate-limit/transient errors with exponential backoff. Independent
+    prompts can be fanned out concurrently with complete_many()/agather(). Sync and async calls
+    share one limit of LLM_MAX_CONCURRENCY in-flight requests, held on the gateway's event loop.
+    """
+
+    def __init__(self, api_key=None, backend=None, max_concurrency=None, requests_per_minute=None, max_retries=5):
+        self.api_key = api_key or os.getenv("GROQ_API_KEY")
+        self.backend = (backend or os.getenv("LLM_BACKEND", "groq")).lower()
+        self.max_concurrency = max_concurrency or int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+        requests_per_minute = requests_per_minute or float(os.getenv("LLM_REQUESTS_PER_MINUTE", "30"))
+        self.max_retries = max_retries
+        self.bucket = TokenBucket(rate=requests_per_minute / 60.0, capacity=max(1, self.max_concurrency))
+        self._slots = asyncio.Semaphore(self.max_concurrency)  # Only touched on the background loop
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+        # Prompt-level response cache shared by all agents (LLM_CACHE=off disables it)
+        self.cache = None
+        if os.getenv("LLM_CACHE", "on").lower() not in ("off", "0", "false"):
+            self.cache = ResponseCache(os.getenv("LLM_CACHE_PATH", "assets/cache/llm_responses.sqlite3"))
+
+        if self.backend == "fake":
+            self.fake = FakeBackend(latency=float(os.getenv("LLM_FAKE_LATENCY", "0")))
+            self.client = self.async_client = None
+        elif self.api_key:
+            self.fake = None
+            # Retries are handled here so they share the rate limiter; the SDK's own retries are disabled
+            self.client = groq.Groq(api_key=self.api_key, max_retries=0)
+            self.async_client = groq.AsyncGroq(api_key=self.api_key, max_retries=0)
+        else:
+            logging.error("LLMGateway: GROQ_API_KEY not found in .env file. LLM calls will fail.")
+            self.fake = self.client = self.async_client = None
+
+    def cache_stats(self):
+        return self.cache.stats() if self.cache else {"enabled": False}
+
+    @property
+    def available(self):
+        return self.fake is not None or bool(self.api_key)
+
+    def _backoff(self, attempt, error):
+        retry_after = None
+        response = getattr(error, "response", None)
+        if response is not None:
+            try:
+                retry_after = float(response.headers.get("retry-after"))
+            except (TypeError, ValueError):
+                retry_after = None
+        delay = retry_after if retry_after is not None else min(30.0, 0.5 * 2 ** attempt)
+        return delay + random.uniform(0, 0.25)
+
+    def _cached(self, messages, model, cache_ttl, bypass_cache, params):
+        """Returns (key, cached content). The key is None when caching does not apply to this call."""
+        if not self.cache or not cache_ttl:
+            return None, None
+        key = cache_key(model, messages, params, backend=self.backend)
+        if bypass_cache:
+            return key, None
+        return key, self.cache.get(key, cache_ttl)
+
+    def complete(self, messages, model=DEFAULT_MODEL, cache_ttl=None, bypass_cache=False, **params):
+        """
+        Blocking chat completion; returns the message content. With cache_ttl (seconds) identical
+        prompts are answered from the response cache; bypass_cache forces a fresh answer and stores it.
+        """
+        key, content = self._cached(messages, model, cache_ttl, bypass_cache, params)
+        metrics.inc("llm_requests_total", model=model, cache="hit" if content is not None else "miss")
+        if content is not None:
+            return content
+        started = time.perf_counter()
+        with metrics.span("llm.complete"):
+            content = self._complete_uncached(messages, model, **params)
+        if key:
+            self.cache.put(key, model, content, time.perf_counter() - started)
+        return content
+
+    async def acomplete(self, messages, model=DEFAULT_MODEL, cache_ttl=None, bypass_cache=False, **params):
+        """Async chat completion with the same caching behaviour as complete()."""
+        key, content = self._cached(messages, model, cache_ttl, bypass_cache, params)
+        metrics.inc("llm_requests_total", model=model, cache="hit" if content is not None else "miss")
+        if content is not None:
+            return content
+        started = time.perf_counter()
+        with metrics.span("llm.complete"):
+            content = await self._acomplete_uncached(messages, model, **params)
+        if key:
+            self.cache.put(key, model, content, time.perf_counter() - started)
+        return content
+
+    @contextmanager
+    def _slot(self):
+        """Holds one of the gateway's concurrency slots from a thread outside its event loop."""
+        loop = self._background_loop()
+        asyncio.run_coroutine_threadsafe(self._slots.acquire(), loop).result()
+        try:
+            yield
+        finally:
+            loop.call_soon_threadsafe(self._slots.release)
+
+    @asynccontextmanager
+    async def _aslot(self):
+        """Async variant of _slot(); works on the gateway's loop and on any caller's own loop."""
+        loop = self._background_loop()
+        if asyncio.get_running_loop() is loop:
+            async with self._slots:
+                yield
+            return
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._slots.acquire(), loop))
+        try:
+            yield
+        finally:
+            loop.call_soon_threadsafe(self._slots.release)
+
+    def _complete_uncached(self, messages, model, **params):
+        if self.fake:
+            return self.fake.complete(messages, model, **params)
+        if not self.client:
+            raise ValueError("Missing GROQ_API_KEY in .env file")
+        with self._slot():
+            for attempt in range(self.max_retries + 1):
+                self.bucket.acquire()
+                try:
+                    response = self.client.chat.completions.create(messages=messages, model=model, **params)
+                    return response.choices[0].message.content
+                except RETRYABLE_ERRORS as e:
+                    if attempt == self.max_retries:
+                        raise
+                    delay = self._backoff(attempt, e)
+                    logging.warning(f"LLMGateway: {type(e).__name__} from {model}, retrying in {delay:.1f}s")
+                    time.sleep(delay)
+
+    async def _acomplete_uncached(self, messages, model, **params):
+        if self.fake:
+            return await self.fake.complete_async(messages, model, **params)
+        if not self.async_client:
+            raise ValueError("Missing GROQ_API_KEY in .env file")
+        async with self._aslot():
+            for attempt in range(self.max_retries + 1):
+                await self.bucket.acquire_async()
+                try:
+                    response = await self.async_client.chat.completions.create(messages=messages, model=model, **params)
+                    return response.choices[0].message.content
+                except RETRYABLE_ERRORS as e:
+                    if attempt == self.max_retries:
+                        raise
+                    delay = self._backoff(attempt, e)
+                    logging.warning(f"LLMGateway: {type(e).__name__} from {model}, retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+
+    def stream(self, messages, model=DEFAULT_MODEL, cache_ttl=None, bypass_cache=False, **params):
+        """
+        Yields content deltas as the model produces them. Closing the generator early closes the
+        upstream HTTP stream, so no more tokens are generated or billed. A cached answer is yielded
+        in one piece; a stream is only cached once it has been read to the end.
+        """
+        key, content = self._cached(messages, model, cache_ttl, bypass_cache, params)
+        metrics.inc("llm_requests_total", model=model, cache="hit" if content is not None else "miss")
+        if content is not None:
+            yield content
+            return
+
+        started = time.perf_counter()
+        parts = []
+        if self.fake:
+            for delta in self.fake.stream(messages, model, **params):
+                parts.append(delta)
+                yield delta
+        else:
+            if not self.client:
+                raise ValueError("Missing GROQ_API_KEY in .env file")
+            with self._slot():
+                upstream = None
+                # Retry only while opening the stream; once tokens flow, errors propagate to the caller
+                for attempt in range(self.max_retries + 1):
+                    self.bucket.acquire()
+                    try:
+                        upstream = self.client.chat.completions.create(
+                            messages=messages, model=model, stream=True, **params
+                        )
+                        break
+                    except RETRYABLE_ERRORS as e:
+                        if attempt == self.max_retries:
+                            raise
+                        delay = self._backoff(attempt, e)
+                        logging.warning(f"LLMGateway: {type(e).__name__} from {model}, retrying in {delay:.1f}s")
+                        time.sleep(delay)
+                try:
+                    for chunk in upstream:
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if delta:
+                            parts.append(delta)
+                            yield delta
+                finally:
+                    upstream.close()
+
+        if key:
+            self.cache.put(key, model, "".join(parts), time.perf_counter() - started)
+
+    def remember(self, messages, content, model=DEFAULT_MODEL, cache_ttl=None, latency=0.0, **params):
+        """
+        Caches `content` as the answer to this prompt, under the key complete() and stream() use. For
+        callers that stop a stream on purpose (e.g. at a word limit), which stream() never caches.
+        """
+        key, _ = self._cached(messages, model, cache_ttl, True, params)
+        if key:
+            self.cache.put(key, model, content, latency)
+
+    async def agather(self, requests):
+        """
+        Runs many completions concurrently. `requests` is a list of dicts with 'messages' and optional
+        'model', 'cache_ttl', 'bypass_cache' and extra params. Returns contents in order; a failed
+        request yields its exception.
+        """
+        tasks = [self.acomplete(**request) for request in requests]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _background_loop(self):
+        """
+        One long-lived event loop per gateway, so the async client's connection pool is reused across
+        calls instead of being bound to a throwaway loop from asyncio.run().
+        """
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="llm-gateway-loop", daemon=True).start()
+            return self._loop
+
+    def complete_many(self, requests):
+        """Blocking wrapper around agather() for callers without an event loop (Flask, workers)."""
+        return asyncio.run_coroutine_threadsafe(self.agather(requests), self._background_loop()).result()
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    # A forked worker must not reuse the parent's event-loop thread or HTTP connections
+    global _gateway, _gateway_lock
+    _gateway = None
+    _gateway_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_gateway():
+    """Returns the process-wide gateway, creating it on first use."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway()
+        return _gateway
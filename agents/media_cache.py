@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+
+
+class MediaCache:
+    """
+    Persistent on-disk cache for downloaded media and API responses.
+    Entries are content-addressed by a hash of their key, written atomically
+    (temp file + os.replace) and evicted least-recently-used once the cache
+    grows past max_size_gb. File mtime doubles as the LRU clock. Entries a
+    caller still needs can be pinned so eviction skips them.
+    """
+
+    def __init__(self, root, max_size_gb=2.0):
+        self.root = root
+        self.max_size_bytes = int(float(max_size_gb) * 1024 ** 3)
+        self._lock = threading.Lock()
+        self._pinned = {}  # Path -> number of callers pinning it
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key, suffix):
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, f"{digest}{suffix}")
+
+    def _touch(self, path):
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+    @contextmanager
+    def pinned(self, keys, suffix=""):
+        """Keeps the entries of `keys` (present now or added later) from being evicted inside the block."""
+        paths = [os.path.abspath(self._path(key, suffix)) for key in keys]
+        with self._lock:
+            for path in paths:
+                self._pinned[path] = self._pinned.get(path, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                for path in paths:
+                    self._pinned[path] -= 1
+                    if not self._pinned[path]:
+                        del self._pinned[path]
+
+    def get(self, key, suffix=""):
+        """Returns the cached file path for key, or None on a miss."""
+        path = self._path(key, suffix)
+        if os.path.exists(path):
+            self._touch(path)
+            return path
+        return None
+
+    def put_stream(self, key, chunks, suffix=""):
+        """Writes an iterable of byte chunks to the cache atomically and returns the final path."""
+        path = self._path(key, suffix)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    if chunk:
+                        f.write(chunk)
+            os.replace(tmp_path, path)  # Readers never observe a partially written file
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict(keep=path)
+        return path
+
+    def temp_path(self, suffix=""):
+        """Returns a fresh temp file path inside the cache dir, for tools that write their own output."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=f".part{suffix}")
+        os.close(fd)
+        return tmp_path
+
+    def put_file(self, key, tmp_path, suffix=""):
+        """Atomically moves a finished file from temp_path() into the cache and returns the final path."""
+        path = self._path(key, suffix)
+        os.replace(tmp_path, path)
+        self.evict(keep=path)
+        return path
+
+    def put_bytes(self, key, data, suffix=""):
+        return self.put_stream(key, [data], suffix)
+
+    def get_json(self, key, ttl=None):
+        """Returns cached JSON for key if present and younger than ttl seconds."""
+        path = self._path(key, ".json")
+        try:
+            if ttl is not None and time.time() - os.path.getmtime(path) > ttl:
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put_json(self, key, data):
+        return self.put_bytes(key, json.dumps(data).encode("utf-8"), ".json")
+
+    def size_bytes(self):
+        total = 0
+        for entry in os.scandir(self.root):
+            if entry.is_file() and ".part" not in entry.name:
+                total += entry.stat().st_size
+        return total
+
+    def evict(self, keep=None):
+        """Removes least-recently-used entries until the cache fits within max_size_bytes."""
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.root):
+                if not entry.is_file() or ".part" in entry.name:
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+            if total <= self.max_size_bytes:
+                return 0
+
+            removed = 0
+            for _, size, path in sorted(entries):
+                if total <= self.max_size_bytes:
+                    break
+                if (keep and os.path.abspath(path) == os.path.abspath(keep)) or os.path.abspath(path) in self._pinned:
+                    continue
+                try:
+                    os.remove(path)
+                    total -= size
+                    removed += 1
+                except OSError as e:
+                    logging.warning(f"MediaCache: Could not evict {path}: {e}")
+            logging.info(f"MediaCache: Evicted {removed} entries from {self.root}")
+            return removed
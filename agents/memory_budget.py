@@ -0,0 +1,191 @@
+import os
+import sys
+import logging
+import resource
+import threading
+import contextvars
+
+_current = contextvars.ContextVar("memory_watch", default=None)
+
+
+def default_memory_limit_mb():
+    """RSS ceiling for one render (RENDER_MEMORY_LIMIT_MB); 0 or unset leaves renders unbounded."""
+    return max(0, int(os.getenv("RENDER_MEMORY_LIMIT_MB", "0")))
+
+
+class MemoryLimitExceeded(MemoryError):
+    pass
+
+
+def _status_rss(pid):
+    """Resident set size of one process from /proc, in bytes (0 if it has already exited)."""
+    try:
+        with open(f"/proc/{pid}/status", "rb") as f:
+            for line in f:
+                if line.startswith(b"VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
+
+
+def _children(pid):
+    pids = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                pids += [int(child) for child in f.read().split()]
+    except OSError:
+        pass
+    return pids
+
+
+def _peak_rss_self():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def process_tree_rss(pid=None):
+    """
+    Current RSS of a process (this one by default) plus its descendants, in bytes. Without /proc only
+    this process's peak RSS is available, which is returned instead.
+    """
+    if not os.path.exists("/proc/self/status"):
+        return _peak_rss_self()
+    total = 0
+    pending = [pid or os.getpid()]
+    while pending:
+        pid = pending.pop()
+        total += _status_rss(pid)
+        pending += _children(pid)
+    return total
+
+
+def child_with_arg(arg):
+    """PID of a child of this process whose command line includes `arg` (e.g. its output path), or None."""
+    for pid in _children(os.getpid()):
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                if arg.encode() in f.read().split(b"\0"):
+                    return pid
+        except OSError:
+            pass
+    return None
+
+
+class MemoryWatch:
+    """
+    Samples the memory a job or render uses on a background thread while it runs, keeping the peak:
+    this process's RSS growth since the watch started plus the full RSS of the child processes the
+    work registered with track() (its ffmpeg encoder and decoders, segment workers). Other jobs'
+    children are never counted; their in-process allocations are, when they run concurrently in the
+    same process, since RSS cannot be split by thread.
+    With a limit, crossing it first calls the on_pressure callbacks (dropping caches);
+    if RSS is still over the limit on the next sample, check() raises MemoryLimitExceeded in the
+    thread doing the work, which stops the render cleanly instead of the OOM killer stopping the
+    whole server. check() is cheap enough to call once per frame.
+    """
+
+    def __init__(self, limit_mb=None, interval=0.25, on_pressure=None, name="render"):
+        self.limit_bytes = int(limit_mb * 1024 * 1024) if limit_mb else None
+        self.interval = interval
+        self.on_pressure = list(on_pressure or [])
+        self.name = name
+        self.start_bytes = 0  # This process's RSS when the watch started
+        self.peak_bytes = 0
+        self.pids = set()
+        self._parent = None
+        self.exceeded = None
+        self._relieved = False
+        self._stop = threading.Event()
+        self._thread = None
+        self._token = None
+
+    @property
+    def peak_mb(self):
+        return round(self.peak_bytes / (1024 * 1024), 1)
+
+    def track(self, pid):
+        """Counts child process `pid` (and its descendants) toward this watch and every enclosing one."""
+        watch = self
+        while watch is not None:
+            watch.pids.add(pid)
+            watch = watch._parent
+
+    def usage(self):
+        if not os.path.exists("/proc/self/status"):
+            return _peak_rss_self()  # Children are not visible without /proc
+        for pid in list(self.pids):
+            if not os.path.exists(f"/proc/{pid}"):
+                self.pids.discard(pid)  # Exited; forget it before the PID is reused
+        children = sum(process_tree_rss(pid) for pid in list(self.pids))
+        return max(0, _status_rss(os.getpid()) - self.start_bytes) + children
+
+    def _sample(self):
+        rss = self.usage()
+        self.peak_bytes = max(self.peak_bytes, rss)
+        if not self.limit_bytes or self.exceeded:
+            return
+        if rss <= self.limit_bytes:
+            self._relieved = False  # Back under the limit: a later overshoot gets its own chance to recover
+            return
+        if not self._relieved:
+            self._relieved = True
+            logging.warning(
+                f"MemoryWatch: {self.name} at {rss / 2**20:.0f} MB, over the {self.limit_bytes / 2**20:.0f} MB "
+                f"limit; releasing caches"
+            )
+            for callback in self.on_pressure:
+                try:
+                    callback()
+                except Exception as e:
+                    logging.warning(f"MemoryWatch: Pressure callback failed: {e}")
+            return
+        self.exceeded = MemoryLimitExceeded(
+            f"{self.name} used {rss / 2**20:.0f} MB, over the {self.limit_bytes / 2**20:.0f} MB limit "
+            f"(RENDER_MEMORY_LIMIT_MB)"
+        )
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def check(self):
+        if self.exceeded is not None:
+            raise self.exceeded
+
+    def __enter__(self):
+        self.start_bytes = _status_rss(os.getpid()) if os.path.exists("/proc/self/status") else 0
+        self.peak_bytes = 0
+        self._parent = _current.get()
+        self._token = _current.set(self)
+        self._thread = threading.Thread(target=self._loop, name="memory-watch", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        _current.reset(self._token)
+        return False
+
+
+def check():
+    """Raises MemoryLimitExceeded if the innermost MemoryWatch of this thread is over its limit."""
+    watch = _current.get()
+    if watch is not None:
+        watch.check()
+
+
+def track(pid):
+    """Counts child process `pid` toward the MemoryWatches of this thread's job and render, if any."""
+    watch = _current.get()
+    if watch is not None and pid:
+        watch.track(pid)
+
+
+def bounded():
+    """True inside a render that runs under a memory limit."""
+    watch = _current.get()
+    return watch is not None and watch.limit_bytes is not None
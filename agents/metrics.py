@@ -0,0 +1,202 @@
+import time
+import logging
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+METRIC_PREFIX = "yt_agent_"
+
+# Span durations range from cache hits (milliseconds) to full renders (minutes)
+SPAN_BUCKETS = (0.005, 0.025, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+# HELP lines for the metrics the agents export
+DESCRIPTIONS = {
+    "span_seconds": "Wall time of instrumented pipeline steps.",
+    "span_errors_total": "Instrumented steps that raised.",
+    "download_bytes_total": "Bytes downloaded from external services.",
+    "upload_bytes_total": "Bytes uploaded to external services.",
+    "frames_encoded_total": "Video frames sent to the encoder.",
+    "llm_requests_total": "LLM completions by response-cache outcome.",
+    "tts_sentences_total": "Synthesized sentences by TTS-cache outcome.",
+    "jobs_total": "Finished background jobs by kind and status.",
+    "uploads_total": "Finished YouTube uploads by status.",
+}
+
+_timeline = contextvars.ContextVar("metrics_timeline", default=None)
+_parent = contextvars.ContextVar("metrics_parent_span", default=None)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in labels
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+class MetricsRegistry:
+    """In-process counters and span-duration histograms, rendered in the Prometheus text format."""
+
+    def __init__(self, buckets=SPAN_BUCKETS):
+        self.buckets = buckets
+        self._counters = {}    # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [per-bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[i] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def counter_value(self, name, **labels):
+        with self._lock:
+            return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+
+        declared = set()
+        for (name, labels), value in counters:
+            metric = METRIC_PREFIX + name
+            if metric not in declared:
+                declared.add(metric)
+                if name in DESCRIPTIONS:
+                    lines.append(f"# HELP {metric} {DESCRIPTIONS[name]}")
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+        for (name, labels), histogram in histograms:
+            metric = METRIC_PREFIX + name
+            if metric not in declared:
+                declared.add(metric)
+                if name in DESCRIPTIONS:
+                    lines.append(f"# HELP {metric} {DESCRIPTIONS[name]}")
+                lines.append(f"# TYPE {metric} histogram")
+            for bound, count in zip(self.buckets, histogram):
+                lines.append(f"{metric}_bucket{_format_labels(labels + (('le', bound),))} {count}")
+            lines.append(f"{metric}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram[-1]}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {round(histogram[-2], 6)}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {histogram[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+class Timeline:
+    """Spans recorded while one job runs, as offsets in seconds from the start of the job."""
+
+    def __init__(self, max_spans=500):
+        self.started_at = time.time()
+        self.max_spans = max_spans
+        self.dropped = 0
+        self._spans = []
+        self._lock = threading.Lock()
+
+    def add(self, name, started_at, duration, parent=None, error=None):
+        with self._lock:
+            if len(self._spans) >= self.max_spans:
+                self.dropped += 1
+                return
+            self._spans.append({
+                "name": name,
+                "parent": parent,
+                "offset_s": round(started_at - self.started_at, 3),
+                "duration_s": round(duration, 3),
+                "error": error,
+            })
+
+    def to_list(self):
+        with self._lock:
+            return sorted(self._spans, key=lambda s: s["offset_s"])
+
+
+registry = MetricsRegistry()
+
+
+def inc(name, value=1, **labels):
+    """Adds `value` to the counter `name` with the given labels."""
+    registry.inc(name, value, **labels)
+
+
+@contextmanager
+def bind_timeline(timeline):
+    """Records every span opened in this thread (or asyncio task) into `timeline` until the block exits."""
+    token = _timeline.set(timeline)
+    try:
+        yield timeline
+    finally:
+        _timeline.reset(token)
+
+
+@contextmanager
+def span(name):
+    """
+    Times the enclosed block as `name`: observed in the span_seconds histogram and, inside a job,
+    appended to that job's timeline together with its parent span.
+    """
+    parent = _parent.get()
+    token = _parent.set(name)
+    started_at = time.time()
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _parent.reset(token)
+        record_span(name, time.perf_counter() - started, started_at, error)
+
+
+def record_span(name, duration, started_at=None, error=None):
+    """
+    Records an already measured duration as span `name`, for time accumulated across many small
+    steps (e.g. per-frame compositing) where wrapping each step in span() would cost too much.
+    """
+    registry.observe("span_seconds", duration, span=name)
+    if error:
+        registry.inc("span_errors_total", span=name)
+    timeline = _timeline.get()
+    if timeline is not None:
+        timeline.add(name, started_at or time.time() - duration, duration, _parent.get(), error)
+    logging.debug(f"Metrics: {name} took {duration:.3f}s")
+
+
+def traced(name):
+    """Decorator form of span() for agent methods."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count_bytes(chunks, name, **labels):
+    """Passes a byte-chunk iterator through while adding each chunk's size to the counter `name`."""
+    for chunk in chunks:
+        if chunk:
+            registry.inc(name, len(chunk), **labels)
+        yield chunk
+
+
+def render_prometheus():
+    return registry.render()
@@ -0,0 +1,164 @@
+import os
+import re
+import logging
+import contextvars
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from agents.segment_renderer import plan_segments_by_content
+from agents import metrics
+
+STOP_WORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being below between both
+but by can could did do does doing down during each even ever every few for from further get gets got had has
+have having he her here hers him his how i if in into is it its just know let like make many me more most much
+my no nor not now of off on once one only or other our out over own really right same say see she should so
+some still such than that the their them then there these they thing things this those through to too under
+until up us very want was way we well were what when where which while who why will with would yes you your
+today going gonna welcome everyone guys hey video channel subscribe comment
+""".split())
+
+
+def extract_keywords(text, max_words=2):
+    """The most salient words of a passage (frequent, long, not stop words), in their original order."""
+    words = re.findall(r"[a-z][a-z'-]+", text.lower())
+    counts = Counter(w for w in words if len(w) > 2 and w not in STOP_WORDS)
+    first_seen = {}
+    for i, w in enumerate(words):
+        first_seen.setdefault(w, i)
+    top = sorted(counts, key=lambda w: (-counts[w] * len(w), first_seen[w]))[:max_words]
+    return sorted(top, key=first_seen.get)
+
+
+class MontageBuilder:
+    """
+    Builds a multi-clip background for one video. The timeline is split into segments of about
+    MONTAGE_SEGMENT_SECONDS at subtitle gaps, each segment gets a keyword query from its own words, and
+    all searches and downloads run concurrently over the video generator's keep-alive session. For each
+    segment the shortest candidate clip that covers it is picked, so clips play through instead of being
+    looped frame by frame. Returns a background spec whose 'parts' map frame ranges to normalized clips.
+    """
+
+    def __init__(self, video_generator, segment_seconds=None, candidates=None, max_workers=None):
+        self.video_generator = video_generator
+        self.segment_seconds = segment_seconds or float(os.getenv("MONTAGE_SEGMENT_SECONDS", "10"))
+        self.candidates = candidates or int(os.getenv("MONTAGE_CANDIDATES", "8"))  # Search results per query
+        self.max_workers = max_workers or video_generator.http_pool_size
+
+    def plan(self, events, duration, fallback_query):
+        """[{'start_frame', 'end_frame', 'query'}], one per montage segment."""
+        fps = self.video_generator.fps
+        total_frames = int(duration * fps)
+        segments = []
+        # The same content-defined cuts as incremental renders, so each cached segment sits on one clip
+        for start, end in plan_segments_by_content(events, duration, self.segment_seconds):
+            start_frame, end_frame = min(int(round(start * fps)), total_frames), min(int(round(end * fps)), total_frames)
+            if start_frame >= end_frame:
+                continue
+            text = " ".join(t for s, e, t in events if e > start and s < end)
+            query = " ".join(extract_keywords(text)) or fallback_query
+            segments.append({"start_frame": start_frame, "end_frame": end_frame, "query": query})
+        return segments
+
+    def _search(self, query):
+        try:
+            return self.video_generator._search_pexels(query, per_page=self.candidates).get("videos", [])
+        except Exception as e:
+            logging.warning(f"MontageBuilder: Pexels search failed for '{query}': {e}")
+            return []
+
+    def _download(self, video_info):
+        try:
+            return self.video_generator._download_video(video_info)
+        except Exception as e:
+            logging.warning(f"MontageBuilder: Download of Pexels video {video_info['id']} failed: {e}")
+            return None
+
+    def _normalize(self, path):
+        try:
+            return self.video_generator.clip_store.normalize(path, os.path.basename(path))
+        except Exception as e:
+            logging.warning(f"MontageBuilder: Could not normalize '{path}': {e}")
+            return None
+
+    def choose(self, segments, results):
+        """
+        Picks one video per segment: clips not used yet come first, then the shortest that lasts as
+        long as the segment (less to download), else the longest available.
+        """
+        fps = self.video_generator.fps
+        used = set()
+        for segment, videos in zip(segments, results):
+            videos = [v for v in videos if self.video_generator._pick_video_file(v)]
+            fresh = [v for v in videos if v["id"] not in used] or videos
+            needed = (segment["end_frame"] - segment["start_frame"]) / fps
+            covering = [v for v in fresh if (v.get("duration") or 0) >= needed]
+            if covering:
+                choice = min(covering, key=lambda v: v["duration"])
+            else:
+                choice = max(fresh, key=lambda v: v.get("duration") or 0, default=None)
+            segment["video"] = choice
+            if choice:
+                used.add(choice["id"])
+
+    def build(self, events, duration, fallback_query):
+        """Background spec with 'parts', or None when no segment got a clip."""
+        fps = self.video_generator.fps
+        clip_store = self.video_generator.clip_store
+        segments = self.plan(events, duration, fallback_query)
+        logging.info(
+            f"MontageBuilder: {len(segments)} segments, queries: {[s['query'] for s in segments]}"
+        )
+
+        paths = {}
+        normalizing = {}
+
+        def submit(pool, fn, *args):
+            # Pool threads start with an empty context; each task runs in a copy of this one, so its
+            # spans land in the job's timeline and its child processes count toward the job's memory
+            return pool.submit(contextvars.copy_context().run, fn, *args)
+
+        # Network-bound fetches get one thread per pooled connection; normalizing is CPU-bound, so it gets
+        # one thread per core and starts on each clip as soon as its download lands
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="montage-fetch") as fetch_pool, \
+                ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="montage-normalize") as cpu_pool:
+            with metrics.span("montage.search"):
+                searches = [submit(fetch_pool, self._search, s["query"]) for s in segments]
+                results = [future.result() for future in searches]
+            self.choose(segments, results)
+
+            # Each distinct clip is downloaded and normalized once, even if several segments use it
+            videos = {s["video"]["id"]: s["video"] for s in segments if s["video"]}
+            with metrics.span("montage.download"):
+                downloads = {submit(fetch_pool, self._download, video): video_id for video_id, video in videos.items()}
+                for future in as_completed(downloads):
+                    video_id = downloads[future]
+                    paths[video_id] = future.result()
+                    if paths[video_id]:
+                        normalizing[video_id] = submit(cpu_pool, self._normalize, paths[video_id])
+            with metrics.span("montage.normalize"):
+                normalized = {video_id: future.result() for video_id, future in normalizing.items()}
+
+        available = [video_id for video_id in normalized if normalized[video_id]]
+        if not available:
+            return None
+        parts = []
+        for i, segment in enumerate(segments):
+            video_id = segment["video"]["id"] if segment["video"] else None
+            if not normalized.get(video_id):
+                video_id = available[i % len(available)]  # Failed segment: reuse a clip that did arrive
+            length = (segment["end_frame"] - segment["start_frame"]) / fps
+            parts.append({
+                "path": clip_store.loop_to_duration(normalized[video_id], length),  # Stream copy if too short
+                "normalized": True,
+                "source": os.path.basename(paths[video_id]),
+                "start_frame": segment["start_frame"],
+                "end_frame": segment["end_frame"],
+                "query": segment["query"],
+            })
+        logging.info(f"MontageBuilder: Montage of {len(parts)} parts from {len(available)} clips")
+        return {
+            "path": None,
+            "normalized": True,
+            "parts": parts,
+            "source": "montage:" + ",".join(f"{p['source']}@{p['start_frame']}" for p in parts),
+        }
@@ -0,0 +1,116 @@
+import time
+import logging
+import importlib
+import threading
+
+# Factories of the pipeline agents as 'module:callable' paths, so nothing is imported until it is needed
+AGENT_FACTORIES = {
+    "idea_gen": "agents.idea_generator:IdeaGenerator",
+    "script_gen": "agents.script_generator:ScriptGenerator",
+    "audio_gen": "agents.audio_generator:AudioGenerator",
+    "video_gen": "agents.video_generator:VideoGenerator",
+    "seo_optimizer": "agents.seo_optimizer:SEOOptimizer",
+    "stt_gen": "agents.stt_generator:STTGenerator",
+    "upload_queue": "agents.upload_queue:get_upload_queue",
+    "llm": "agents.llm_gateway:get_gateway",
+}
+
+
+def parse_agent_names(value):
+    """AGENT_WARMUP-style setting: 'all' -> None (every agent), '' -> [], 'a,b' -> ['a', 'b']."""
+    value = (value or "").strip()
+    if value.lower() == "all":
+        return None
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+class AgentRegistry:
+    """
+    Imports and constructs agents on first use. Agents are registered as factory paths, so neither an
+    agent nor its heavy dependencies (MoviePy, googleapiclient, groq, pyttsx3) load until a request needs
+    it, and a missing API key only fails the requests that use that agent. Construction is locked per
+    agent, so concurrent first requests build it once.
+    """
+
+    def __init__(self, factories=None):
+        self._factories = {}
+        self._instances = {}
+        self._locks = {}
+        for name, factory in (factories or {}).items():
+            self.register(name, factory)
+
+    def register(self, name, factory, configure=None):
+        """`factory` is a 'module:callable' path or a callable; configure(agent) runs once after it is built."""
+        self._factories[name] = (factory, configure)
+        self._locks[name] = threading.Lock()
+
+    def get(self, name):
+        agent = self._instances.get(name)
+        if agent is not None:
+            return agent
+        with self._locks[name]:
+            if name not in self._instances:
+                factory, configure = self._factories[name]
+                started = time.perf_counter()
+                if isinstance(factory, str):
+                    module_name, attribute = factory.split(":")
+                    factory = getattr(importlib.import_module(module_name), attribute)
+                agent = factory()
+                if configure:
+                    configure(agent)
+                self._instances[name] = agent
+                logging.info(f"AgentRegistry: Built '{name}' in {time.perf_counter() - started:.2f}s")
+            return self._instances[name]
+
+    __getitem__ = get
+
+    def lazy(self, name):
+        """A stand-in for module-level globals that builds the agent on first attribute access."""
+        return LazyAgent(self, name)
+
+    def loaded(self):
+        return list(self._instances)
+
+    def warm_up(self, names=None):
+        """
+        Builds the named agents (all when None) right away: from a worker-process initializer, before
+        forking workers, or in the background after startup. Failures are logged, not raised; the agent
+        is retried on first use.
+        """
+        for name in self._factories if names is None else names:
+            try:
+                self.get(name)
+            except Exception as e:
+                logging.warning(f"AgentRegistry: Warm-up of '{name}' failed: {e}")
+
+    def warm_up_in_background(self, names=None):
+        thread = threading.Thread(target=self.warm_up, args=(names,), name="agent-warmup", daemon=True)
+        thread.start()
+        return thread
+
+
+class LazyAgent:
+    """Proxy that forwards attribute access to a registry agent, building it the first time."""
+
+    __slots__ = ("_registry", "_name")
+
+    def __init__(self, registry, name):
+        object.__setattr__(self, "_registry", registry)
+        object.__setattr__(self, "_name", name)
+
+    def __getattr__(self, attribute):
+        return getattr(self._registry.get(self._name), attribute)
+
+    def __setattr__(self, attribute, value):
+        setattr(self._registry.get(self._name), attribute, value)
+
+    def __repr__(self):
+        state = "built" if self._name in self._registry.loaded() else "not built yet"
+        return f"<LazyAgent '{self._name}' ({state})>"
+
+
+def create_registry(names=None):
+    """Registry of the standard pipeline agents (or just `names`)."""
+    return AgentRegistry({
+        name: factory for name, factory in AGENT_FACTORIES.items() if names is None or name in names
+    })
@@ -0,0 +1,172 @@
+import os
+import json
+import time
+import random
+import hashlib
+import socket
+import logging
+import http.client
+import ssl
+import httplib2
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaFileUpload
+from agents import metrics
+
+# Transient failures worth resuming from the last committed byte; anything else fails the upload.
+# Network errors only: other OSErrors (a missing file, permissions, a full disk) fail fast.
+RETRIABLE_STATUS_CODES = (500, 502, 503, 504)
+RETRIABLE_EXCEPTIONS = (
+    httplib2.HttpLib2Error, http.client.HTTPException, ConnectionError, TimeoutError, socket.timeout,
+    socket.gaierror, ssl.SSLError
+)
+
+CHUNK_ALIGNMENT = 256 * 1024  # Resumable upload chunks must be multiples of 256 KiB
+
+
+class UploadSessionStore:
+    """Persists resumable session URIs on disk, one JSON file per upload fingerprint."""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, fingerprint):
+        return os.path.join(self.root, f"{fingerprint}.json")
+
+    def get(self, fingerprint):
+        try:
+            with open(self._path(fingerprint), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, fingerprint, session):
+        tmp_path = self._path(fingerprint) + ".part"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(session, f)
+        os.replace(tmp_path, self._path(fingerprint))
+
+    def delete(self, fingerprint):
+        try:
+            os.remove(self._path(fingerprint))
+        except OSError:
+            pass
+
+
+class ResumableUploader:
+    """
+    Uploads a video in fixed-size chunks through the YouTube resumable protocol. Transient errors
+    (5xx, dropped connections) are retried with exponential backoff and resume from the last byte the
+    server committed. The session URI is persisted as soon as it exists, so an upload interrupted by a
+    crash or restart continues where it stopped instead of starting over.
+    """
+
+    def __init__(self, session_dir=None, chunk_size=None, max_retries=None):
+        self.sessions = UploadSessionStore(session_dir or os.getenv("UPLOAD_SESSION_DIR", "assets/cache/uploads"))
+        chunk_size = chunk_size or int(float(os.getenv("UPLOAD_CHUNK_MB", "8")) * 1024 * 1024)
+        self.chunk_size = max(CHUNK_ALIGNMENT, chunk_size // CHUNK_ALIGNMENT * CHUNK_ALIGNMENT)
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("UPLOAD_MAX_RETRIES", "10"))
+
+    def fingerprint(self, video_path, body):
+        """Identifies one upload: the same file (path, size, mtime) with the same metadata."""
+        stat = os.stat(video_path)
+        payload = json.dumps(
+            [os.path.abspath(video_path), stat.st_size, int(stat.st_mtime), body], sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _backoff(self, attempt):
+        return min(60.0, 2 ** attempt) + random.uniform(0, 1)
+
+    def _request(self, youtube, video_path, body, part):
+        media = MediaFileUpload(video_path, chunksize=self.chunk_size, resumable=True)
+        return youtube.videos().insert(part=part, body=body, media_body=media)
+
+    def _query_session(self, request, resumable_uri, total):
+        """
+        Asks the upload endpoint how much of a saved session it already has (an empty PUT with
+        Content-Range: bytes */<size>) and points the request at that byte. Returns the API response
+        when the upload had already finished, else None. Raises HttpError like next_chunk().
+        """
+        resp, content = request.http.request(
+            resumable_uri, "PUT", headers={"Content-Range": f"bytes */{total}", "Content-Length": "0"}
+        )
+        if resp.status in (200, 201):
+            return request.postproc(resp, content)
+        if resp.status != 308:
+            raise HttpError(resp, content, uri=resumable_uri)
+        # "Range: bytes=0-<last byte>" covers what was committed; no Range header means nothing was
+        byte_range = resp.get("range")
+        request.resumable_progress = int(byte_range.split("-")[1]) + 1 if byte_range else 0
+        request.resumable_uri = resp.get("location", resumable_uri)
+        return None
+
+    def upload(self, youtube, video_path, body, part="snippet,status", progress_callback=None):
+        """
+        Runs videos.insert for video_path and returns the API response (the video resource).
+        progress_callback(bytes_sent, total_bytes) is called after every chunk.
+        """
+        fingerprint = self.fingerprint(video_path, body)
+        session = self.sessions.get(fingerprint)
+        if session:
+            logging.info(f"ResumableUploader: Resuming upload of '{video_path}'")
+        request = self._request(youtube, video_path, body, part)
+        total = os.path.getsize(video_path)
+
+        response = None
+        attempt = 0
+        resume = session is not None  # Ask the server what it already has before sending anything
+        while response is None:
+            error = None
+            committed = request.resumable_progress
+            try:
+                if resume:
+                    response = self._query_session(request, session["resumable_uri"], total)
+                    resume = False
+                    logging.info(f"ResumableUploader: Server has {request.resumable_progress}/{total} bytes")
+                    if progress_callback and response is None:
+                        progress_callback(request.resumable_progress, total)
+                    continue
+                status, response = request.next_chunk()
+                sent = total if response is not None else request.resumable_progress
+                metrics.inc("upload_bytes_total", max(0, sent - committed), target="youtube")
+                if status and progress_callback:
+                    progress_callback(status.resumable_progress, total)
+                attempt = 0
+            except HttpError as e:
+                if session and e.resp.status in (404, 410):
+                    # The saved session expired on the server side; start a fresh one
+                    logging.warning("ResumableUploader: Saved upload session expired, starting over")
+                    self.sessions.delete(fingerprint)
+                    session = None
+                    resume = False
+                    request = self._request(youtube, video_path, body, part)
+                    continue
+                if e.resp.status not in RETRIABLE_STATUS_CODES:
+                    raise
+                error = e
+            except RETRIABLE_EXCEPTIONS as e:
+                error = e
+
+            # Persist the session URI the moment the server hands it out
+            if request.resumable_uri and (not session or session["resumable_uri"] != request.resumable_uri):
+                session = {"resumable_uri": request.resumable_uri, "video_path": os.path.abspath(video_path),
+                           "created_at": time.time()}
+                self.sessions.put(fingerprint, session)
+
+            if error is not None:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise error
+                delay = self._backoff(attempt)
+                logging.warning(
+                    f"ResumableUploader: {type(error).__name__} at byte {request.resumable_progress}/{total}, "
+                    f"retry {attempt}/{self.max_retries} in {delay:.1f}s"
+                )
+                time.sleep(delay)
+
+        self.sessions.delete(fingerprint)
+        if progress_callback:
+            progress_callback(total, total)
+        logging.info(f"ResumableUploader: Uploaded '{video_path}' as video {response.get('id')}")
+        return response
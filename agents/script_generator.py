@@ -1,18 +1,21 @@
 import os
-import groq
+import re
+import time
 from dotenv import load_dotenv
+from agents.llm_gateway import get_gateway
+from agents.metrics import traced
 
 load_dotenv()
 
 class ScriptGenerator:
     def __init__(self):
-        api_key = os.getenv("GROQ_API_KEY")
-        if not api_key:
+        self.llm = get_gateway() # Shared pooled Groq client with rate limiting
+        if not self.llm.available:
             raise ValueError("Missing GROQ_API_KEY in .env file")
-        self.client = groq.Client(api_key=api_key)
+        self.cache_ttl = int(os.getenv("LLM_CACHE_TTL_SCRIPT", str(24 * 3600))) # Seconds
 
-    def generate_script(self, video_idea, max_words=200):
-        prompt = f"""
+    def _prompt(self, video_idea, max_words):
+        return f"""
 Write a natural, engaging, human-sounding YouTube video script for the topic: "{video_idea}".
 
 Guidelines:
@@ -26,12 +29,17 @@ Just write the script as if a human YouTuber is saying it aloud in one fluid tak
 Keep the script under {max_words} words.
 """
 
+    @traced("script.generate")
+    def generate_script(self, video_idea, max_words=200, regenerate=False):
+        prompt = self._prompt(video_idea, max_words)
+
         try:
-            response = self.client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model="llama3-70b-8192"
-            )
-            script = response.choices[0].message.content.strip()
+            script = self.llm.complete(
+                [{"role": "user", "content": prompt}],
+                model="llama3-70b-8192",
+                cache_ttl=self.cache_ttl,
+                bypass_cache=regenerate # "Regenerate" asks for a fresh script instead of the cached one
+            ).strip()
 
             # Trim extra if somehow still too long (fallback)
             words = script.split()
@@ -42,3 +50,45 @@ Keep the script under {max_words} words.
         except Exception as e:
             print(f"❌ Error generating script: {e}")
             return "Sorry, something went wrong while generating the script."
+
+    def stream_script(self, video_idea, max_words=200, regenerate=False):
+        """
+        Yields the script as it is generated. The max_words cutoff is enforced on the fly: once the
+        limit is reached the upstream stream is closed instead of trimming the finished script, and
+        the cut script is cached for generate_script() and later streams of the same idea.
+        """
+        prompt = self._prompt(video_idea, max_words)
+        messages = [{"role": "user", "content": prompt}]
+        started = time.perf_counter()
+        stream = self.llm.stream(
+            messages,
+            model="llama3-70b-8192",
+            cache_ttl=self.cache_ttl,
+            bypass_cache=regenerate
+        )
+        text = ""
+        emitted = 0 # Characters of `text` already sent to the caller
+        try:
+            for delta in stream:
+                text += delta
+                words = list(re.finditer(r"\S+", text))
+                if len(words) > max_words:
+                    # Cut after the last allowed word; anything past it is never sent
+                    script = text[:words[max_words - 1].end()] + "..."
+                    # Cached as sent, so generate_script() and later streams reuse it
+                    self.llm.remember(
+                        messages, script.strip(), model="llama3-70b-8192", cache_ttl=self.cache_ttl,
+                        latency=time.perf_counter() - started
+                    )
+                    yield script[emitted:]
+                    return
+                if not emitted:
+                    # Drop leading whitespace, mirroring .strip() in generate_script
+                    text = text.lstrip()
+                # Trailing whitespace waits for the next word, so a cut lands right after a word
+                sendable = len(text.rstrip())
+                if sendable > emitted:
+                    yield text[emitted:sendable]
+                    emitted = sendable
+        finally:
+            stream.close() # Stops generation (and billing) when the limit is hit or the client leaves
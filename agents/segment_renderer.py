@@ -0,0 +1,228 @@
+import os
+import hashlib
+import logging
+import tempfile
+import subprocess
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import imageio_ffmpeg
+from agents.video_encoder import StreamingEncoder
+from agents.memory_budget import MemoryWatch, MemoryLimitExceeded
+from agents import memory_budget
+from agents.audio_assets import is_aac
+from agents import metrics
+
+
+def plan_segments(events, duration, count, fps):
+    """
+    Splits [0, duration) into `count` frame-aligned segments, moving each cut to the nearest gap
+    between subtitle events so no caption straddles two segments. Returns [(start_frame, end_frame)].
+    """
+    total_frames = int(duration * fps)
+    count = max(1, min(int(count), total_frames or 1))
+
+    # Candidate cut points: the start of every event that begins after the previous one ended
+    gaps = []
+    last_end = 0.0
+    for start, end, _ in sorted(events):
+        if start >= last_end:
+            gaps.append(start)
+        last_end = max(last_end, end)
+
+    cuts = []
+    for k in range(1, count):
+        ideal = duration * k / count
+        cut = ideal
+        if gaps:
+            i = bisect_left(gaps, ideal)
+            nearest = min(gaps[max(i - 1, 0):i + 1], key=lambda g: abs(g - ideal))
+            # Only snap when the gap is reasonably close; otherwise keep the even split
+            if abs(nearest - ideal) <= duration / (2 * count):
+                cut = nearest
+        cut_frame = int(round(cut * fps))
+        if (cuts[-1] if cuts else 0) < cut_frame < total_frames:
+            cuts.append(cut_frame)
+
+    bounds = [0] + cuts + [total_frames]
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)]
+
+
+def plan_segments_by_content(events, duration, target_seconds):
+    """
+    Splits [0, duration) into segments of roughly target_seconds for caching. Cuts fall where a
+    sentence ends and are chosen by a hash of that sentence's text once a segment is at least half
+    the target long (forced at twice the target), so where the timeline is cut depends on the words
+    around the cut, not on their position. An edit only moves the cuts next to the changed sentence:
+    the segments after it keep their text and relative timing and are merely shifted in time.
+    Returns [(start_seconds, end_seconds)].
+    """
+    min_seconds, max_seconds = target_seconds / 2, target_seconds * 2
+    ordered = sorted(events)
+    punctuated = any(text.rstrip().endswith((".", "!", "?")) for _, _, text in ordered)
+
+    # Candidate cuts: the start of every caption that begins after the previous ones ended, with the
+    # words since the last sentence end and whether a sentence ends right before it
+    candidates = []
+    words = []
+    last_end = 0.0
+    for start, end, text in ordered:
+        if words and start >= last_end and start > 0:
+            sentence_end = words[-1].rstrip().endswith((".", "!", "?")) or not punctuated
+            candidates.append((start, " ".join(words), sentence_end))
+            if sentence_end:
+                words = []
+        words.append(text)
+        last_end = max(last_end, end)
+
+    cuts = [0.0]
+    for i, (cut, sentence, sentence_end) in enumerate(candidates):
+        if cut >= duration:
+            break
+        # No caption gap for a long stretch (e.g. one caption for the whole script): cut on the timeline
+        while cut - cuts[-1] > max_seconds:
+            cuts.append(cuts[-1] + target_seconds)
+        if cut - cuts[-1] < min_seconds:
+            continue
+        following = candidates[i + 1][0] if i + 1 < len(candidates) else duration
+        if following - cuts[-1] > max_seconds or (
+                sentence_end and hashlib.sha1(sentence.encode("utf-8")).digest()[0] & 1 == 0):
+            cuts.append(cut)
+    while duration - cuts[-1] > max_seconds:
+        cuts.append(cuts[-1] + target_seconds)
+    if len(cuts) > 1 and duration - cuts[-1] < min_seconds:
+        cuts.pop()  # A short tail joins the segment before it
+    bounds = cuts + [duration]
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)]
+
+
+def render_segment(background, events, duration, start_frame, end_frame, output_path, profile, crf, threads,
+                   memory_limit_mb=None, background_start=None):
+    """
+    Renders frames [start_frame, end_frame) of the timeline into a video-only file, over background
+    frames from background_start on (start_frame by default). Runs inside a worker process, so it
+    builds its own VideoGenerator. memory_limit_mb is this worker's share of the render's memory limit.
+    """
+    from agents.video_generator import VideoGenerator
+
+    video_gen = VideoGenerator()
+    video_gen.memory_limit_mb = memory_limit_mb
+    encoder = StreamingEncoder(
+        output_path, (video_gen.video_width, video_gen.video_height), fps=video_gen.fps,
+        profile=profile, crf=crf, threads=threads, queue_depth=video_gen.prefetch_depth
+    )
+    # Each worker keeps itself under its share of the render's memory limit (the parent checks all workers)
+    with MemoryWatch(video_gen.memory_limit_mb, on_pressure=[video_gen.subtitle_renderer.trim],
+                     name=f"Segment {start_frame}-{end_frame}"):
+        frames = video_gen.composited_frames(background, events, duration, start_frame, end_frame, background_start)
+        return encoder.write(frames, end_frame - start_frame)
+
+
+def worker_memory_limit(video_generator, workers):
+    """Each segment worker's share of the render's memory limit, or None when renders are unbounded."""
+    if not video_generator.memory_limit_mb:
+        return None
+    return max(1, video_generator.memory_limit_mb // workers)
+
+
+def wait_for_segments(pool, futures, on_done, poll_interval=0.25):
+    """
+    Calls on_done(future) as each segment finishes, checking the render's memory limit while waiting.
+    On a breach the queued segments are cancelled and the workers terminated before the error is
+    raised, instead of leaving the pool to finish every queued segment first.
+    """
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            for process in list((pool._processes or {}).values()):
+                memory_budget.track(process.pid)  # The workers count toward this render, not the others
+            for future in done:
+                on_done(future)
+            memory_budget.check()
+    except MemoryLimitExceeded:
+        pool.shutdown(wait=False, cancel_futures=True)
+        for process in list((pool._processes or {}).values()):
+            process.terminate()
+        raise
+
+
+class SegmentedRenderer:
+    """
+    Renders one video as N timeline segments encoded in separate processes, then joins them with the
+    ffmpeg concat demuxer (stream copy) and muxes the AAC audio once (also stream copy when it is
+    already AAC). libx264 threading plateaus well
+    below high core counts at 1080x1920; independent segment encoders keep every core busy.
+    """
+
+    def __init__(self, video_generator):
+        self.video_generator = video_generator
+        self.ffmpeg = imageio_ffmpeg.get_ffmpeg_exe()
+
+    def _run(self, args):
+        cmd = [self.ffmpeg, "-y", "-loglevel", "error"] + args
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed ({result.returncode}): {result.stderr.decode(errors='replace').strip()}")
+
+    @metrics.traced("render.concat_mux")
+    def concat_and_mux(self, segment_paths, audio_path, output_path, durations=None):
+        """
+        Joins encoded segments without re-encoding and adds the audio track in the same pass. With
+        `durations` (seconds), each segment starts that long after the previous one instead of right
+        after its last frame, so segments cut off the frame grid stay in sync with the audio.
+        """
+        audio_codec = "copy" if audio_path and is_aac(audio_path) else "aac"
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False, encoding="utf-8") as f:
+            for i, path in enumerate(segment_paths):
+                f.write(f"file '{os.path.abspath(path)}'\n")
+                if durations:
+                    f.write(f"duration {durations[i]:.6f}\n")
+            list_path = f.name
+        try:
+            args = ["-f", "concat", "-safe", "0", "-i", list_path]
+            if audio_path:
+                args += ["-i", audio_path, "-map", "0:v:0", "-map", "1:a:0", "-c:a", audio_codec, "-shortest"]
+            args += ["-c:v", "copy", "-movflags", "+faststart", output_path]
+            self._run(args)
+        finally:
+            os.remove(list_path)
+
+    def render(self, background, events, duration, audio_path, output_path, segments,
+               profile=None, crf=None, progress_callback=None):
+        fps = self.video_generator.fps
+        plan = plan_segments(events, duration, segments, fps)
+        total_frames = plan[-1][1]
+        threads = max(1, (os.cpu_count() or 1) // len(plan))
+        logging.info(f"SegmentedRenderer: Rendering {total_frames} frames as {len(plan)} segments: {plan}")
+
+        work_dir = tempfile.mkdtemp(prefix="segments_", dir=os.path.dirname(os.path.abspath(output_path)))
+        segment_paths = [os.path.join(work_dir, f"segment_{i:03d}.mp4") for i in range(len(plan))]
+        try:
+            frames_done = 0
+            memory_limit_mb = worker_memory_limit(self.video_generator, len(plan))
+
+            def segment_done(future):
+                nonlocal frames_done
+                frames = future.result()
+                frames_done += frames
+                # Counters in the worker processes are lost with them; count here instead
+                metrics.inc("frames_encoded_total", frames)
+                if progress_callback:
+                    progress_callback(frames_done, total_frames)
+
+            with metrics.span("render.segments"), ProcessPoolExecutor(max_workers=len(plan)) as pool:
+                futures = [
+                    pool.submit(render_segment, background, events, duration, start, end, path, profile, crf, threads,
+                                memory_limit_mb)
+                    for (start, end), path in zip(plan, segment_paths)
+                ]
+                wait_for_segments(pool, futures, segment_done)
+
+            self.concat_and_mux(segment_paths, audio_path, output_path)
+        finally:
+            for path in segment_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+            os.rmdir(work_dir)
+        logging.info(f"SegmentedRenderer: Joined {len(plan)} segments into '{output_path}'")
+        return output_path
@@ -1,26 +1,45 @@
 import os
-import groq
 from dotenv import load_dotenv
+from agents.llm_gateway import get_gateway
+from agents.metrics import traced
 
 load_dotenv()
 
 class SEOOptimizer:
     def __init__(self):
-        self.client = groq.Client(api_key=os.getenv("GROQ_API_KEY"))
-    
-    def optimize(self, video_path, script):
-        prompt = f"""Based on this video script: '{script}', generate SEO-optimized:
+        self.llm = get_gateway() # Shared pooled Groq client with rate limiting
+        self.model = "llama3-8b-8192"
+        self.cache_ttl = int(os.getenv("LLM_CACHE_TTL_SEO", str(7 * 24 * 3600))) # Seconds
+
+    def _prompt(self, script):
+        return f"""Based on this video script: '{script}', generate SEO-optimized:
         1. A catchy YouTube title
         2. A compelling description (at least 200 words)
         3. 10 relevant hashtags
         4. 5 suggested tags
         
         Format the response as a JSON object with keys: title, description, hashtags, tags"""
-        
-        response = self.client.chat.completions.create(
-            messages=[{"role": "user", "content": prompt}],
-            model="llama3-8b-8192",
-            response_format={"type": "json_object"}
+    
+    @traced("seo.optimize")
+    def optimize(self, video_path, script, regenerate=False):
+        return self.llm.complete(
+            [{"role": "user", "content": self._prompt(script)}],
+            model=self.model,
+            response_format={"type": "json_object"},
+            cache_ttl=self.cache_ttl,
+            bypass_cache=regenerate
         )
-        
-        return response.choices[0].message.content
\ No newline at end of file
+
+    @traced("seo.optimize_many")
+    def optimize_many(self, scripts, regenerate=False):
+        """Runs SEO for several scripts concurrently. Failed entries come back as exceptions."""
+        return self.llm.complete_many([
+            {
+                "messages": [{"role": "user", "content": self._prompt(script)}],
+                "model": self.model,
+                "response_format": {"type": "json_object"},
+                "cache_ttl": self.cache_ttl,
+                "bypass_cache": regenerate,
+            }
+            for script in scripts
+        ])
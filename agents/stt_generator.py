@@ -3,24 +3,78 @@ import requests
 import time
 import json
 import logging
+import threading
 from dotenv import load_dotenv
+from agents.forced_aligner import ForcedAligner
+from agents.audio_assets import find_aac, probe_duration
+from agents import metrics
 
 load_dotenv() # Load environment variables from .env file
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+EARLY_WEBHOOK_TTL = 600 # Seconds a webhook that arrived before its waiter registered is remembered
+
 class STTGenerator:
     def __init__(self):
         self.api_key = os.getenv("ASSEMBLYAI_API_KEY")
         if not self.api_key:
             logging.error("ASSEMBLYAI_API_KEY not found in .env file. Speech-to-Text will not work.")
-        self.base_url = "https://api.assemblyai.com/v2"
+        self.base_url = os.getenv("ASSEMBLYAI_API_URL", "https://api.assemblyai.com/v2").rstrip("/")
+        # Public URL of this app's /stt_webhook route; when set AssemblyAI pushes completion instead of us polling
+        self.webhook_url = os.getenv("ASSEMBLYAI_WEBHOOK_URL")
+        self.webhook_secret = os.getenv("ASSEMBLYAI_WEBHOOK_SECRET")
+        self.timeout = float(os.getenv("STT_TIMEOUT", "0")) or None  # Overall deadline; default scales with audio
+        self.session = requests.Session() # Keep-alive across upload, submit and polls
+        self._pending = {}
+        self._early = {} # transcript_id -> arrival time of webhooks nobody was waiting for yet
+        self._pending_lock = threading.Lock()
 
         self.headers = {
             "authorization": self.api_key,
             "content-type": "application/json"
         }
 
+        # "local" aligns the known script offline and only falls back to AssemblyAI; "assemblyai" always uploads
+        self.engine = os.getenv("STT_ENGINE", "local").lower()
+        self.aligner = ForcedAligner()
+
+    @metrics.traced("stt.align")
+    def align_script(self, script, audio_file_path):
+        """
+        Word timings for audio we synthesized ourselves, computed offline from the known script.
+        Returns the same list of {'text', 'start', 'end'} dictionaries as transcribe_audio, or None.
+        """
+        if not script or not script.strip():
+            return None
+        if not os.path.exists(audio_file_path):
+            logging.error(f"Audio file not found for alignment: {audio_file_path}")
+            return None
+        try:
+            started = time.perf_counter()
+            # Sentence offsets written by chunked TTS anchor the alignment when present
+            chunks = None
+            chunks_path = audio_file_path + ".chunks.json"
+            if os.path.exists(chunks_path):
+                with open(chunks_path, "r", encoding="utf-8") as f:
+                    chunks = json.load(f)
+            words = self.aligner.align(script, audio_file_path, chunks)
+            logging.info(f"STTGenerator: Aligned {len(words)} words locally in {time.perf_counter() - started:.2f}s")
+            return words
+        except Exception as e:
+            logging.error(f"STTGenerator: Local alignment failed: {e}")
+            return None
+
+    @metrics.traced("stt.word_timings")
+    def word_timings(self, audio_file_path, script=None):
+        """Local alignment when the script is known (STT_ENGINE=local), AssemblyAI otherwise or on failure."""
+        if self.engine == "local" and script:
+            words = self.align_script(script, audio_file_path)
+            if words:
+                return words
+            logging.warning("STTGenerator: Falling back to AssemblyAI transcription")
+        return self.transcribe_audio(audio_file_path)
+
     def _read_file(self, audio_file_path, chunk_size=5242880):
         """Reads a file in chunks for uploading."""
         with open(audio_file_path, 'rb') as f:
@@ -44,14 +98,16 @@ class STTGenerator:
 
         logging.info(f"STTGenerator: Starting transcription for {audio_file_path}")
 
-        # 1. Upload the audio file
+        # 1. Upload the audio file (its AAC rendition when there is one: a fraction of the WAV's size)
         upload_url = f"{self.base_url}/upload"
+        upload_path = find_aac(audio_file_path) or audio_file_path
         try:
-            upload_response = requests.post(
-                upload_url,
-                headers={'authorization': self.api_key}, # Authorization header for upload is slightly different
-                data=self._read_file(audio_file_path)
-            )
+            with metrics.span("stt.upload"):
+                upload_response = self.session.post(
+                    upload_url,
+                    headers={'authorization': self.api_key}, # Authorization header for upload is slightly different
+                    data=metrics.count_bytes(self._read_file(upload_path), "upload_bytes_total", target="assemblyai")
+                )
             upload_response.raise_for_status()
             upload_data = upload_response.json()
             audio_url = upload_data["upload_url"]
@@ -63,15 +119,22 @@ class STTGenerator:
             logging.error(f"STTGenerator: An unexpected error occurred during audio upload: {e}")
             return None
 
+        audio_duration = probe_duration(audio_file_path) # Scales the poll schedule; read before submitting
+
         # 2. Submit for transcription
         json_data = {
             "audio_url": audio_url,
             "word_timestamps": True, # Request word-level timings
             "language_code": "en_us" # Specify language for better accuracy
         }
+        if self.webhook_url:
+            json_data["webhook_url"] = self.webhook_url
+            if self.webhook_secret:
+                json_data["webhook_auth_header_name"] = "X-Webhook-Secret"
+                json_data["webhook_auth_header_value"] = self.webhook_secret
         transcript_url = f"{self.base_url}/transcript"
         try:
-            post_response = requests.post(
+            post_response = self.session.post(
                 transcript_url,
                 json=json_data,
                 headers=self.headers
@@ -79,37 +142,92 @@ class STTGenerator:
             post_response.raise_for_status()
             post_data = post_response.json()
             transcript_id = post_data["id"]
+            # Registered before anything else runs, so a webhook that arrives right away is not lost
+            event = self._register(transcript_id)
             logging.info(f"STTGenerator: Transcription request submitted. ID: {transcript_id}")
         except requests.exceptions.RequestException as e:
             logging.error(f"STTGenerator: Error submitting transcription request to AssemblyAI: {e}")
             return None
 
-        # 3. Poll for transcription results
+        # 3. Wait for the result: webhook push when configured, adaptive polling as the safety net
+        with metrics.span("stt.wait"):
+            return self._wait_for_transcript(transcript_id, audio_duration, event)
+
+    def poll_schedule(self, audio_duration):
+        """
+        (first delay, max delay, deadline) in seconds. Transcription takes a fraction of the audio's
+        length, so short clips are checked almost immediately and long ones back off further.
+        """
+        duration = audio_duration or 60.0
+        first_delay = min(5.0, max(0.5, 0.05 * duration))
+        max_delay = min(15.0, max(2.0, 0.25 * duration))
+        deadline = self.timeout or max(120.0, 3 * duration + 60)
+        return first_delay, max_delay, deadline
+
+    def _register(self, transcript_id):
+        """The Event a waiter blocks on; already set when the webhook for transcript_id came in first."""
+        event = threading.Event()
+        with self._pending_lock:
+            self._pending[transcript_id] = event
+            if self._early.pop(transcript_id, None) is not None:
+                event.set()
+        return event
+
+    def notify(self, transcript_id, status=None):
+        """
+        Called by the webhook route; wakes the waiter for transcript_id. Returns False if nobody waits
+        yet, in which case the notification is kept for a few minutes for a waiter that registers late.
+        """
+        with self._pending_lock:
+            event = self._pending.get(transcript_id)
+            if event is None:
+                now = time.monotonic()
+                self._early = {k: t for k, t in self._early.items() if now - t < EARLY_WEBHOOK_TTL}
+                self._early[transcript_id] = now
+                return False
+        logging.info(f"STTGenerator: Webhook received for {transcript_id} (status: {status})")
+        event.set()
+        return True
+
+    def _wait_for_transcript(self, transcript_id, audio_duration, event=None):
         polling_endpoint = f"{self.base_url}/transcript/{transcript_id}"
-        while True:
-            try:
-                polling_response = requests.get(polling_endpoint, headers=self.headers)
-                polling_response.raise_for_status()
-                polling_data = polling_response.json()
-                
-                status = polling_data["status"]
-                logging.info(f"STTGenerator: Transcription status: {status}")
+        delay, max_delay, deadline = self.poll_schedule(audio_duration)
+        started = time.monotonic()
+        event = event or self._register(transcript_id)
+        try:
+            while True:
+                remaining = deadline - (time.monotonic() - started)
+                if remaining <= 0:
+                    logging.error(f"STTGenerator: Transcription {transcript_id} timed out after {deadline:.0f}s")
+                    return None
+                # Returns early when the webhook fires; otherwise this is the poll interval
+                event.wait(min(delay, remaining))
+                event.clear()
+                delay = min(max_delay, delay * 1.6)
+                try:
+                    polling_response = self.session.get(polling_endpoint, headers=self.headers, timeout=30)
+                    polling_response.raise_for_status()
+                    polling_data = polling_response.json()
+                except requests.exceptions.RequestException as e:
+                    # A transient polling error is retried until the deadline instead of failing the job
+                    logging.warning(f"STTGenerator: Error polling transcription results from AssemblyAI: {e}")
+                    continue
 
+                status = polling_data.get("status") if isinstance(polling_data, dict) else None
+                if status is None:
+                    # Malformed response: treat it like a transient error and poll again until the deadline
+                    logging.warning(f"STTGenerator: Polling response for {transcript_id} has no status: {polling_data!r:.200}")
+                    continue
+                logging.info(f"STTGenerator: Transcription status: {status} after {time.monotonic() - started:.1f}s")
                 if status == "completed":
                     if "words" in polling_data:
                         logging.info("STTGenerator: Transcription completed successfully with word timings.")
                         return polling_data["words"]
-                    else:
-                        logging.error("STTGenerator: Transcription completed but 'words' field not found.")
-                        return None
+                    logging.error("STTGenerator: Transcription completed but 'words' field not found.")
+                    return None
                 elif status == "error":
                     logging.error(f"STTGenerator: Transcription failed: {polling_data.get('error')}")
                     return None
-                else:
-                    time.sleep(3) # Wait before polling again
-            except requests.exceptions.RequestException as e:
-                logging.error(f"STTGenerator: Error polling transcription results from AssemblyAI: {e}")
-                return None
-            except Exception as e:
-                logging.error(f"STTGenerator: An unexpected error occurred during polling: {e}")
-                return None
\ No newline at end of file
+        finally:
+            with self._pending_lock:
+                self._pending.pop(transcript_id, None)
@@ -0,0 +1,183 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# ImageMagick font names (as used by TextClip) mapped to TrueType files Pillow can load.
+# Pillow searches the platform font directories for bare file names.
+FONT_FILE_CANDIDATES = {
+    "Arial-Bold": ["arialbd.ttf", "Arial Bold.ttf", "Arial_Bold.ttf", "LiberationSans-Bold.ttf", "DejaVuSans-Bold.ttf"],
+    "Arial": ["arial.ttf", "Arial.ttf", "LiberationSans-Regular.ttf", "DejaVuSans.ttf"],
+}
+
+COLOR_NAMES = {
+    "white": (255, 255, 255),
+    "black": (0, 0, 0),
+    "yellow": (255, 255, 0),
+    "red": (255, 0, 0),
+}
+
+
+class SubtitleRenderer:
+    """
+    Rasterizes subtitle text with Pillow instead of one ImageMagick TextClip per word.
+    Every glyph is drawn once into a glyph atlas; words are assembled from the atlas and
+    cached as RGBA bitmaps, so a 500-word script only rasterizes its unique characters.
+    Word bitmaps and their blend arrays share an LRU budget of cache_mb (SUBTITLE_CACHE_MB), so a
+    long-form script cannot hold thousands of caption bitmaps at once; evicted ones are redrawn
+    from the atlas if they come up again.
+    """
+
+    def __init__(self, font, fontsize, text_color='white', stroke_color='black', stroke_width=1.5, max_width=None,
+                 cache_mb=None):
+        self.fontsize = fontsize
+        self.text_color = self._parse_color(text_color)
+        self.stroke_color = self._parse_color(stroke_color)
+        self.stroke_width = int(round(stroke_width)) if stroke_width else 0
+        self.max_width = int(max_width) if max_width else None
+        self.font = self._load_font(font, fontsize)
+
+        ascent, descent = self.font.getmetrics()
+        self.line_height = ascent + descent + 2 * self.stroke_width
+        self.line_spacing = int(self.fontsize * 0.2)
+
+        self._glyph_atlas = {}  # char -> (RGBA Image, advance in px)
+        # LRU of ('bitmap', text) -> RGBA np.ndarray (h, w, 4) uint8
+        # and ('blend', text) -> (premultiplied rgb float32, inverse alpha float32), with their sizes
+        self._cache = OrderedDict()
+        self.cache_bytes = int((cache_mb or float(os.getenv("SUBTITLE_CACHE_MB", "256"))) * 1024 * 1024)
+        self._cached_bytes = 0
+        self._cache_lock = threading.RLock()  # Shared by concurrent renders and trimmed from the memory watch
+        self.evictions = 0
+
+    @staticmethod
+    def _parse_color(color):
+        if isinstance(color, (tuple, list)):
+            return tuple(int(c) for c in color[:3])
+        if isinstance(color, str) and color.startswith("#") and len(color) == 7:
+            return tuple(int(color[i:i + 2], 16) for i in (1, 3, 5))
+        return COLOR_NAMES.get(str(color).lower(), (255, 255, 255))
+
+    @staticmethod
+    def _load_font(font, fontsize):
+        """Resolves an ImageMagick-style font name or a font file path to a Pillow font."""
+        candidates = [font] + FONT_FILE_CANDIDATES.get(font, []) + ["DejaVuSans-Bold.ttf"]
+        for candidate in candidates:
+            try:
+                return ImageFont.truetype(candidate, fontsize)
+            except (OSError, ValueError):
+                continue
+        logging.warning(f"SubtitleRenderer: No TrueType font found for '{font}'. Using Pillow's default font.")
+        return ImageFont.load_default(size=fontsize)
+
+    def _glyph(self, char):
+        """Returns the atlas entry for a character, rasterizing it on first use."""
+        entry = self._glyph_atlas.get(char)
+        if entry is None:
+            advance = int(round(self.font.getlength(char)))
+            pad = self.stroke_width
+            cell = Image.new("RGBA", (max(advance, 1) + 2 * pad, self.line_height), (0, 0, 0, 0))
+            if not char.isspace():
+                ImageDraw.Draw(cell).text(
+                    (pad, pad), char, font=self.font, fill=self.text_color + (255,),
+                    stroke_width=self.stroke_width, stroke_fill=self.stroke_color + (255,)
+                )
+            entry = (cell, advance)
+            self._glyph_atlas[char] = entry
+        return entry
+
+    def _line_width(self, text):
+        return sum(self._glyph(c)[1] for c in text) + 2 * self.stroke_width
+
+    def _render_line(self, text):
+        canvas = Image.new("RGBA", (max(self._line_width(text), 1), self.line_height), (0, 0, 0, 0))
+        x = 0
+        for char in text:
+            cell, advance = self._glyph(char)
+            if not char.isspace():
+                # alpha_composite so a glyph's stroke overlapping its neighbour blends instead of overwriting it
+                canvas.alpha_composite(cell, (x, 0))
+            x += advance
+        return canvas
+
+    def _wrap(self, text):
+        """Greedy word wrap against max_width, mirroring TextClip(method='caption')."""
+        words = text.split()
+        if not self.max_width or not words:
+            return [" ".join(words)]
+        lines, current = [], words[0]
+        for word in words[1:]:
+            candidate = f"{current} {word}"
+            if self._line_width(candidate) <= self.max_width:
+                current = candidate
+            else:
+                lines.append(current)
+                current = word
+        lines.append(current)
+        return lines
+
+    def _cached(self, key):
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            self._cache.move_to_end(key)
+            return entry[0]
+
+    def _remember(self, key, value, nbytes):
+        """Caches an entry, evicting least recently used ones (never the new one) over the budget."""
+        with self._cache_lock:
+            previous = self._cache.pop(key, None)
+            if previous is not None:
+                self._cached_bytes -= previous[1]  # Rendered concurrently by another job
+            self._cache[key] = (value, nbytes)
+            self._cached_bytes += nbytes
+            self.trim(self.cache_bytes, keep=1)
+        return value
+
+    def trim(self, max_bytes=0, keep=0):
+        """Evicts cached bitmaps down to max_bytes, e.g. when a render runs short of memory."""
+        with self._cache_lock:
+            while len(self._cache) > keep and self._cached_bytes > max_bytes:
+                _, (_, nbytes) = self._cache.popitem(last=False)
+                self._cached_bytes -= nbytes
+                self.evictions += 1
+
+    def render(self, text):
+        """Returns the cached RGBA bitmap (h, w, 4 uint8) for a word or caption."""
+        bitmap = self._cached(("bitmap", text))
+        if bitmap is not None:
+            return bitmap
+
+        lines = [self._render_line(line) for line in self._wrap(text)]
+        width = max(line.width for line in lines)
+        height = len(lines) * self.line_height + (len(lines) - 1) * self.line_spacing
+        image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+        y = 0
+        for line in lines:
+            image.alpha_composite(line, ((width - line.width) // 2, y))
+            y += self.line_height + self.line_spacing
+
+        # A single word wider than the frame cannot wrap; shrink it to fit instead of clipping
+        if self.max_width and image.width > self.max_width:
+            scale = self.max_width / image.width
+            image = image.resize((self.max_width, max(1, int(image.height * scale))), Image.LANCZOS)
+
+        bitmap = np.asarray(image, dtype=np.uint8)
+        return self._remember(("bitmap", text), bitmap, bitmap.nbytes)
+
+    def prepare(self, texts):
+        """Pre-renders every unique text once. Returns {text: bitmap}."""
+        return {text: self.render(text) for text in dict.fromkeys(texts)}
+
+    def blend_arrays(self, text):
+        """Returns (premultiplied rgb, inverse alpha) float32 arrays for fast per-frame blending."""
+        cached = self._cached(("blend", text))
+        if cached is not None:
+            return cached
+        bitmap = self.render(text)
+        alpha = bitmap[:, :, 3:4].astype(np.float32) / 255.0
+        cached = (bitmap[:, :, :3].astype(np.float32) * alpha, 1.0 - alpha)
+        return self._remember(("blend", text), cached, cached[0].nbytes + cached[1].nbytes)
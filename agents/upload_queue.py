@@ -0,0 +1,445 @@
+import os
+import sys
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaFileUpload
+from agents.resumable_upload import ResumableUploader
+from agents import metrics
+
+load_dotenv()
+
+SCOPES = ["https://www.googleapis.com/auth/youtube.upload"]
+
+# YouTube Data API quota cost per call; the default project allowance is 10,000 units a day
+QUOTA_COSTS = {"videos.insert": 1600, "thumbnails.set": 50}
+
+try:
+    from zoneinfo import ZoneInfo
+    QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")  # Quota resets at midnight Pacific time
+except Exception:
+    QUOTA_TIMEZONE = timezone.utc
+
+
+def quota_day(now=None):
+    return datetime.fromtimestamp(now or time.time(), QUOTA_TIMEZONE).strftime("%Y-%m-%d")
+
+
+def seconds_until_quota_reset(now=None):
+    current = datetime.fromtimestamp(now or time.time(), QUOTA_TIMEZONE)
+    midnight = (current + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return max(1.0, (midnight - current).total_seconds())
+
+
+def _isoformat(value):
+    """Normalizes a datetime or ISO string to the RFC 3339 UTC form publishAt expects."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class UploadQueue:
+    """
+    Persistent queue of YouTube uploads shared by the web app, the Uploader and upload_video().
+    Items live in SQLite, so queued and interrupted uploads survive a crash (interrupted ones resume
+    through the saved resumable session). A dispatcher thread runs at most `max_concurrent` uploads,
+    reserves quota units for every API call against the daily allowance and holds items back until
+    the quota resets instead of failing them. The OAuth token is loaded once, refreshed when expired
+    and never triggers an interactive login inside a request.
+    """
+
+    LEASE_SECONDS = 600  # A running item whose lease lapsed belongs to a crashed process and is re-queued
+
+    def __init__(self, db_path=None, max_concurrent=None, daily_quota=None, token_path=None,
+                 credentials=None, api_url=None, start=True):
+        self.db_path = db_path or os.getenv("UPLOAD_QUEUE_PATH", "assets/cache/upload_queue.sqlite3")
+        self.max_concurrent = max_concurrent or int(os.getenv("UPLOAD_CONCURRENCY", "2"))
+        self.daily_quota = daily_quota or int(os.getenv("YOUTUBE_DAILY_QUOTA", "10000"))
+        self.token_path = token_path or os.getenv("YOUTUBE_TOKEN_PATH", "token.json")
+        self.api_url = api_url or os.getenv("YOUTUBE_API_URL")
+        self.resumable = ResumableUploader()
+        self._credentials = credentials
+        self._credentials_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._done = threading.Condition()
+        self._running = set()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix="upload-worker")
+
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS uploads ("
+            " id TEXT PRIMARY KEY, video_path TEXT, body TEXT, thumbnail_path TEXT, publish_at TEXT,"
+            " status TEXT, stage TEXT, bytes_sent INTEGER DEFAULT 0, total_bytes INTEGER DEFAULT 0,"
+            " attempts INTEGER DEFAULT 0, video_id TEXT, result TEXT, error TEXT, lease_until REAL,"
+            " created_at REAL, started_at REAL, finished_at REAL);"
+            "CREATE TABLE IF NOT EXISTS quota_usage (day TEXT PRIMARY KEY, units INTEGER);"
+        )
+        # Queues created before the column existed; marks items whose videos.insert quota is already booked
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(uploads)")}
+        if "quota_reserved" not in columns:
+            self._conn.execute("ALTER TABLE uploads ADD COLUMN quota_reserved INTEGER DEFAULT 0")
+        self._conn.commit()
+
+        if start:
+            threading.Thread(target=self._dispatch_loop, name="upload-dispatcher", daemon=True).start()
+
+    # --- Credentials ---
+
+    def credentials(self):
+        """Cached OAuth credentials, refreshed in place when expired. Raises if no token exists yet."""
+        with self._credentials_lock:
+            if self._credentials is None:
+                if not os.path.exists(self.token_path):
+                    raise RuntimeError(
+                        f"No YouTube token at '{self.token_path}'. Run `python -m agents.upload_queue --authorize` once."
+                    )
+                from google.oauth2.credentials import Credentials
+                self._credentials = Credentials.from_authorized_user_file(self.token_path, SCOPES)
+            creds = self._credentials
+            if getattr(creds, "expired", False) and getattr(creds, "refresh_token", None):
+                from google.auth.transport.requests import Request
+                creds.refresh(Request())
+                with open(self.token_path, "w", encoding="utf-8") as f:
+                    f.write(creds.to_json())
+                logging.info("UploadQueue: Refreshed YouTube credentials")
+            return creds
+
+    def authorize(self, client_secrets=None):
+        """Interactive one-time OAuth consent (CLI only); stores the token for the queue to reuse."""
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        flow = InstalledAppFlow.from_client_secrets_file(
+            client_secrets or os.getenv("YOUTUBE_CLIENT_SECRETS", "client_secrets.json"), SCOPES
+        )
+        creds = flow.run_local_server(port=0)
+        with open(self.token_path, "w", encoding="utf-8") as f:
+            f.write(creds.to_json())
+        with self._credentials_lock:
+            self._credentials = creds
+        return creds
+
+    # --- Quota ---
+
+    def quota_used(self, day=None):
+        with self._lock:
+            row = self._conn.execute("SELECT units FROM quota_usage WHERE day = ?", (day or quota_day(),)).fetchone()
+        return row["units"] if row else 0
+
+    def _reserve_quota(self, units):
+        """Atomically books units against today's allowance; False when they do not fit."""
+        day = quota_day()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")  # Other processes share the ledger
+            try:
+                row = self._conn.execute("SELECT units FROM quota_usage WHERE day = ?", (day,)).fetchone()
+                used = row["units"] if row else 0
+                if used + units > self.daily_quota:
+                    self._conn.rollback()
+                    return False
+                self._conn.execute(
+                    "INSERT INTO quota_usage (day, units) VALUES (?, ?) "
+                    "ON CONFLICT(day) DO UPDATE SET units = units + excluded.units", (day, units)
+                )
+                self._conn.commit()
+                return True
+            except Exception:
+                # An open transaction would make every later BEGIN on the shared connection fail
+                self._conn.rollback()
+                raise
+
+    def _exhaust_quota(self):
+        """The API reported quotaExceeded: our ledger was behind, so treat the day as used up."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO quota_usage (day, units) VALUES (?, ?) "
+                "ON CONFLICT(day) DO UPDATE SET units = excluded.units", (quota_day(), self.daily_quota)
+            )
+            self._conn.commit()
+
+    def quota_status(self):
+        used = self.quota_used()
+        return {
+            "day": quota_day(),
+            "used": used,
+            "limit": self.daily_quota,
+            "remaining": max(0, self.daily_quota - used),
+            "uploads_left_today": max(0, self.daily_quota - used) // QUOTA_COSTS["videos.insert"],
+            "resets_in_seconds": round(seconds_until_quota_reset()),
+        }
+
+    # --- Queue ---
+
+    def enqueue(self, video_path, title, description="", tags=None, category_id="22", privacy_status="private",
+                thumbnail_path=None, publish_at=None):
+        """Adds an upload and returns its id. With publish_at the video is uploaded private and goes live then."""
+        if not os.path.exists(video_path):
+            raise FileNotFoundError(f"Video file not found: {video_path}")
+        body = {
+            "snippet": {"title": title, "description": description, "tags": tags or [], "categoryId": category_id},
+            "status": {"privacyStatus": privacy_status, "selfDeclaredMadeForKids": False},
+        }
+        upload_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO uploads (id, video_path, body, thumbnail_path, publish_at, status, stage, total_bytes,"
+                " created_at) VALUES (?, ?, ?, ?, ?, 'queued', 'queued', ?, ?)",
+                (upload_id, os.path.abspath(video_path), json.dumps(body), thumbnail_path, _isoformat(publish_at),
+                 os.path.getsize(video_path), time.time())
+            )
+            self._conn.commit()
+        logging.info(f"UploadQueue: Queued upload {upload_id} for '{video_path}'")
+        self._wake.set()
+        return upload_id
+
+    def enqueue_schedule(self, items, first_publish_at, interval_hours=24):
+        """
+        Queues a batch of uploads with publishAt slots first_publish_at, +interval, +2*interval, ...
+        `items` are enqueue() keyword dicts. Returns the upload ids in order.
+        """
+        start = datetime.fromisoformat(_isoformat(first_publish_at).replace("Z", "+00:00"))
+        ids = []
+        for index, item in enumerate(items):
+            slot = start + timedelta(hours=interval_hours * index)
+            ids.append(self.enqueue(**dict(item, publish_at=slot)))
+        return ids
+
+    def get(self, upload_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM uploads WHERE id = ?", (upload_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, status=None, limit=100):
+        query = "SELECT * FROM uploads" + (" WHERE status = ?" if status else "") + " ORDER BY created_at DESC LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(query, ((status, limit) if status else (limit,))).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def wait(self, upload_id, timeout=None):
+        """Blocks until the upload completes or fails and returns its final state."""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._done:
+            while True:
+                item = self.get(upload_id)
+                if item is None or item["status"] in ("completed", "failed"):
+                    return item
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return item
+                self._done.wait(min(5.0, remaining) if remaining is not None else 5.0)
+
+    def _to_dict(self, row):
+        """Same shape as a job status, so clients can poll uploads and render jobs alike."""
+        progress = round(100.0 * row["bytes_sent"] / row["total_bytes"], 1) if row["total_bytes"] else 0.0
+        eta = None
+        if row["status"] == "running" and row["started_at"] and 0 < row["bytes_sent"] < row["total_bytes"]:
+            elapsed = time.time() - row["started_at"]
+            eta = round(elapsed * (row["total_bytes"] - row["bytes_sent"]) / row["bytes_sent"], 1)
+        return {
+            "upload_id": row["id"],
+            "kind": "upload_video",
+            "status": row["status"],
+            "stage": row["stage"],
+            "progress": progress,
+            "eta_seconds": eta,
+            "publish_at": row["publish_at"],
+            "attempts": row["attempts"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+        }
+
+    def _update(self, upload_id, **fields):
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE uploads SET {columns} WHERE id = ?", (*fields.values(), upload_id))
+            self._conn.commit()
+
+    def _finish(self, upload_id, **fields):
+        self._update(upload_id, finished_at=time.time(), lease_until=None, **fields)
+        metrics.inc("uploads_total", status=fields.get("status"))
+        with self._done:
+            self._done.notify_all()
+
+    # --- Dispatcher ---
+
+    def _claim_next(self):
+        """
+        Atomically takes the next queued item (earliest publish slot first, then oldest), re-queuing
+        items whose worker died. Returns the row or None.
+        """
+        now = time.time()
+        running = list(self._running)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")  # Claims must not race a dispatcher in another process
+            try:
+                self._conn.execute(
+                    "UPDATE uploads SET status = 'queued', stage = 'queued' WHERE status = 'running' AND lease_until < ?"
+                    f" AND id NOT IN ({', '.join('?' * len(running))})",
+                    (now, *running)
+                )
+                row = self._conn.execute(
+                    "SELECT * FROM uploads WHERE status = 'queued' "
+                    "ORDER BY publish_at IS NULL, publish_at, created_at LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    self._conn.commit()
+                    return None
+                self._conn.execute(
+                    "UPDATE uploads SET status = 'running', stage = 'uploading', attempts = attempts + 1,"
+                    " started_at = ?, lease_until = ? WHERE id = ? AND status = 'queued'",
+                    (now, now + self.LEASE_SECONDS, row["id"])
+                )
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        return row
+
+    def _dispatch_loop(self):
+        while True:
+            self._wake.wait(timeout=30)
+            self._wake.clear()
+            try:
+                while len(self._running) < self.max_concurrent:
+                    if self.quota_used() + QUOTA_COSTS["videos.insert"] > self.daily_quota:
+                        self._mark_waiting_for_quota()
+                        break
+                    row = self._claim_next()
+                    if row is None:
+                        break
+                    # An item re-claimed after a crash resumes its upload session, which costs no new quota
+                    if not row["quota_reserved"]:
+                        if not self._reserve_quota(QUOTA_COSTS["videos.insert"]):
+                            self._update(row["id"], status="queued", stage="waiting_quota", lease_until=None)
+                            break
+                        self._update(row["id"], quota_reserved=1)
+                    self._running.add(row["id"])
+                    self._executor.submit(self._run, row)
+            except Exception:
+                logging.exception("UploadQueue: Dispatcher error")
+
+    def _mark_waiting_for_quota(self):
+        # The dispatcher re-checks every 30 seconds, so held items start right after the reset
+        with self._lock:
+            held = self._conn.execute(
+                "UPDATE uploads SET stage = 'waiting_quota' WHERE status = 'queued' AND stage != 'waiting_quota'"
+            ).rowcount
+            self._conn.commit()
+        if held:
+            logging.warning(
+                f"UploadQueue: Daily quota used up, holding {held} uploads for "
+                f"{seconds_until_quota_reset() / 3600:.1f}h"
+            )
+
+    def _run(self, row):
+        upload_id = row["id"]
+        body = json.loads(row["body"])
+        try:
+            publish_at = row["publish_at"]
+            if publish_at:
+                if datetime.fromisoformat(publish_at.replace("Z", "+00:00")) > datetime.now(timezone.utc):
+                    # YouTube only honours publishAt on private videos
+                    body["status"]["privacyStatus"] = "private"
+                    body["status"]["publishAt"] = publish_at
+                else:
+                    logging.warning(f"UploadQueue: Publish slot {publish_at} for {upload_id} has passed, publishing now")
+                    body["status"]["privacyStatus"] = "public"
+
+            client_options = {"api_endpoint": self.api_url} if self.api_url else None
+            # One service per upload: httplib2 connections are not thread-safe
+            youtube = build("youtube", "v3", credentials=self.credentials(), client_options=client_options,
+                            cache_discovery=False)
+
+            def progress(sent, total):
+                self._update(upload_id, bytes_sent=sent, total_bytes=total,
+                             lease_until=time.time() + self.LEASE_SECONDS)
+
+            with metrics.span("upload.youtube"):
+                response = self.resumable.upload(youtube, row["video_path"], body, part="snippet,status",
+                                                 progress_callback=progress)
+            result = {
+                "video_id": response["id"],
+                "title": response["snippet"]["title"],
+                "status": response["status"]["uploadStatus"],
+                "publish_at": body["status"].get("publishAt"),
+            }
+
+            thumbnail_path = row["thumbnail_path"]
+            if thumbnail_path and os.path.exists(thumbnail_path):
+                if self._reserve_quota(QUOTA_COSTS["thumbnails.set"]):
+                    self._update(upload_id, stage="thumbnail")
+                    with metrics.span("upload.thumbnail"):
+                        youtube.thumbnails().set(videoId=response["id"], media_body=MediaFileUpload(thumbnail_path)).execute()
+                else:
+                    result["thumbnail_error"] = "Skipped: daily quota exhausted"
+
+            self._finish(upload_id, status="completed", stage="done", video_id=response["id"],
+                         result=json.dumps(result), error=None)
+            logging.info(f"UploadQueue: Upload {upload_id} finished as video {response['id']}")
+        except HttpError as e:
+            if e.resp.status == 403 and b"quotaExceeded" in (e.content or b""):
+                self._exhaust_quota()
+                # The insert was refused, so the retry after the reset books its quota again
+                self._update(upload_id, status="queued", stage="waiting_quota", lease_until=None, quota_reserved=0)
+                logging.warning(f"UploadQueue: Quota exceeded, upload {upload_id} re-queued")
+            else:
+                logging.exception(f"UploadQueue: Upload {upload_id} failed")
+                self._finish(upload_id, status="failed", stage="failed", error=str(e))
+        except Exception as e:
+            logging.exception(f"UploadQueue: Upload {upload_id} failed")
+            self._finish(upload_id, status="failed", stage="failed", error=str(e))
+        finally:
+            self._running.discard(upload_id)
+            self._wake.set()
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_upload_queue():
+    """Returns the process-wide upload queue, creating it (and its dispatcher) on first use."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = UploadQueue()
+        return _queue
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the YouTube upload queue.")
+    parser.add_argument("--authorize", action="store_true", help="run the one-time OAuth consent flow")
+    parser.add_argument("--status", action="store_true", help="print quota usage and recent uploads")
+    args = parser.parse_args()
+
+    queue = UploadQueue(start=False)
+    if args.authorize:
+        queue.authorize()
+        print(f"✅ Token saved to {queue.token_path}")
+    if args.status or not args.authorize:
+        print(json.dumps({"quota": queue.quota_status(), "uploads": queue.list(limit=20)}, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,9 +1,6 @@
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-from google.oauth2.credentials import Credentials
-from googleapiclient.http import MediaFileUpload
 import os
 from datetime import datetime, timedelta
+from agents.upload_queue import get_upload_queue
 
 def upload_video(
     video_path: str,
@@ -13,7 +10,8 @@ def upload_video(
     category_id: str = "22",
     privacy_status: str = "private",
     thumbnail_path: str = None,
-    schedule_time: datetime = None
+    schedule_time: datetime = None,
+    progress_callback=None
 ):
     """
     Uploads a video to YouTube with enhanced metadata options
@@ -27,6 +25,7 @@ def upload_video(
         privacy_status: "public", "private", or "unlisted"
         thumbnail_path: Optional path to thumbnail image
         schedule_time: datetime object for scheduled uploads
+        progress_callback: Optional callable(percent, 100), called as chunks complete
     Returns:
         Video ID if successful, None otherwise
     """
@@ -35,53 +34,25 @@ def upload_video(
         if not os.path.exists(video_path):
             raise FileNotFoundError(f"Video file not found: {video_path}")
 
-        # Load credentials
-        creds = Credentials.from_authorized_user_file('token.json')
-        youtube = build('youtube', 'v3', credentials=creds)
-
-        # Prepare request body
-        body = {
-            "snippet": {
-                "title": title,
-                "description": description,
-                "categoryId": category_id,
-                "tags": tags or []
-            },
-            "status": {
-                "privacyStatus": privacy_status,
-                "selfDeclaredMadeForKids": False
-            }
-        }
-
-        # Add schedule time if provided
-        if schedule_time:
-            body["status"]["publishAt"] = schedule_time.isoformat() + "Z"
-
-        # Upload video
-        request = youtube.videos().insert(
-            part="snippet,status",
-            body=body,
-            media_body=MediaFileUpload(video_path, chunksize=-1, resumable=True)
+        # The shared queue handles credentials, quota, retries and resuming; this call waits for the result
+        queue = get_upload_queue()
+        upload_id = queue.enqueue(
+            video_path, title, description, tags=tags, category_id=category_id, privacy_status=privacy_status,
+            thumbnail_path=thumbnail_path, publish_at=schedule_time
         )
-        response = request.execute()
-        video_id = response['id']
-
-        # Upload thumbnail if provided
-        if thumbnail_path and os.path.exists(thumbnail_path):
-            youtube.thumbnails().set(
-                videoId=video_id,
-                media_body=MediaFileUpload(thumbnail_path)
-            ).execute()
+        item = queue.get(upload_id)
+        while item["status"] not in ("completed", "failed"):
+            item = queue.wait(upload_id, timeout=1.0)
+            if progress_callback and item["progress"]:
+                progress_callback(item["progress"], 100)
+        if item["status"] == "failed":
+            raise RuntimeError(item["error"])
+        video_id = item["result"]["video_id"]
 
         print(f"✅ Upload successful! Video ID: {video_id}")
         print(f"https://youtu.be/{video_id}")
         return video_id
 
-    except HttpError as e:
-        print(f"❌ YouTube API error: {e}")
-        if e.resp.status == 403:
-            print("⚠️ Tip: Delete token.json and re-authenticate")
-        return None
     except Exception as e:
         print(f"❌ Upload failed: {str(e)}")
         return None
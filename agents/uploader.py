@@ -1,51 +1,32 @@
-import os
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
 from dotenv import load_dotenv
+from agents.upload_queue import get_upload_queue
 
 load_dotenv()
 
 class Uploader:
+    """Thin blocking front end to the shared upload queue (credentials, quota and retries live there)."""
+
     def __init__(self):
-        self.scopes = ["https://www.googleapis.com/auth/youtube.upload"]
-        self.credentials = None
-    
+        self.queue = get_upload_queue()
+
     def _authenticate(self):
-        flow = InstalledAppFlow.from_client_secrets_file(
-            "client_secrets.json", self.scopes)
-        self.credentials = flow.run_local_server(port=0)
-    
-    def upload(self, video_path, title, description, tags=[]):
-        if not self.credentials:
-            self._authenticate()
-        
-        youtube = build('youtube', 'v3', credentials=self.credentials)
-        
-        request_body = {
-            'snippet': {
-                'title': title,
-                'description': description,
-                'tags': tags,
-                'categoryId': '22'  # Typically "People & Blogs"
-            },
-            'status': {
-                'privacyStatus': 'private',  # Can be changed to 'public'
-                'selfDeclaredMadeForKids': False
-            }
-        }
-        
-        media = MediaFileUpload(video_path, chunksize=-1, resumable=True)
-        
-        response = youtube.videos().insert(
-            part='snippet,status',
-            body=request_body,
-            media_body=media
-        ).execute()
-        
+        # Interactive consent only ever runs here, never implicitly inside an upload
+        self.queue.authorize()
+
+    def upload(self, video_path, title, description, tags=[], progress_callback=None):
+        """Queues the upload and waits for it; progress_callback(percent, 100) follows the chunk progress."""
+        upload_id = self.queue.enqueue(video_path, title, description, tags)
+        item = self.queue.get(upload_id)
+        while item["status"] not in ("completed", "failed"):
+            item = self.queue.wait(upload_id, timeout=1.0)
+            if progress_callback and item["progress"]:
+                progress_callback(item["progress"], 100)
+
+        if item["status"] == "failed":
+            raise RuntimeError(item["error"] or "Upload failed")
+        result = item["result"]
         return {
-            'video_id': response['id'],
-            'title': response['snippet']['title'],
-            'status': response['status']['uploadStatus']
-        }
\ No newline at end of file
+            'video_id': result['video_id'],
+            'title': result['title'],
+            'status': result['status']
+        }
@@ -0,0 +1,208 @@
+import logging
+import time
+import threading
+import numpy as np
+import imageio_ffmpeg
+from agents import metrics
+from agents import memory_budget
+from agents.frame_prefetcher import FrameRing, default_queue_depth
+
+# Named x264 encoder profiles. 'publish' keeps the previous write_videofile settings.
+# Profiles use CRF (constant quality) unless a bitrate is given; either can be overridden per job.
+ENCODER_PROFILES = {
+    "draft": {"preset": "ultrafast", "crf": 30, "bitrate": None, "tune": "fastdecode"},
+    "publish": {"preset": "medium", "crf": None, "bitrate": "5000k", "tune": None},
+    "archive": {"preset": "slow", "crf": 18, "bitrate": None, "tune": None},
+}
+DEFAULT_PROFILE = "publish"
+
+
+def resolve_profile(name=None, crf=None):
+    """
+    Returns encoder settings for a profile name, optionally forcing CRF mode.
+    Unknown names fall back to the default profile.
+    """
+    name = (name or DEFAULT_PROFILE).lower()
+    if name not in ENCODER_PROFILES:
+        logging.warning(f"VideoEncoder: Unknown encoder profile '{name}'. Using '{DEFAULT_PROFILE}'.")
+        name = DEFAULT_PROFILE
+    settings = dict(ENCODER_PROFILES[name], name=name)
+    if crf is not None:
+        crf = int(crf)
+        if not 0 <= crf <= 51:
+            raise ValueError(f"CRF must be between 0 and 51, got {crf}")
+        settings["crf"] = crf
+        settings["bitrate"] = None
+    return settings
+
+
+def iter_clip_frames(clip, fps):
+    """Yields RGB frames of a MoviePy clip at the given fps, in order."""
+    total_frames = int(clip.duration * fps)
+    for i in range(total_frames):
+        yield clip.get_frame(i / fps)
+
+
+class StreamingEncoder:
+    """
+    Streams raw RGB frames from a generator straight into an ffmpeg pipe (imageio-ffmpeg),
+    muxing the audio file in the same pass. Replaces MoviePy's write_videofile.
+    """
+
+    def __init__(self, output_path, size, fps=24, profile=DEFAULT_PROFILE, crf=None, audio_path=None,
+                 audio_codec="aac", threads=None, queue_depth=None):
+        self.output_path = output_path
+        self.size = (int(size[0]), int(size[1]))
+        self.fps = fps
+        self.settings = resolve_profile(profile, crf)
+        self.audio_path = audio_path
+        self.audio_codec = audio_codec
+        self.threads = threads
+        # Frames buffered for the sender thread that feeds ffmpeg; 0 sends from the producing thread
+        self.queue_depth = default_queue_depth() if queue_depth is None else queue_depth
+
+    def _output_params(self):
+        params = ["-preset", self.settings["preset"]]
+        if self.settings["bitrate"] is None and self.settings["crf"] is not None:
+            params += ["-crf", str(self.settings["crf"])]
+        if self.settings.get("tune"):
+            params += ["-tune", self.settings["tune"]]
+        if self.threads:
+            params += ["-threads", str(self.threads)]
+        params += ["-movflags", "+faststart"]  # Optimizes for web playback
+        return params
+
+    def write(self, frames, total_frames=None, progress_callback=None):
+        """
+        Encodes every frame from `frames` (RGB uint8 arrays of `size`).
+        progress_callback(frames_done, total_frames) is called after each frame.
+        Returns the number of frames written.
+        """
+        logging.info(
+            f"VideoEncoder: Encoding '{self.output_path}' with profile '{self.settings['name']}' "
+            f"(preset={self.settings['preset']}, crf={self.settings['crf']}, bitrate={self.settings['bitrate']})"
+        )
+        writer = imageio_ffmpeg.write_frames(
+            self.output_path,
+            self.size,
+            fps=self.fps,
+            codec="libx264",
+            quality=None,  # Rate control is passed explicitly below
+            bitrate=self.settings["bitrate"],
+            macro_block_size=2,  # 1080x1920 is not a multiple of 16; yuv420p only needs even sizes
+            output_params=self._output_params(),
+            audio_path=self.audio_path,
+            audio_codec=self.audio_codec if self.audio_path else None,
+        )
+        writer.send(None)  # Seed the generator
+        memory_budget.track(memory_budget.child_with_arg(self.output_path))  # The ffmpeg it just started
+
+        started_at = time.time()
+        started = time.perf_counter()
+        try:
+            if self.queue_depth:
+                frames_done, produce_time, send_time, stalls = self._write_queued(
+                    writer, frames, total_frames, progress_callback
+                )
+            else:
+                frames_done, produce_time, send_time = self._write_inline(
+                    writer, frames, total_frames, progress_callback
+                )
+                stalls = None
+        finally:
+            t0 = time.perf_counter()
+            writer.close()
+            close_time = time.perf_counter() - t0
+
+        send_time += close_time
+        elapsed = time.perf_counter() - started
+        metrics.inc("frames_encoded_total", frames_done)
+        metrics.record_span("encode.produce_frames", produce_time, started_at)
+        metrics.record_span("encode.x264", send_time, started_at)
+        detail = f"{produce_time:.1f}s producing frames, {send_time:.1f}s in the encoder pipe"
+        if stalls:
+            waited_for_frames, blocked_on_encoder = stalls
+            metrics.record_span("encode.wait_for_frames", waited_for_frames, started_at)
+            metrics.record_span("encode.blocked_on_x264", blocked_on_encoder + close_time, started_at)
+            detail += (f"; encoder idle {waited_for_frames:.1f}s waiting for frames, producer blocked "
+                       f"{blocked_on_encoder + close_time:.1f}s on a full {self.queue_depth}-frame queue")
+        logging.info(
+            f"VideoEncoder: Wrote {frames_done} frames in {elapsed:.1f}s "
+            f"({frames_done / elapsed if elapsed else 0:.1f} fps; {detail})"
+        )
+        return frames_done
+
+    def _write_inline(self, writer, frames, total_frames, progress_callback):
+        frames_done = 0
+        produce_time = 0.0  # Decoding and compositing, inside the frame iterator
+        send_time = 0.0     # Blocked on the ffmpeg pipe, i.e. waiting for x264
+        frames = iter(frames)
+        while True:
+            t0 = time.perf_counter()
+            frame = next(frames, None)
+            t1 = time.perf_counter()
+            produce_time += t1 - t0
+            if frame is None:
+                break
+            writer.send(np.ascontiguousarray(frame))
+            send_time += time.perf_counter() - t1
+            frames_done += 1
+            if progress_callback:
+                progress_callback(frames_done, total_frames)
+        return frames_done, produce_time, send_time
+
+    def _write_queued(self, writer, frames, total_frames, progress_callback):
+        """
+        Copies each frame into a FrameRing that a sender thread drains into ffmpeg, so the next frame is
+        decoded and composited while x264 is still reading the previous one.
+        """
+        width, height = self.size
+        ring = FrameRing(self.queue_depth, (height, width, 3))
+        send_time = [0.0]
+        sender_error = []
+
+        def send():
+            try:
+                while True:
+                    i = ring.take()
+                    if i is None:
+                        return
+                    t0 = time.perf_counter()
+                    writer.send(ring.buffers[i])
+                    send_time[0] += time.perf_counter() - t0
+                    ring.release(i)
+            except Exception as e:
+                sender_error.append(e)
+                ring.cancel()  # Unblocks the producer, which then re-raises the error
+
+        sender = threading.Thread(target=send, name="encoder-sender", daemon=True)
+        sender.start()
+        frames_done = 0
+        produce_time = 0.0
+        frames = iter(frames)
+        try:
+            while True:
+                t0 = time.perf_counter()
+                frame = next(frames, None)
+                produce_time += time.perf_counter() - t0
+                if frame is None:
+                    break
+                i = ring.acquire()
+                if i is None:
+                    break
+                np.copyto(ring.buffers[i], frame, casting="unsafe")
+                ring.publish(i)
+                frames_done += 1
+                if progress_callback:
+                    progress_callback(frames_done, total_frames)
+        finally:
+            ring.close()
+            sender.join()
+        if sender_error:
+            raise sender_error[0]
+        return frames_done, produce_time, send_time[0], (ring.consumer_wait, ring.producer_wait)
+
+    def write_clip(self, clip, progress_callback=None):
+        """Encodes a MoviePy clip frame by frame through the pipe."""
+        total_frames = int(clip.duration * self.fps)
+        return self.write(iter_clip_frames(clip, self.fps), total_frames, progress_callback)
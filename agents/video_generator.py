@@ -3,14 +3,28 @@ import sys
 import logging
 import requests # Needed for making HTTP requests to Pexels API
 from dotenv import load_dotenv # Needed to load API key from .env
-# Added VideoFileClip, ColorClip. Included VideoClip for TextClip.
-from moviepy.editor import TextClip, CompositeVideoClip, AudioFileClip, VideoFileClip, ColorClip, VideoClip
+from moviepy.editor import VideoFileClip, ColorClip
 from moviepy.video.fx import all as vfx # For video effects like looping, resizing, and cropping
+from agents.subtitle_renderer import SubtitleRenderer
+from agents.frame_compositor import SubtitleCompositor
+from agents.video_encoder import StreamingEncoder
+from agents.media_cache import MediaCache
+from agents.clip_store import NormalizedClipStore
+from agents.segment_renderer import SegmentedRenderer
+from agents.incremental_renderer import IncrementalRenderer
+from agents.frame_prefetcher import PrefetchingFrameSource, default_queue_depth
+from agents.montage import MontageBuilder
+from agents.audio_assets import ensure_aac, probe_duration
+from agents.memory_budget import MemoryWatch, default_memory_limit_mb
+from agents import memory_budget
+from agents import metrics
 
 load_dotenv() # Load environment variables from .env file
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024 # Large reads and cache writes; 8 KB chunks made downloads syscall-bound
+
 class VideoGenerator:
     def __init__(self):
         self.pexels_api_key = os.getenv("PEXELS_API_KEY")
@@ -19,9 +33,23 @@ class VideoGenerator:
             # For now, we'll allow it to proceed but video fetching will fail.
             # In a production app, you might want to raise an error or use a default static background.
 
-        # Directory to temporarily store downloaded Pexels videos
-        self.temp_video_dir = "assets/temp_videos"
-        os.makedirs(self.temp_video_dir, exist_ok=True) # Ensure this directory exists
+        # Pexels API base URL (overridable so a local stub server can stand in for tests)
+        self.pexels_api_url = os.getenv("PEXELS_API_URL", "https://api.pexels.com").rstrip("/")
+
+        # Persistent cache for downloaded Pexels videos and search responses.
+        # Repeat queries skip the network; the cache is LRU-evicted past PEXELS_CACHE_MAX_GB.
+        self.media_cache = MediaCache(
+            os.getenv("PEXELS_CACHE_DIR", "assets/cache/pexels"),
+            max_size_gb=float(os.getenv("PEXELS_CACHE_MAX_GB", "2"))
+        )
+        self.search_cache_ttl = int(os.getenv("PEXELS_SEARCH_TTL", str(24 * 3600))) # Seconds
+
+        # Keep-alive session shared by every Pexels search and download; montage mode fetches in parallel
+        self.http_pool_size = int(os.getenv("PEXELS_MAX_CONNECTIONS", "8"))
+        self.http = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=self.http_pool_size)
+        self.http.mount("https://", adapter)
+        self.http.mount("http://", adapter)
 
         # Common video dimensions for vertical videos (e.g., YouTube Shorts, TikTok)
         self.video_width = 1080
@@ -34,77 +62,134 @@ class VideoGenerator:
         self.stroke_width = 1.5
         self.fontsize = 60 # Increased for better visibility
 
+        # Pillow-based renderer: glyphs are rasterized once and word bitmaps are cached across renders
+        self.subtitle_renderer = SubtitleRenderer(
+            self.font, self.fontsize, self.text_color, self.stroke_color, self.stroke_width,
+            max_width=self.video_width * 0.9
+        )
+
+        # Background clips transcoded once to 1080x1920 @ 24fps and reused across renders
+        self.fps = 24
+        self.clip_store = NormalizedClipStore(self.video_width, self.video_height, self.fps)
+        self.encoder_threads = os.cpu_count() # Lowered by batch workers that encode side by side
+        # Re-renders reuse encoded timeline segments whose inputs are unchanged (RENDER_INCREMENTAL=on)
+        self.incremental = os.getenv("RENDER_INCREMENTAL", "off").lower() in ("on", "1", "true")
+        self._incremental_renderer = None
+        # One Pexels clip per timeline segment instead of a single looped clip (RENDER_MONTAGE=on)
+        self.montage = os.getenv("RENDER_MONTAGE", "off").lower() in ("on", "1", "true")
+        self._montage_builder = None
+        # Frames buffered between decode, compositing and encode (RENDER_PREFETCH_DEPTH, 0 = lockstep)
+        self.prefetch_depth = default_queue_depth()
+        # RSS ceiling per render in MB (RENDER_MEMORY_LIMIT_MB, 0 = unbounded), counting only this render's
+        # own ffmpeg processes and segment workers. Bounded renders draw captions lazily within the
+        # subtitle cache budget and stop with MemoryLimitExceeded at the limit.
+        self.memory_limit_mb = default_memory_limit_mb()
+
+    def _search_pexels(self, query, per_page=1):
+        """Runs a Pexels video search, serving repeat queries from the TTL'd response cache."""
+        # Requesting 'portrait' orientation for TikTok/YouTube Shorts format
+        # per_page=1 when only one video is needed; montage mode asks for candidates to choose from
+        # min_width/min_height ensure we get reasonably high-res vertical videos
+        params = {
+            "query": query,
+            "orientation": "portrait",
+            "per_page": per_page,
+            "min_width": self.video_width // 2,
+            "min_height": self.video_height // 2,
+        }
+        cache_key = "pexels-search:" + "&".join(f"{k}={params[k]}" for k in sorted(params))
+        data = self.media_cache.get_json(cache_key, ttl=self.search_cache_ttl)
+        if data is not None:
+            logging.info(f"VideoGenerator: Pexels search cache hit for query: '{query}'")
+            return data
+
+        with metrics.span("pexels.search"):
+            response = self.http.get(
+                f"{self.pexels_api_url}/videos/search",
+                params=params,
+                headers={"Authorization": self.pexels_api_key},
+                timeout=30
+            )
+        response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
+        metrics.inc("download_bytes_total", len(response.content), source="pexels_search")
+        data = response.json()
+        self.media_cache.put_json(cache_key, data)
+        return data
+
+    def _pick_video_file(self, video_info):
+        """URL of the best portrait MP4 rendition of a Pexels video, or None."""
+        # Prioritize common vertical resolutions closest to target
+        target_resolutions = [
+            (self.video_width, self.video_height), # Full HD vertical
+            (self.video_width // 2, self.video_height // 2), # Half HD vertical
+            (720, 1280), # Common phone vertical
+            (540, 960) # Lower res phone vertical
+        ]
+
+        for res_w, res_h in target_resolutions:
+            for file in video_info.get("video_files", []):
+                # Check for mp4, and dimensions, or at least portrait aspect ratio
+                if (file["file_type"] == "video/mp4" and
+                    file.get("width") == res_w and
+                    file.get("height") == res_h):
+                    return file["link"]
+
+        # Fallback to any mp4 if specific resolutions not found
+        for file in video_info.get("video_files", []):
+            if file["file_type"] == "video/mp4" and "link" in file:
+                return file["link"]
+        return None
+
+    def _download_video(self, video_info):
+        """
+        Local path of a Pexels video, downloaded into the media cache unless already there (keyed by
+        video id). Raises on HTTP errors; returns None when the video has no usable MP4 file.
+        """
+        video_url = self._pick_video_file(video_info)
+        if not video_url:
+            logging.warning(f"No suitable MP4 video file found for Pexels video ID {video_info['id']}.")
+            return None
+
+        media_key = f"pexels-video:{video_info['id']}:{video_url}"
+        cached_path = self.media_cache.get(media_key, ".mp4")
+        if cached_path:
+            logging.info(f"VideoGenerator: Pexels video cache hit for ID {video_info['id']}: {cached_path}")
+            return cached_path
+
+        # Download the video straight into the cache (atomic rename once complete)
+        logging.info(f"Downloading Pexels video from {video_url}")
+        with metrics.span("pexels.download"):
+            with self.http.get(video_url, stream=True, timeout=60) as video_response:
+                video_response.raise_for_status()
+                local_video_path = self.media_cache.put_stream(
+                    media_key,
+                    metrics.count_bytes(
+                        video_response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE), "download_bytes_total",
+                        source="pexels"
+                    ),
+                    ".mp4"
+                )
+
+        logging.info(f"Successfully downloaded Pexels video to {local_video_path}")
+        return local_video_path
+
     def _fetch_pexels_video(self, query):
-        """Fetches and downloads a portrait orientation video from Pexels."""
+        """
+        Returns a local path to a portrait orientation Pexels video for the query.
+        Videos are cached by Pexels video id, so a cache hit skips the download entirely.
+        """
         if not self.pexels_api_key:
             logging.error("Pexels API key is not set. Cannot fetch videos.")
             return None
 
-        headers = {
-            "Authorization": self.pexels_api_key
-        }
-        # Pexels video search endpoint
-        # Requesting 'portrait' orientation for TikTok/YouTube Shorts format
-        # per_page=1 as we only need one video for now
-        # min_width/min_height ensure we get reasonably high-res vertical videos
-        url = f"https://api.pexels.com/videos/search?query={query}&orientation=portrait&per_page=1&min_width={self.video_width/2}&min_height={self.video_height/2}" # Adjusted min_width/height
-
         try:
-            response = requests.get(url, headers=headers)
-            response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
-            data = response.json()
+            data = self._search_pexels(query)
 
             if not data.get("videos"):
                 logging.warning(f"No Pexels videos found for query: '{query}'")
                 return None
 
-            video_info = data["videos"][0]
-
-            # Find the highest quality 'mp4' file available, prioritizing portrait resolutions
-            video_url = None
-            # Prioritize common vertical resolutions closest to target
-            target_resolutions = [
-                (self.video_width, self.video_height), # Full HD vertical
-                (self.video_width // 2, self.video_height // 2), # Half HD vertical
-                (720, 1280), # Common phone vertical
-                (540, 960) # Lower res phone vertical
-            ]
-
-            for res_w, res_h in target_resolutions:
-                for file in video_info["video_files"]:
-                    # Check for mp4, and dimensions, or at least portrait aspect ratio
-                    if (file["file_type"] == "video/mp4" and
-                        file.get("width") == res_w and
-                        file.get("height") == res_h):
-                        video_url = file["link"]
-                        break
-                if video_url:
-                    break
-
-            if not video_url: # Fallback to any mp4 if specific resolutions not found
-                for file in video_info["video_files"]:
-                    if file["file_type"] == "video/mp4" and "link" in file:
-                        video_url = file["link"]
-                        break
-
-            if not video_url:
-                logging.warning(f"No suitable MP4 video file found for Pexels video ID {video_info['id']}.")
-                return None
-
-            # Download the video
-            video_filename = f"pexels_{video_info['id']}.mp4"
-            local_video_path = os.path.join(self.temp_video_dir, video_filename)
-
-            logging.info(f"Downloading Pexels video from {video_url} to {local_video_path}")
-            video_response = requests.get(video_url, stream=True)
-            video_response.raise_for_status()
-
-            with open(local_video_path, 'wb') as f:
-                for chunk in video_response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-
-            logging.info(f"Successfully downloaded Pexels video to {local_video_path}")
-            return local_video_path
+            return self._download_video(data["videos"][0])
 
         except requests.exceptions.RequestException as e:
             logging.error(f"Error fetching/downloading Pexels video for query '{query}': {e}")
@@ -113,7 +198,138 @@ class VideoGenerator:
             logging.error(f"An unexpected error occurred during Pexels video fetching: {e}")
             return None
 
-    def generate_video(self, script, audio_path, word_timings=None): # NEW: Added word_timings parameter
+    def _fit_background_clip(self, background_clip, duration):
+        """Frame-level resize/crop/loop of a raw clip. Only used when pre-normalization is unavailable."""
+        # Resize and crop the background clip to fit target dimensions while maintaining aspect ratio
+        if background_clip.w / background_clip.h > self.video_width / self.video_height:
+            background_clip = background_clip.fx(vfx.resize, height=self.video_height)
+            x_center = background_clip.w / 2
+            background_clip = background_clip.fx(vfx.crop, x_center=x_center, width=self.video_width)
+        else:
+            background_clip = background_clip.fx(vfx.resize, width=self.video_width)
+            y_center = background_clip.h / 2
+            background_clip = background_clip.fx(vfx.crop, y_center=y_center, height=self.video_height)
+        return self._match_duration(background_clip, duration)
+
+    def _match_duration(self, background_clip, duration):
+        # Loop or trim background video to match audio duration
+        if background_clip.duration < duration:
+            background_clip = background_clip.fx(vfx.loop, duration=duration)
+        elif background_clip.duration > duration:
+            background_clip = background_clip.subclip(0, duration)
+        return background_clip
+
+    @metrics.traced("video.prepare_background")
+    def _prepare_background(self, background_video_path, duration):
+        """
+        Pre-normalizes the background through the clip store and returns a picklable background spec:
+        {'path': file, 'normalized': bool, 'source': id}, or {'path': None} for the black fallback.
+        Normalized files are already at the target size, fps and pixel format and long enough for the
+        audio, so decoding them needs no per-frame scaling or looping. 'source' names the downloaded clip
+        independently of the loop length, so incremental renders can tell when the background changed.
+        """
+        if not background_video_path or not os.path.exists(background_video_path):
+            logging.warning("VideoGenerator: No Pexels background video available or download failed. Using a black background.")
+            return {"path": None}
+        source = os.path.basename(background_video_path)
+        try:
+            normalized_path = self.clip_store.prepare(background_video_path, duration)
+            return {"path": normalized_path, "normalized": True, "source": source}
+        except Exception as e:
+            logging.warning(f"VideoGenerator: Could not pre-normalize background video: {e}. Falling back to frame-level resize.")
+            return {"path": background_video_path, "normalized": False, "source": source}
+
+    def open_background(self, background, duration):
+        """Opens a background spec from _prepare_background as a clip of exactly `duration` seconds."""
+        if background.get("path"):
+            try:
+                background_clip = VideoFileClip(background["path"])
+                if background.get("normalized") and tuple(background_clip.size) == (self.video_width, self.video_height):
+                    background_clip = self._match_duration(background_clip, duration)
+                else:
+                    background_clip = self._fit_background_clip(background_clip, duration)
+                logging.info(f"VideoGenerator: Background video processed. Dimensions: {background_clip.size}, Duration: {background_clip.duration}s")
+                return background_clip
+            except Exception as e:
+                logging.error(f"VideoGenerator: Error processing downloaded Pexels video: {e}. Falling back to black background.")
+
+        # Create a blank black background clip if no Pexels video is used
+        logging.info("VideoGenerator: Using black background clip as fallback.")
+        return ColorClip(size=(self.video_width, self.video_height), color=(0,0,0)).set_duration(duration)
+
+    def subtitle_events(self, script, word_timings, duration):
+        """Subtitle events as (start_seconds, end_seconds, text) for the compositor."""
+        if word_timings and isinstance(word_timings, list) and len(word_timings) > 0:
+            logging.info("VideoGenerator: Generating dynamic subtitles based on word timings.")
+            return SubtitleCompositor.events_from_word_timings(word_timings)
+        logging.warning("VideoGenerator: No word timings provided or invalid. Falling back to single caption for entire script.")
+        # The renderer wraps the script to 90% of the frame width, like TextClip(method='caption') did
+        return [(0, duration, script)]
+
+    def make_compositor(self):
+        return SubtitleCompositor(
+            self.subtitle_renderer, (self.video_width, self.video_height), self.video_height * 0.85
+        )
+
+    def background_frames(self, background, duration, start_frame, end_frame):
+        """
+        Yields background frames [start_frame, end_frame) of a spec from _prepare_background or a montage
+        (whose 'parts' each cover a frame range with their own clip). Normalized clips are decoded ahead
+        on a prefetch thread; anything else goes through MoviePy.
+        """
+        fps = self.fps
+        parts = background.get("parts") or [dict(background, start_frame=0, end_frame=int(duration * fps))]
+        for part in parts:
+            first, last = max(start_frame, part["start_frame"]), min(end_frame, part["end_frame"])
+            if first >= last:
+                continue
+            if self.prefetch_depth and part.get("path") and part.get("normalized"):
+                yield from PrefetchingFrameSource(
+                    part["path"], (self.video_width, self.video_height), fps,
+                    start_frame=first - part["start_frame"], frame_count=last - first, depth=self.prefetch_depth
+                )
+                continue
+            background_clip = self.open_background(part, (part["end_frame"] - part["start_frame"]) / fps)
+            try:
+                for i in range(first, last):
+                    yield background_clip.get_frame((i - part["start_frame"]) / fps)
+            finally:
+                background_clip.close()
+
+    def composited_frames(self, background, events, duration, start_frame, end_frame, background_start=None):
+        """
+        Yields frames [start_frame, end_frame) of the timeline with subtitles composited in, over the
+        background frames from background_start on (the same frames by default).
+        Each yielded frame is a reused buffer, valid until the next one is requested.
+        """
+        fps = self.fps
+        compositor = self.make_compositor().set_events(
+            [e for e in events if e[1] > start_frame / fps and e[0] < end_frame / fps],
+            preload=not memory_budget.bounded()
+        )
+        if background_start is None:
+            background_start = start_frame
+        background_frames = self.background_frames(
+            background, duration, background_start, background_start + end_frame - start_frame
+        )
+        for i, frame in enumerate(background_frames, start_frame):
+            memory_budget.check()
+            yield compositor.composite(frame, i / fps)
+
+    def generate_video(self, script, audio_path, word_timings=None, profile=None, crf=None,
+                       output_name=None, stage_callback=None, progress_callback=None, segments=None,
+                       incremental=None, montage=None, base_name=None):
+        """
+        Renders the final video. `profile` selects an encoder profile (draft, publish, archive)
+        and `crf` optionally forces constant-quality mode. `output_name` overrides the output
+        file name; stage_callback(stage) and progress_callback(frames_done, total_frames)
+        report progress to a caller such as the job queue. `segments` > 1 renders the timeline
+        in that many parallel segments. `incremental` (default RENDER_INCREMENTAL) reuses cached
+        segments from earlier renders and only encodes the parts of the timeline that changed.
+        `montage` (default RENDER_MONTAGE) gives every timeline segment its own Pexels clip.
+        `base_name` is the output name of an earlier render this one re-renders after an edit; its
+        manifest lets an incremental render keep the unchanged segments exactly as they were.
+        """
         logging.info(f"VideoGenerator: Received audio_path: '{audio_path}'")
         logging.info(f"VideoGenerator: Current working directory: '{os.getcwd()}'")
 
@@ -128,129 +344,82 @@ class VideoGenerator:
         os.makedirs(output_dir, exist_ok=True)
         logging.info(f"VideoGenerator: Output directory ensured: '{output_dir}'")
 
+        with metrics.span("video.probe_audio"):
+            duration = probe_duration(abs_audio_path) # From the header; the audio is never decoded here
+        if not duration:
+            logging.error(f"VideoGenerator: Could not read the duration of audio file '{abs_audio_path}'")
+            raise ValueError(f"Audio file '{audio_path}' has no readable duration")
+        logging.info(f"VideoGenerator: Audio duration read from header: {duration}s")
+
+        # The voiceover's AAC rendition is muxed with stream copy; encoding it here only happens once
+        # per voiceover (normally AudioGenerator already did). Without one, ffmpeg encodes on the fly.
         try:
-            audio = AudioFileClip(abs_audio_path)
-            duration = audio.duration
-            logging.info(f"VideoGenerator: Audio file loaded successfully. Duration: {duration}s")
+            mux_audio_path, audio_codec = ensure_aac(abs_audio_path), "copy"
         except Exception as e:
-            logging.error(f"VideoGenerator: Error loading audio file '{abs_audio_path}': {e}")
-            raise
+            logging.warning(f"VideoGenerator: No AAC rendition ({e}); encoding the audio during the render")
+            mux_audio_path, audio_codec = abs_audio_path, "aac"
 
         # --- Fetch Pexels background video based on script content ---
+        if stage_callback:
+            stage_callback("fetching_background")
         video_query = " ".join(script.split()[:3]) if script else "nature" # Default to 'nature' if script is empty
-        logging.info(f"VideoGenerator: Fetching background video for query: '{video_query}'")
-        background_video_path = self._fetch_pexels_video(video_query)
-
-        background_clip = None
-        if background_video_path and os.path.exists(background_video_path):
+        events = self.subtitle_events(script, word_timings, duration)
+
+        if montage is None:
+            montage = self.montage
+        background = None
+        if montage and self.pexels_api_key:
+            if self._montage_builder is None:
+                self._montage_builder = MontageBuilder(self)
             try:
-                background_clip = VideoFileClip(background_video_path)
-
-                # Resize and crop the background clip to fit target dimensions while maintaining aspect ratio
-                if background_clip.w / background_clip.h > self.video_width / self.video_height:
-                    background_clip = background_clip.fx(vfx.resize, height=self.video_height)
-                    x_center = background_clip.w / 2
-                    background_clip = background_clip.fx(vfx.crop, x_center=x_center, width=self.video_width)
-                else:
-                    background_clip = background_clip.fx(vfx.resize, width=self.video_width)
-                    y_center = background_clip.h / 2
-                    background_clip = background_clip.fx(vfx.crop, y_center=y_center, height=self.video_height)
-
-                # Loop or trim background video to match audio duration
-                if background_clip.duration < duration:
-                    background_clip = background_clip.fx(vfx.loop, duration=duration)
-                elif background_clip.duration > duration:
-                    background_clip = background_clip.subclip(0, duration)
-
-                logging.info(f"VideoGenerator: Background video processed. Dimensions: {background_clip.size}, Duration: {background_clip.duration}s")
-
+                with metrics.span("video.fetch_background"):
+                    background = self._montage_builder.build(events, duration, video_query)
             except Exception as e:
-                logging.error(f"VideoGenerator: Error processing downloaded Pexels video: {e}. Falling back to black background.")
-                background_clip = None # Fallback if processing fails
-        else:
-            logging.warning("VideoGenerator: No Pexels background video available or download failed. Using a black background.")
-
-        # Create a blank black background clip if no Pexels video is used
-        if background_clip is None:
-            background_clip = ColorClip(size=(self.video_width, self.video_height), color=(0,0,0)).set_duration(duration)
-            logging.info("VideoGenerator: Using black background clip as fallback.")
-
-
-        # --- NEW: Generate subtitle clips based on word_timings or full script ---
-        text_clips_for_composition = []
-
-        if word_timings and isinstance(word_timings, list) and len(word_timings) > 0:
-            logging.info("VideoGenerator: Generating dynamic subtitle clips based on word timings.")
-            for word_info in word_timings:
-                word = word_info['word']
-                # Convert milliseconds to seconds
-                start_time = word_info['start'] / 1000.0
-                end_time = word_info['end'] / 1000.0
-
-                # Create a text clip for each word/phrase
-                txt_clip = TextClip(
-                    word,
-                    font=self.font,
-                    fontsize=self.fontsize,
-                    color=self.text_color,
-                    stroke_color=self.stroke_color,
-                    stroke_width=self.stroke_width,
-                    # Text size is constrained by overall video width, but auto-wrapped by method='caption'
-                    size=(self.video_width * 0.9, None), # Max 90% of video width, height auto
-                    method='caption' # Ensures text wraps if too long
-                )
-
-                # Set duration and position for the individual word clip
-                txt_clip = txt_clip.set_start(start_time).set_duration(end_time - start_time)
-                # Position the text at the bottom, slightly above the bottom edge
-                txt_clip = txt_clip.set_position(('center', self.video_height * 0.85)) # Adjust vertical position as needed
-
-                text_clips_for_composition.append(txt_clip)
-        else:
-            logging.warning("VideoGenerator: No word timings provided or invalid. Falling back to single text clip for entire script.")
-            # Fallback to the original single text clip if word_timings are not available
-            single_text_clip = TextClip(
-                script,
-                font=self.font,
-                fontsize=self.fontsize, # Use the class's default fontsize
-                color=self.text_color,
-                stroke_color=self.stroke_color,
-                stroke_width=self.stroke_width,
-                size=(self.video_width * 0.9, None), # 90% width, auto height
-                method='caption'
-            ).set_duration(duration).set_position(('center', self.video_height * 0.85)) # Position at bottom
-            text_clips_for_composition.append(single_text_clip)
-
-        logging.info("VideoGenerator: Text clips prepared for composition.")
-
-
-        # --- Combine background video and all text clips ---
-        # Ensure background_clip is the first element so text clips are on top
-        final_video_composition_elements = [background_clip] + text_clips_for_composition
-        video = CompositeVideoClip(final_video_composition_elements, size=(self.video_width, self.video_height))
-        video = video.set_audio(audio)
-        logging.info("VideoGenerator: Audio, text, and background combined.")
-
-        # --- Write the final video ---
-        output_path = os.path.join(output_dir, "generated_video.mp4")
+                logging.error(f"VideoGenerator: Montage failed ({e}), falling back to a single background clip")
+        if background is None:
+            logging.info(f"VideoGenerator: Fetching background video for query: '{video_query}'")
+            with metrics.span("video.fetch_background"):
+                background_video_path = self._fetch_pexels_video(video_query)
+            background = self._prepare_background(background_video_path, duration)
+
+        output_path = os.path.join(output_dir, output_name or "generated_video.mp4")
         logging.info(f"VideoGenerator: Writing video to '{output_path}'")
-        video.write_videofile(
-            output_path,
-            fps=24,
-            codec="libx264", # High compatibility video codec
-            audio_codec="aac", # High compatibility audio codec
-            threads=os.cpu_count(), # Use all available CPU cores for faster encoding
-            preset="medium", # Encoding speed vs. compression efficiency (ultrafast, superfast, fast, medium, slow, slower, veryslow)
-            bitrate="5000k", # Target video bitrate (adjust for quality/file size)
-            ffmpeg_params=['-movflags', 'faststart'] # Optimizes for web playback
-        )
-        logging.info(f"VideoGenerator: Video saved: {output_path}")
+        if stage_callback:
+            stage_callback("encoding")
 
-        # Clean up temporary video file after generation
-        if background_video_path and os.path.exists(background_video_path):
-            try:
-                os.remove(background_video_path)
-            except Exception as e:
-                logging.warning(f"Could not remove temporary background video {background_video_path}: {e}")
+        memory_watch = MemoryWatch(
+            self.memory_limit_mb, on_pressure=[self.subtitle_renderer.trim], name=f"Render of '{output_path}'"
+        )
+        with metrics.span("video.render"), memory_watch:
+            if incremental is None:
+                incremental = self.incremental
+            if incremental:
+                if self._incremental_renderer is None:
+                    self._incremental_renderer = IncrementalRenderer(self)
+                self._incremental_renderer.render(
+                    background, events, duration, mux_audio_path, output_path,
+                    profile=profile, crf=crf, progress_callback=progress_callback,
+                    base_manifest=os.path.join(output_dir, base_name) + ".manifest.json" if base_name else None
+                )
+            elif segments and segments > 1:
+                # Timeline split on subtitle boundaries, segments encoded in parallel processes, then joined
+                SegmentedRenderer(self).render(
+                    background, events, duration, mux_audio_path, output_path, segments,
+                    profile=profile, crf=crf, progress_callback=progress_callback
+                )
+            else:
+                # --- Decode, composite subtitles and encode as one pipelined pass over the frames ---
+                total_frames = int(duration * self.fps)
+                frames = self.composited_frames(background, events, duration, 0, total_frames)
+
+                # Frames are streamed straight into ffmpeg, which muxes the audio in the same pass
+                encoder = StreamingEncoder(
+                    output_path, (self.video_width, self.video_height), fps=self.fps, profile=profile, crf=crf,
+                    audio_path=mux_audio_path, audio_codec=audio_codec, threads=self.encoder_threads,
+                    queue_depth=self.prefetch_depth
+                )
+                encoder.write(frames, total_frames, progress_callback)
+        logging.info(f"VideoGenerator: Video saved: {output_path} (peak RSS {memory_watch.peak_mb} MB)")
 
+        # The background video stays in the media cache for reuse by later renders
         return output_path
\ No newline at end of file
@@ -0,0 +1,117 @@
+"""
+Compares subtitle compositing throughput (frames per second) of three paths:
+  textclip  - the original renderer: one ImageMagick TextClip per word in a CompositeVideoClip
+              (needs ImageMagick; build time is reported separately since it dominated renders)
+  bitmaps   - the same per-word CompositeVideoClip stack over cached Pillow bitmaps
+  single    - the single-pass SubtitleCompositor
+Speedups are relative to textclip when ImageMagick is available, else to bitmaps.
+
+Usage: python benchmarks/bench_compositor.py [--frames 48] [--skip-textclip]
+"""
+import argparse
+import random
+import shutil
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+from moviepy.editor import ColorClip, CompositeVideoClip, ImageClip, TextClip
+from moviepy.config import get_setting
+from agents.subtitle_renderer import SubtitleRenderer
+from agents.frame_compositor import SubtitleCompositor
+
+WIDTH, HEIGHT = 1080, 1920
+WORD_COUNTS = (100, 500, 2000)
+VOCABULARY = ["the", "future", "of", "ai", "is", "here", "and", "it", "changes", "everything",
+              "subscribe", "today", "learn", "how", "to", "build", "amazing", "videos", "fast", "now"]
+
+
+def make_word_timings(count, seconds_per_word=0.35):
+    timings = []
+    for i in range(count):
+        start = int(i * seconds_per_word * 1000)
+        timings.append({'text': random.choice(VOCABULARY), 'start': start, 'end': start + int(seconds_per_word * 900)})
+    return timings
+
+
+def textclip_stack(background, word_timings):
+    """The original renderer: one TextClip per word (an ImageMagick call each) layered in a CompositeVideoClip."""
+    clips = [background]
+    for word_info in word_timings:
+        clip = TextClip(word_info['text'], font='Arial-Bold', fontsize=60, color='white', stroke_color='black',
+                        stroke_width=1.5, size=(WIDTH * 0.9, None), method='caption')
+        start = word_info['start'] / 1000.0
+        clips.append(clip.set_start(start).set_duration(word_info['end'] / 1000.0 - start)
+                     .set_position(('center', HEIGHT * 0.85)))
+    return CompositeVideoClip(clips, size=(WIDTH, HEIGHT))
+
+
+def imagemagick_available():
+    binary = get_setting("IMAGEMAGICK_BINARY")
+    return binary != "unset" and shutil.which(binary) is not None
+
+
+def composite_stack(renderer, background, word_timings):
+    """The intermediate approach: one masked ImageClip per word (cached Pillow bitmaps) in a CompositeVideoClip."""
+    clips = [background]
+    for word_info in word_timings:
+        bitmap = renderer.render(word_info['text'])
+        mask = ImageClip(bitmap[:, :, 3] / 255.0, ismask=True)
+        clip = ImageClip(bitmap[:, :, :3]).set_mask(mask)
+        start = word_info['start'] / 1000.0
+        clips.append(clip.set_start(start).set_duration(word_info['end'] / 1000.0 - start)
+                     .set_position(('center', HEIGHT * 0.85)))
+    return CompositeVideoClip(clips, size=(WIDTH, HEIGHT))
+
+
+def single_pass(renderer, background, word_timings):
+    compositor = SubtitleCompositor(renderer, (WIDTH, HEIGHT), HEIGHT * 0.85)
+    compositor.set_events(SubtitleCompositor.events_from_word_timings(word_timings))
+    return compositor.make_clip(background, background.duration)
+
+
+def measure_fps(clip, frames):
+    times = [clip.duration * i / frames for i in range(frames)]
+    started = time.perf_counter()
+    for t in times:
+        clip.get_frame(t)
+    return frames / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frames", type=int, default=48, help="frames sampled across the timeline per run")
+    parser.add_argument("--skip-textclip", action="store_true", help="skip the ImageMagick TextClip baseline")
+    args = parser.parse_args()
+
+    with_textclip = not args.skip_textclip and imagemagick_available()
+    if not with_textclip:
+        print("TextClip baseline skipped (ImageMagick not found or --skip-textclip); speedup is vs bitmaps")
+
+    random.seed(0)
+    renderer = SubtitleRenderer('Arial-Bold', 60, 'white', 'black', 1.5, max_width=WIDTH * 0.9)
+    print(f"{'words':>6} {'textclip build s':>17} {'textclip fps':>13} {'bitmaps fps':>12} {'single fps':>11} "
+          f"{'speedup':>8}")
+    for count in WORD_COUNTS:
+        word_timings = make_word_timings(count)
+        duration = word_timings[-1]['end'] / 1000.0
+        background = ColorClip(size=(WIDTH, HEIGHT), color=(20, 20, 20)).set_duration(duration)
+
+        build_seconds = textclip_fps = None
+        if with_textclip:
+            started = time.perf_counter()
+            textclip = textclip_stack(background, word_timings)
+            build_seconds = time.perf_counter() - started
+            textclip_fps = measure_fps(textclip, args.frames)
+        stack_fps = measure_fps(composite_stack(renderer, background, word_timings), args.frames)
+        single_fps = measure_fps(single_pass(renderer, background, word_timings), args.frames)
+        baseline_fps = textclip_fps or stack_fps
+        print(f"{count:>6} {build_seconds or float('nan'):>17.1f} {textclip_fps or float('nan'):>13.1f} "
+              f"{stack_fps:>12.1f} {single_fps:>11.1f} {single_fps / baseline_fps:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
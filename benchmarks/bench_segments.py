@@ -0,0 +1,91 @@
+"""
+Measures wall-clock scaling of segment-parallel rendering (1, 2, 4 and 8 segments)
+on a synthetic 5-minute script with a moving test-pattern background.
+
+Usage: python benchmarks/bench_segments.py [--duration 300] [--profile draft] [--segments 1 2 4 8]
+"""
+import os
+import sys
+import math
+import time
+import wave
+import struct
+import random
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+import imageio_ffmpeg
+
+WORDS = ["the", "future", "of", "ai", "is", "here", "and", "it", "changes", "everything",
+         "subscribe", "today", "learn", "how", "to", "build", "amazing", "videos", "fast", "now"]
+
+
+def write_tone(path, duration, rate=22050):
+    """Synthetic voiceover: a quiet tone is enough since only the duration matters here."""
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        samples = int(duration * rate)
+        w.writeframes(b"".join(struct.pack("<h", int(3000 * math.sin(i / 8))) for i in range(samples)))
+
+
+def write_background(path, seconds=10):
+    subprocess.run([
+        imageio_ffmpeg.get_ffmpeg_exe(), "-y", "-loglevel", "error", "-f", "lavfi",
+        "-i", "testsrc2=size=720x1280:rate=24", "-t", str(seconds), "-pix_fmt", "yuv420p", path
+    ], check=True)
+
+
+def word_timings_for(duration, seconds_per_word=0.4):
+    timings = []
+    for i in range(int(duration / seconds_per_word)):
+        start = int(i * seconds_per_word * 1000)
+        timings.append({"text": random.choice(WORDS), "start": start, "end": start + int(seconds_per_word * 900)})
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--duration", type=float, default=300.0, help="script length in seconds")
+    parser.add_argument("--profile", default="draft", help="encoder profile")
+    parser.add_argument("--segments", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    random.seed(0)
+    work_dir = tempfile.mkdtemp(prefix="bench_segments_")
+    os.environ["CLIP_STORE_DIR"] = os.path.join(work_dir, "normalized")
+    os.chdir(work_dir)
+
+    from agents.video_generator import VideoGenerator
+
+    audio_path = os.path.join(work_dir, "voiceover.wav")
+    background_path = os.path.join(work_dir, "background.mp4")
+    write_tone(audio_path, args.duration)
+    write_background(background_path)
+    word_timings = word_timings_for(args.duration)
+
+    video_gen = VideoGenerator()
+    video_gen._fetch_pexels_video = lambda query: background_path  # Offline: use the synthetic background
+    # Warm the normalized clip store so every run measures rendering only
+    video_gen._prepare_background(background_path, args.duration)
+
+    print(f"{os.cpu_count()} cores, {args.duration:.0f}s script, {len(word_timings)} words, profile '{args.profile}'")
+    print(f"{'segments':>8} {'wall s':>8} {'speedup':>8}")
+    baseline = None
+    for segments in args.segments:
+        started = time.perf_counter()
+        video_gen.generate_video("bench", audio_path, word_timings, profile=args.profile,
+                                 output_name=f"bench_{segments}.mp4", segments=segments)
+        elapsed = time.perf_counter() - started
+        baseline = baseline or elapsed
+        print(f"{segments:>8} {elapsed:>8.1f} {baseline / elapsed:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
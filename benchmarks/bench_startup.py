@@ -0,0 +1,98 @@
+"""
+Measures cold start of the web app: a fresh interpreter imports main.py and serves its first request
+(GET / through the Flask test client). Reports time to first response, import time, peak RSS and which
+heavy dependencies were already loaded, as the median over several runs.
+
+Usage: python benchmarks/bench_startup.py [--runs 5] [--path /] [--importtime]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import tempfile
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+HEAVY_MODULES = ["moviepy", "googleapiclient", "groq", "pyttsx3", "numpy", "PIL", "imageio_ffmpeg"]
+
+CHILD = r"""
+import sys, time, json, resource
+started = time.perf_counter()
+sys.path.insert(0, {base!r})
+import main
+imported = time.perf_counter()
+response = main.app.test_client().get({path!r})
+served = time.perf_counter()
+print(json.dumps({{
+    "import_s": imported - started,
+    "first_request_s": served - imported,
+    "status": response.status_code,
+    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 ** 2 if sys.platform == "darwin" else 1024),
+    "modules": len(sys.modules),
+    "heavy_loaded": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def run_once(path, work_dir, importtime=False):
+    code = CHILD.format(base=str(BASE_DIR), path=path, heavy=HEAVY_MODULES)
+    env = dict(os.environ)
+    env.setdefault("LLM_BACKEND", "fake")  # No Groq key needed to start
+    env.setdefault("AGENT_WARMUP", "")     # Measure the request path alone, without background warm-up
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    started = time.perf_counter()
+    result = subprocess.run(cmd, cwd=work_dir, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    stats = json.loads(result.stdout.strip().splitlines()[-1])
+    stats["process_to_first_response_s"] = elapsed
+    return stats, result.stderr
+
+
+def top_imports(stderr, count=15):
+    """Slowest top-level imports from -X importtime output (cumulative microseconds)."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        if cumulative.isdigit() and not name.startswith(" ") and "." not in name.strip():
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/", help="route requested first")
+    parser.add_argument("--importtime", action="store_true", help="also list the slowest top-level imports")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_startup_")
+    runs = [run_once(args.path, work_dir)[0] for _ in range(args.runs)]
+
+    def median(key):
+        return statistics.median(r[key] for r in runs)
+
+    print(f"{args.runs} cold starts, first request GET {args.path} -> {runs[0]['status']}")
+    print(f"  process start to first response  {median('process_to_first_response_s'):7.2f}s")
+    print(f"  import main                      {median('import_s'):7.2f}s")
+    print(f"  first request                    {median('first_request_s') * 1000:7.1f}ms")
+    print(f"  peak RSS                         {median('peak_rss_mb'):7.1f} MB")
+    print(f"  modules loaded                   {int(median('modules')):7d}")
+    print(f"  heavy modules loaded             {', '.join(runs[0]['heavy_loaded']) or 'none'}")
+
+    if args.importtime:
+        _, stderr = run_once(args.path, work_dir, importtime=True)
+        print("Slowest top-level imports (cumulative):")
+        for micros, name in top_imports(stderr):
+            print(f"  {micros / 1e6:7.3f}s  {name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,394 @@
+"""
+Runs the full web flow (titles -> variations -> script -> audio -> video job -> SEO -> upload) through the
+Flask app with every external service replaced by a local stub: the fake LLM backend for Groq, HTTP stubs
+for Pexels and AssemblyAI, an HTTPS stub of the YouTube resumable upload endpoint and a synthetic TTS
+engine. Reports per-stage wall time, CPU time, peak RSS and output fps, and saves them as JSON so
+regressions show up between commits.
+
+Usage: python benchmarks/pipeline_bench.py [--words 150] [--profile draft] [--stt local|assemblyai]
+                                           [--output results.json] [--compare previous.json] [--verbose]
+"""
+import os
+import re
+import sys
+import json
+import math
+import time
+import wave
+import shutil
+import struct
+import platform
+import logging
+import argparse
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+try:
+    import resource
+except ImportError:  # Windows: CPU time of child processes is not available
+    resource = None
+
+import imageio_ffmpeg
+
+
+# --- Synthetic TTS ---
+
+class SyntheticEngine:
+    """pyttsx3 stand-in: each word becomes a short tone burst, sentences end with a pause."""
+
+    rate = 22050
+
+    def __init__(self):
+        self._queue = []
+        self._properties = {"voice": None, "rate": 200, "voices": []}
+
+    def getProperty(self, name):
+        return self._properties.get(name)
+
+    def setProperty(self, name, value):
+        self._properties[name] = value
+
+    def save_to_file(self, text, path):
+        self._queue.append((text, path))
+
+    def runAndWait(self):
+        for text, path in self._queue:
+            frames = bytearray()
+            for word in text.split():
+                length = int(self.rate * (0.12 + 0.05 * len(word)))
+                frames += b"".join(
+                    struct.pack("<h", int(6000 * math.sin(i * 2 * math.pi * 180 / self.rate))) for i in range(length)
+                )
+                gap = 0.3 if word[-1] in ".!?" else 0.04
+                frames += b"\0\0" * int(self.rate * gap)
+            with wave.open(path, "wb") as w:
+                w.setnchannels(1)
+                w.setsampwidth(2)
+                w.setframerate(self.rate)
+                w.writeframes(bytes(frames))
+        self._queue = []
+
+    def stop(self):
+        pass
+
+
+# --- Service stubs ---
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, code, payload=b"", headers=None, content_type="application/json"):
+        body = json.dumps(payload).encode("utf-8") if isinstance(payload, (dict, list)) else payload
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self):
+        if self.headers.get("Transfer-Encoding") == "chunked":
+            data = bytearray()
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return bytes(data)
+                data += self.rfile.read(size)
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+
+def pexels_handler(background_path):
+    class Handler(StubHandler):
+        def do_GET(self):
+            if self.path.startswith("/videos/search"):
+                base = f"http://127.0.0.1:{self.server.server_port}"
+                return self.reply(200, {"videos": [{"id": 1, "video_files": [
+                    {"file_type": "video/mp4", "width": 720, "height": 1280, "link": f"{base}/files/background.mp4"}
+                ]}]})
+            with open(background_path, "rb") as f:
+                self.reply(200, f.read(), content_type="video/mp4")
+    return Handler
+
+
+def assemblyai_handler(state):
+    class Handler(StubHandler):
+        def do_POST(self):
+            body = self.read_body()
+            if self.path.endswith("/upload"):
+                return self.reply(200, {"upload_url": "http://stub/audio"})
+            state["submitted"] = time.time()
+            self.reply(200, {"id": "bench-transcript"})
+
+        def do_GET(self):
+            # Evenly spaced words over the voiceover, "transcribed" after a short processing delay
+            if time.time() - state["submitted"] < 0.5:
+                return self.reply(200, {"status": "processing"})
+            words = state["script"].split()
+            step = state["duration_ms"] / max(1, len(words))
+            self.reply(200, {"status": "completed", "words": [
+                {"text": w, "start": int(i * step), "end": int((i + 0.9) * step)} for i, w in enumerate(words)
+            ]})
+    return Handler
+
+
+def youtube_handler(state):
+    class Handler(StubHandler):
+        def do_POST(self):
+            self.read_body()
+            state["total"] = int(self.headers["X-Upload-Content-Length"])
+            state["received"] = 0
+            self.reply(200, headers={"Location": f"https://127.0.0.1:{self.server.server_port}/session"})
+
+        def do_PUT(self):
+            data = self.read_body()
+            match = re.match(r"bytes (\d+)-\d+/", self.headers.get("Content-Range", ""))
+            if match:
+                state["received"] = int(match.group(1)) + len(data)
+            if state["received"] >= state["total"]:
+                return self.reply(200, {"id": "bench-video", "snippet": {"title": "bench"},
+                                        "status": {"uploadStatus": "uploaded"}})
+            self.reply(308, headers={"Range": f"bytes=0-{state['received'] - 1}"} if state["received"] else {})
+    return Handler
+
+
+def serve(handler, tls_files=None):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    if tls_files:
+        import ssl
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(*tls_files)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"{'https' if tls_files else 'http'}://127.0.0.1:{server.server_port}"
+
+
+def make_certificate(work_dir):
+    """Self-signed certificate for the HTTPS YouTube stub (the client library always uses https)."""
+    cert, key = os.path.join(work_dir, "stub_cert.pem"), os.path.join(work_dir, "stub_key.pem")
+    if shutil.which("openssl"):
+        result = subprocess.run([
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-keyout", key, "-out", cert,
+            "-days", "1", "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1"
+        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if result.returncode == 0:
+            return cert, key
+    return None
+
+
+def write_background(path, seconds=10):
+    subprocess.run([
+        imageio_ffmpeg.get_ffmpeg_exe(), "-y", "-loglevel", "error", "-f", "lavfi",
+        "-i", "testsrc2=size=720x1280:rate=24", "-t", str(seconds), "-pix_fmt", "yuv420p", path
+    ], check=True)
+
+
+# --- Measurement ---
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    return 0
+
+
+class StageMeter:
+    """Wall time, CPU time (this process and finished child processes) and sampled peak RSS per stage."""
+
+    def __init__(self):
+        self.stages = {}
+
+    def _children_cpu(self):
+        if not resource:
+            return 0.0
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return usage.ru_utime + usage.ru_stime
+
+    def measure(self, name, fn):
+        peak = [_rss_bytes()]
+        stop = threading.Event()
+
+        def sample():
+            while not stop.wait(0.05):
+                peak[0] = max(peak[0], _rss_bytes())
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        wall, cpu, children = time.perf_counter(), time.process_time(), self._children_cpu()
+        try:
+            return fn()
+        finally:
+            stop.set()
+            sampler.join()
+            self.stages[name] = {
+                "wall_s": round(time.perf_counter() - wall, 3),
+                "cpu_s": round(time.process_time() - cpu, 3),
+                "cpu_children_s": round(self._children_cpu() - children, 3),
+                "peak_rss_mb": round(peak[0] / 1024 ** 2, 1),
+            }
+            print(f"  {name:<14} {self.stages[name]['wall_s']:>8.2f}s wall {self.stages[name]['cpu_s']:>8.2f}s cpu "
+                  f"{self.stages[name]['peak_rss_mb']:>8.1f} MB")
+
+
+def poll(client, url, timeout=3600):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = client.get(url).get_json()
+        if status["status"] in ("completed", "failed"):
+            if status["status"] == "failed":
+                raise RuntimeError(f"{url} failed: {status['error']}")
+            return status["result"]
+        time.sleep(0.1)
+    raise TimeoutError(url)
+
+
+def git_commit():
+    result = subprocess.run(["git", "-C", str(BASE_DIR), "rev-parse", "--short", "HEAD"],
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    return result.stdout.strip() or None
+
+
+def compare(current, previous_path):
+    with open(previous_path, "r", encoding="utf-8") as f:
+        previous = json.load(f)
+    print(f"\nvs {previous['meta'].get('commit')} ({previous_path}):")
+    for name, stage in current["stages"].items():
+        before = previous["stages"].get(name)
+        if before and before["wall_s"]:
+            change = 100.0 * (stage["wall_s"] - before["wall_s"]) / before["wall_s"]
+            print(f"  {name:<14} {before['wall_s']:>8.2f}s -> {stage['wall_s']:>8.2f}s ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--words", type=int, default=150, help="script length the generated script is extended to")
+    parser.add_argument("--profile", default="draft", help="encoder profile")
+    parser.add_argument("--stt", choices=["local", "assemblyai"], default="local", help="word timing engine")
+    parser.add_argument("--output", default="pipeline_bench.json", help="where to write the JSON results")
+    parser.add_argument("--compare", help="earlier results file to diff against")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary work directory")
+    parser.add_argument("--verbose", action="store_true", help="show the application log")
+    args = parser.parse_args()
+    output_path = os.path.abspath(args.output)
+
+    work_dir = tempfile.mkdtemp(prefix="pipeline_bench_")
+    background_path = os.path.join(work_dir, "background.mp4")
+    write_background(background_path)
+
+    stt_state = {"script": "", "duration_ms": 0, "submitted": 0.0}
+    youtube_state = {}
+    tls_files = make_certificate(work_dir)
+
+    # Everything external points at local stubs and every cache starts cold inside the work dir
+    os.environ.update({
+        "LLM_BACKEND": "fake", "LLM_CACHE": "off",
+        "PEXELS_API_KEY": "bench", "PEXELS_API_URL": serve(pexels_handler(background_path)),
+        "ASSEMBLYAI_API_KEY": "bench", "ASSEMBLYAI_API_URL": serve(assemblyai_handler(stt_state)),
+        "STT_ENGINE": args.stt,
+    })
+    if tls_files:
+        os.environ["YOUTUBE_API_URL"] = serve(youtube_handler(youtube_state), tls_files) + "/"
+        os.environ["HTTPLIB2_CA_CERTS"] = tls_files[0]  # Must be set before httplib2 is imported
+        with open(os.path.join(work_dir, "token.json"), "w", encoding="utf-8") as f:
+            json.dump({"token": "bench", "refresh_token": "bench", "client_id": "bench", "client_secret": "bench",
+                       "expiry": (datetime.now(timezone.utc) + timedelta(days=1)).strftime("%Y-%m-%dT%H:%M:%SZ")}, f)
+    os.chdir(work_dir)
+
+    import pyttsx3
+    pyttsx3.init = lambda *a, **k: SyntheticEngine()  # Inherited by forked TTS workers
+    import main as app_module
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    client = app_module.app.test_client()
+    meter = StageMeter()
+
+    print(f"{os.cpu_count()} cores, {args.words} words, profile '{args.profile}', stt '{args.stt}'")
+    titles = meter.measure("titles", lambda: client.post("/generate_titles", json={"topic": "sleep science"}).get_json())
+    variations = meter.measure("variations", lambda: client.post(
+        "/generate_variations", json={"selected_title": titles["titles"][0]}).get_json())
+    script = meter.measure("script", lambda: client.post(
+        "/generate_script", json={"idea": variations["variations"][0]}).get_json()["script"])
+
+    # The fake LLM writes a short script; repeat it so the render length follows --words
+    words = script.split()
+    script = " ".join((words * (args.words // len(words) + 1))[:args.words])
+
+    audio = meter.measure("audio", lambda: client.post("/generate_audio", json={"text": script}).get_json())
+    audio_path = os.path.abspath(audio["audio_path"])
+    with wave.open(audio_path, "rb") as w:
+        duration = w.getnframes() / w.getframerate()
+    stt_state.update(script=script, duration_ms=duration * 1000)
+
+    def render():
+        response = client.post("/generate_video", json={
+            "script": script, "audio_path": audio_path, "profile": args.profile
+        }).get_json()
+        return poll(client, response["status_url"])
+    video = meter.measure("video", render)
+    frames, seconds = imageio_ffmpeg.count_frames_and_secs(video["video_path"])
+
+    meter.measure("seo", lambda: client.post("/optimize_seo", json={"script": script}).get_json())
+    if tls_files:
+        def upload():
+            response = client.post("/upload_video", json={"video_path": os.path.abspath(video["video_path"])})
+            return poll(client, response.get_json()["status_url"])
+        meter.measure("upload", upload)
+    else:
+        print("  upload         skipped (openssl is needed for the HTTPS YouTube stub)")
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "date": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "words": args.words,
+            "profile": args.profile,
+            "stt": args.stt,
+        },
+        "stages": meter.stages,
+        "video": {
+            "audio_seconds": round(duration, 2),
+            "frames": frames,
+            "seconds": round(seconds, 2),
+            "render_fps": round(frames / meter.stages["video"]["wall_s"], 2),
+            "realtime_factor": round(seconds / meter.stages["video"]["wall_s"], 3),
+        },
+        "total_wall_s": round(sum(stage["wall_s"] for stage in meter.stages.values()), 3),
+    }
+    print(f"  {frames} frames ({seconds:.1f}s) rendered at {results['video']['render_fps']} fps, "
+          f"total {results['total_wall_s']:.1f}s")
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output_path}")
+    if args.compare:
+        compare(results, args.compare)
+
+    os.chdir(BASE_DIR)
+    if not args.keep:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
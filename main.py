@@ -1,10 +1,12 @@
 import os
+import re
 import sys
+import hmac
 import logging
-import requests # This might not be explicitly used in the provided snippet, but keep if used elsewhere.
 from pathlib import Path
 from dotenv import load_dotenv
-from flask import Flask, render_template, request, jsonify, send_from_directory
+import json
+from flask import Flask, render_template, request, jsonify, send_from_directory, Response, stream_with_context
 
 # Setup
 BASE_DIR = Path(__file__).parent
@@ -22,22 +24,26 @@ app = Flask(
 )
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'dev-secret-123')
 
-# Agents
-from agents.idea_generator import IdeaGenerator
-from agents.script_generator import ScriptGenerator
-from agents.audio_generator import AudioGenerator
-from agents.video_generator import VideoGenerator
-from agents.uploader import Uploader
-from agents.seo_optimizer import SEOOptimizer
-from agents.stt_generator import STTGenerator
-
-idea_gen = IdeaGenerator()
-script_gen = ScriptGenerator()
-audio_gen = AudioGenerator()
-video_gen = VideoGenerator()
-uploader = Uploader()
-seo_optimizer = SEOOptimizer()
-stt_gen = STTGenerator()
+# Agents are imported and built on first use, so startup stays fast and forking workers stays cheap
+from agents.registry import create_registry, parse_agent_names
+from agents.job_queue import JobQueue
+from agents.batch_runner import run_batch, normalize_items
+from agents import metrics
+
+agent_registry = create_registry()
+idea_gen = agent_registry.lazy("idea_gen")
+script_gen = agent_registry.lazy("script_gen")
+audio_gen = agent_registry.lazy("audio_gen")
+video_gen = agent_registry.lazy("video_gen")
+upload_queue = agent_registry.lazy("upload_queue") # Persistent, quota-aware YouTube upload queue
+seo_optimizer = agent_registry.lazy("seo_optimizer")
+stt_gen = agent_registry.lazy("stt_gen")
+llm = agent_registry.lazy("llm")
+job_queue = JobQueue() # Bounded worker pool for long-running renders (JOB_WORKERS)
+
+# Agents built in a background thread right after startup (AGENT_WARMUP: "all" or a comma-separated list).
+# The upload queue is warmed by default so uploads left pending by a previous run resume on their own.
+agent_registry.warm_up_in_background(parse_agent_names(os.getenv("AGENT_WARMUP", "upload_queue")))
 
 @app.route('/')
 def index():
@@ -46,8 +52,9 @@ def index():
 @app.route('/generate_titles', methods=['POST'])
 def generate_titles():
     try:
-        topic = request.get_json().get("topic", "")
-        titles = idea_gen.generate_trending_titles(topic)
+        data = request.get_json()
+        topic = data.get("topic", "")
+        titles = idea_gen.generate_trending_titles(topic, regenerate=bool(data.get("regenerate")))
         return jsonify({"titles": titles})
     except Exception as e:
         logging.exception("Error generating titles")
@@ -56,8 +63,9 @@ def generate_titles():
 @app.route('/generate_variations', methods=['POST'])
 def generate_variations():
     try:
-        title = request.get_json().get("selected_title", "")
-        variations = idea_gen.generate_variations(title)
+        data = request.get_json()
+        title = data.get("selected_title", "")
+        variations = idea_gen.generate_variations(title, regenerate=bool(data.get("regenerate")))
         return jsonify({"variations": variations})
     except Exception as e:
         logging.exception("Error generating variations")
@@ -66,13 +74,43 @@ def generate_variations():
 @app.route('/generate_script', methods=['POST'])
 def generate_script():
     try:
-        idea = request.get_json().get("idea", "")
-        script = script_gen.generate_script(idea)
+        data = request.get_json()
+        idea = data.get("idea", "")
+        script = script_gen.generate_script(idea, regenerate=bool(data.get("regenerate")))
         return jsonify({"script": script})
     except Exception as e:
         logging.exception("Error generating script")
         return jsonify({"error": str(e)}), 500
 
+def _sse(data, event=None):
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+@app.route('/generate_script_stream', methods=['GET'])
+def generate_script_stream():
+    """Server-sent events: one 'token' message per chunk, then a 'done' event with the full script."""
+    idea = request.args.get("idea", "")
+    regenerate = request.args.get("regenerate", "").lower() in ("1", "true", "yes")
+    if not idea:
+        return jsonify({"error": "No idea provided"}), 400
+
+    def events():
+        parts = []
+        try:
+            for token in script_gen.stream_script(idea, regenerate=regenerate):
+                parts.append(token)
+                yield _sse({"token": token})
+            yield _sse({"script": "".join(parts).strip()}, event="done")
+        except Exception as e:
+            logging.exception("Error streaming script")
+            yield _sse({"error": str(e)}, event="error")
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"} # Keep proxies from buffering tokens
+    )
+
 @app.route('/generate_audio', methods=['POST'])
 def generate_audio():
     logging.info("DEBUG: /generate_audio route hit.")
@@ -88,7 +126,7 @@ def generate_audio():
             logging.error("❌ Backend: Text for audio generation is empty.")
             return jsonify({"error": "No text provided for audio generation"}), 400
 
-        audio_path = audio_gen.generate_with_pyttsx3(text)
+        audio_path = audio_gen.generate_with_pyttsx3(text, voice_id)
 
         if audio_path:
             logging.info(f"DEBUG: Audio generation successful. Path: {audio_path}")
@@ -104,46 +142,149 @@ def generate_audio():
 @app.route('/optimize_seo', methods=['POST'])
 def optimize_seo():
     try:
-        script = request.get_json().get("script", "")
+        data = request.get_json()
+        script = data.get("script", "")
         # The optimize method now needs the actual video path for better SEO,
         # but for now, we're keeping it a placeholder as per your current setup.
         # If SEO requires the *generated* video, you'd need to pass it from generate_video
         # or store it in a session. For now, it's just the script.
-        result = seo_optimizer.optimize("placeholder_video_path.mp4", script)
+        result = seo_optimizer.optimize("placeholder_video_path.mp4", script, regenerate=bool(data.get("regenerate")))
         return jsonify(result)
     except Exception as e:
         logging.exception("Error optimizing SEO")
         return jsonify({"error": str(e)}), 500
 
+def _run_video_job(job, script, abs_audio_path, profile, crf, segments=None, incremental=None, montage=None,
+                   base_job=None):
+    """Worker-side body of a /generate_video job: word timings, then render and encode."""
+    job.set_stage("transcribing")
+    word_timings = stt_gen.word_timings(abs_audio_path, script)
+
+    if word_timings is None:
+        logging.warning("No word timings received from STT. Video will be generated without dynamic subtitles.")
+
+    # One output file per job so concurrent renders never overwrite each other
+    video_path = video_gen.generate_video(
+        script, abs_audio_path, word_timings, profile=profile, crf=crf,
+        output_name=f"video_{job.id}.mp4",
+        segments=segments,
+        incremental=incremental,
+        montage=montage,
+        base_name=f"video_{base_job}.mp4" if base_job else None,
+        stage_callback=job.set_stage,
+        progress_callback=job.set_progress
+    )
+    if not video_path:
+        raise RuntimeError("Video generation returned no output")
+    logging.info(f"DEBUG: Video generation successful. Path: {video_path}")
+    return {"video_path": video_path}
+
 @app.route('/generate_video', methods=['POST'])
 def generate_video():
     try:
         data = request.get_json()
         script = data.get("script", "")
         relative_audio_path = data.get("audio_path", "")
+        profile = data.get("profile") # Encoder profile: draft, publish or archive
+        try:
+            crf = _int_param(data, "crf", 0, 51) # Overrides the profile's quality; lower is better
+            segments = _int_param(data, "segments") # > 1 splits the render across processes
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        incremental = data.get("incremental") # Reuse unchanged segments from earlier renders
+        montage = data.get("montage") # One Pexels clip per timeline segment
+        base_job = data.get("base_job") # Earlier render this one edits; its unchanged segments are kept
+        if base_job is not None and not (isinstance(base_job, str) and re.fullmatch(r"[0-9a-f]{32}", base_job)):
+            return jsonify({"error": "'base_job' must be the job_id of an earlier /generate_video job"}), 400
         
         abs_audio_path = os.path.join(BASE_DIR, relative_audio_path)
         
         logging.info(f"DEBUG: generate_video received audio_path: {relative_audio_path}")
         logging.info(f"DEBUG: generate_video using absolute audio_path: {abs_audio_path}")
 
-        word_timings = stt_gen.transcribe_audio(abs_audio_path)
-
-        if word_timings is None:
-            logging.warning("No word timings received from STT. Video will be generated without dynamic subtitles.")
+        if not os.path.exists(abs_audio_path):
+            return jsonify({"error": f"Audio file not found: {relative_audio_path}"}), 400
 
-        video_path = video_gen.generate_video(script, abs_audio_path, word_timings)
-        
-        if video_path:
-            logging.info(f"DEBUG: Video generation successful. Path: {video_path}")
-            return jsonify({"video_path": video_path})
-        else:
-            logging.error("❌ Backend: Video generation returned None.")
-            return jsonify({"error": "Failed to generate video"}), 500
+        # Rendering takes minutes: queue it and let the client poll /jobs/<job_id>
+        job = job_queue.submit(
+            _run_video_job, script, abs_audio_path, profile, crf, segments, incremental, montage, base_job,
+            kind="generate_video"
+        )
+        return jsonify({"job_id": job.id, "status_url": f"/jobs/{job.id}"}), 202
     except Exception as e:
         logging.exception("Error generating video")
         return jsonify({"error": str(e)}), 500
 
+def _int_param(data, name, minimum=1, maximum=None):
+    """Optional integer from a JSON body within [minimum, maximum]. Raises ValueError on bad input."""
+    value = data.get(name)
+    if value is None or value == "":
+        return None
+    expected = f"an integer from {minimum} to {maximum}" if maximum is not None else (
+        "a positive integer" if minimum == 1 else f"an integer >= {minimum}")
+    try:
+        if isinstance(value, bool):
+            raise ValueError
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{name}' must be {expected}, got {value!r}")
+    if value < minimum or (maximum is not None and value > maximum):
+        raise ValueError(f"'{name}' must be {expected}, got {value}")
+    return value
+
+def _str_list_param(data, name):
+    """Optional list of strings from a JSON body. Raises ValueError on bad input."""
+    value = data.get(name)
+    if value is None:
+        return []
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise ValueError(f"'{name}' must be a list of strings, got {value!r}")
+    return value
+
+def _run_batch_job(job, items, workers, profile):
+    job.set_stage("rendering")
+    return run_batch(items, workers=workers, profile=profile, progress_callback=job.set_progress)
+
+@app.route('/batch_generate', methods=['POST'])
+def batch_generate():
+    try:
+        data = request.get_json()
+        try:
+            items = normalize_items(_str_list_param(data, "topics"), _str_list_param(data, "ideas"))
+            workers = _int_param(data, "workers")
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if workers:
+            workers = min(workers, os.cpu_count() or 1) # More processes than cores only adds contention
+        if not items:
+            return jsonify({"error": "Provide a non-empty 'topics' or 'ideas' list"}), 400
+
+        # The batch fans out to its own process pool; the job only tracks completed videos
+        job = job_queue.submit(_run_batch_job, items, workers, data.get("profile"), kind="batch")
+        return jsonify({"job_id": job.id, "status_url": f"/jobs/{job.id}", "items": len(items)}), 202
+    except Exception as e:
+        logging.exception("Error starting batch")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/stt_webhook', methods=['POST'])
+def stt_webhook():
+    # AssemblyAI completion callback (ASSEMBLYAI_WEBHOOK_URL); wakes the job waiting on this transcript
+    secret = stt_gen.webhook_secret
+    if secret and not hmac.compare_digest(request.headers.get("X-Webhook-Secret", "").encode(), secret.encode()):
+        return jsonify({"error": "Invalid webhook secret"}), 403
+    data = request.get_json(silent=True) or {}
+    transcript_id = data.get("transcript_id")
+    if not transcript_id:
+        return jsonify({"error": "No transcript_id provided"}), 400
+    return jsonify({"received": stt_gen.notify(transcript_id, data.get("status"))})
+
 @app.route('/upload_video', methods=['POST'])
 def upload_video():
     try:
@@ -160,23 +301,67 @@ def upload_video():
         # Reconstruct absolute path for the uploader
         abs_video_path = os.path.join(BASE_DIR, video_path_relative)
         logging.info(f"DEBUG: Attempting to upload video from: {abs_video_path}")
+        if not os.path.exists(abs_video_path):
+            return jsonify({"status": "failed", "message": "Video file not found."}), 404
 
-        uploaded_video_id = uploader.upload(abs_video_path, title, description, tags)
-        
-        if uploaded_video_id:
-            logging.info(f"DEBUG: Video uploaded successfully. ID: {uploaded_video_id}")
-            return jsonify({"status": "uploaded", "video_id": uploaded_video_id})
-        else:
-            logging.error("❌ Backend: Video upload failed (uploader returned None).")
-            return jsonify({"status": "failed", "message": "Video upload failed."}), 500
+        # The queue persists the upload and runs it within the concurrency and daily quota limits
+        upload_id = upload_queue.enqueue(
+            abs_video_path, title, description, tags,
+            privacy_status=data.get("privacy_status", "private"),
+            thumbnail_path=data.get("thumbnail_path"),
+            publish_at=data.get("publish_at")
+        )
+        return jsonify({"upload_id": upload_id, "status_url": f"/uploads/{upload_id}"}), 202
     except Exception as e:
         logging.exception("Error uploading video")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/schedule_uploads', methods=['POST'])
+def schedule_uploads():
+    """Queues several videos with publishAt slots: first_publish_at, then every interval_hours."""
+    try:
+        data = request.get_json()
+        videos = data.get("videos", [])
+        if not videos or not data.get("first_publish_at"):
+            return jsonify({"error": "Provide 'videos' and 'first_publish_at'"}), 400
+        items = [{
+            "video_path": os.path.join(BASE_DIR, v["video_path"]),
+            "title": v.get("title", "AI Generated Video"),
+            "description": v.get("description", ""),
+            "tags": v.get("tags", []),
+            "thumbnail_path": v.get("thumbnail_path"),
+        } for v in videos]
+        ids = upload_queue.enqueue_schedule(items, data["first_publish_at"], float(data.get("interval_hours", 24)))
+        return jsonify({"upload_ids": ids, "quota": upload_queue.quota_status()}), 202
+    except Exception as e:
+        logging.exception("Error scheduling uploads")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/uploads', methods=['GET'])
+def list_uploads():
+    return jsonify({"quota": upload_queue.quota_status(), "uploads": upload_queue.list(request.args.get("status"))})
+
+@app.route('/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    item = upload_queue.get(upload_id)
+    if item is None:
+        return jsonify({"error": "Upload not found"}), 404
+    return jsonify(item)
+
+@app.route('/llm_cache/stats', methods=['GET'])
+def llm_cache_stats():
+    # Hit/miss counters and upstream latency saved by the shared LLM response cache
+    return jsonify(llm.cache_stats())
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    # Prometheus scrape target: span durations per pipeline step plus byte, frame, job and upload counters
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
 @app.route('/Static/videos/<filename>')
 def serve_video(filename):
     logging.info(f"DEBUG: Serving video file: {filename}")
-    full_path_to_video_dir = os.path.join(BASE_DIR, 'assets', 'output')
+    full_path_to_video_dir = os.path.join(BASE_DIR, 'Static', 'videos', 'output')
     if not os.path.exists(os.path.join(full_path_to_video_dir, filename)):
         logging.error(f"ERROR: Video file not found at {os.path.join(full_path_to_video_dir, filename)}")
         return "File not found", 404
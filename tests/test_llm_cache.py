@@ -0,0 +1,96 @@
+import itertools
+import pytest
+from agents import llm_cache, llm_gateway
+from agents.llm_cache import ResponseCache, cache_key
+from agents.llm_gateway import LLMGateway
+from agents.idea_generator import IdeaGenerator
+from agents.script_generator import ScriptGenerator
+
+
+@pytest.fixture
+def gateway(monkeypatch, tmp_path):
+    """Fake-backend gateway whose answers change on every upstream call, so cache hits are visible."""
+    monkeypatch.setenv("LLM_CACHE_PATH", str(tmp_path / "llm.sqlite3"))
+    gateway = LLMGateway(backend="fake")
+    counter = itertools.count(1)
+    gateway.fake.reply = lambda messages, model, **params: f"1. answer {next(counter)}"
+    monkeypatch.setattr(llm_gateway, "_gateway", gateway)  # What the agents get from get_gateway()
+    return gateway
+
+
+def prompt(text):
+    return [{"role": "user", "content": text}]
+
+
+def test_identical_prompts_hit_the_cache(gateway):
+    assert gateway.complete(prompt("titles about cats"), cache_ttl=60) == "1. answer 1"
+    assert gateway.complete(prompt("  titles   about\ncats "), cache_ttl=60) == "1. answer 1"  # Whitespace only
+    assert gateway.complete(prompt("titles about dogs"), cache_ttl=60) == "1. answer 2"
+    assert gateway.cache_stats()["hits"] == 1
+    assert gateway.cache_stats()["misses"] == 2
+    assert gateway.cache_stats()["entries"] == 2
+
+
+def test_model_and_parameters_are_part_of_the_key(gateway):
+    gateway.complete(prompt("q"), cache_ttl=60)
+    assert gateway.complete(prompt("q"), model="other-model", cache_ttl=60) == "1. answer 2"
+    assert gateway.complete(prompt("q"), cache_ttl=60, temperature=0.2) == "1. answer 3"
+    assert cache_key("m", prompt("q"), {}, backend="fake") != cache_key("m", prompt("q"), {}, backend="groq")
+
+
+def test_entries_expire_after_their_ttl(gateway, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    gateway.complete(prompt("q"), cache_ttl=60)
+
+    now[0] += 59
+    assert gateway.complete(prompt("q"), cache_ttl=60) == "1. answer 1"
+    now[0] += 2
+    assert gateway.complete(prompt("q"), cache_ttl=60) == "1. answer 2"  # Stale entry is replaced
+    assert gateway.complete(prompt("q"), cache_ttl=60) == "1. answer 2"
+
+
+def test_calls_without_ttl_are_not_cached(gateway):
+    assert gateway.complete(prompt("q")) == "1. answer 1"
+    assert gateway.complete(prompt("q")) == "1. answer 2"
+    assert gateway.cache_stats()["entries"] == 0
+
+
+def test_bypass_fetches_a_fresh_answer_and_stores_it(gateway):
+    gateway.complete(prompt("q"), cache_ttl=60)
+    assert gateway.complete(prompt("q"), cache_ttl=60, bypass_cache=True) == "1. answer 2"
+    assert gateway.complete(prompt("q"), cache_ttl=60) == "1. answer 2"
+
+
+def test_regenerate_in_an_agent_skips_the_cache(gateway):
+    ideas = IdeaGenerator()
+    assert ideas.generate_trending_titles("cats") == ["answer 1"]
+    assert ideas.generate_trending_titles("cats") == ["answer 1"]
+    assert ideas.generate_trending_titles("cats", regenerate=True) == ["answer 2"]
+    assert ideas.generate_trending_titles("cats") == ["answer 2"]
+
+
+def test_streams_are_cached_once_read_to_the_end(gateway):
+    streamed = "".join(gateway.stream(prompt("q"), cache_ttl=60))
+    assert streamed.strip() == "1. answer 1"
+    assert list(gateway.stream(prompt("q"), cache_ttl=60)) == [streamed]  # Served in one piece
+
+
+def test_script_stream_cut_at_the_word_limit_is_cached(gateway):
+    calls = itertools.count(1)
+    gateway.fake.reply = lambda messages, model, **params: f"take {next(calls)} " + "word " * 50
+    scripts = ScriptGenerator()
+    streamed = "".join(scripts.stream_script("cats", max_words=10))
+    assert streamed == "take 1 " + "word " * 7 + "word..."
+    assert scripts.generate_script("cats", max_words=10) == streamed  # No second upstream call
+    assert "".join(scripts.stream_script("cats", max_words=10)) == streamed
+    assert "".join(scripts.stream_script("cats", max_words=10, regenerate=True)).startswith("take 2 ")
+
+
+def test_hits_count_the_latency_they_saved(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"))
+    cache.put("k", "m", "answer", latency=1.5)
+    assert cache.get("k", ttl=60) == "answer"
+    assert cache.get("missing", ttl=60) is None
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1, "hit_rate": 0.5, "saved_seconds": 1.5}
+    assert cache.purge_expired(max_age=-1) == 1
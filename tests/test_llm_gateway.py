@@ -0,0 +1,173 @@
+import time
+import asyncio
+import threading
+from types import SimpleNamespace
+import httpx
+import groq
+import pytest
+from agents.llm_gateway import LLMGateway, TokenBucket
+
+
+class StubCompletions:
+    """Stands in for client.chat.completions, sync and async, counting requests in flight."""
+
+    def __init__(self, delay=0.05, failures=()):
+        self.delay = delay
+        self.failures = list(failures)  # Exceptions raised by the first calls, in order
+        self.calls = 0
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def _enter(self):
+        with self._lock:
+            self.calls += 1
+            if self.failures:
+                raise self.failures.pop(0)
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+
+    def _leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    @staticmethod
+    def _response(messages):
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"re: {messages[-1]['content']}"))])
+
+    def create(self, messages, model, **params):
+        self._enter()
+        try:
+            time.sleep(self.delay)
+        finally:
+            self._leave()
+        return self._response(messages)
+
+    async def acreate(self, messages, model, **params):
+        self._enter()
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self._leave()
+        return self._response(messages)
+
+
+def make_gateway(monkeypatch, stub, max_concurrency=2, requests_per_minute=60000):
+    monkeypatch.setenv("LLM_CACHE", "off")
+    gateway = LLMGateway(api_key="test", backend="groq", max_concurrency=max_concurrency,
+                         requests_per_minute=requests_per_minute)
+    gateway.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=stub.create)))
+    gateway.async_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=stub.acreate)))
+    gateway._backoff = lambda attempt, error: 0.0
+    return gateway
+
+
+def prompt(text):
+    return [{"role": "user", "content": text}]
+
+
+def http_error(cls, status):
+    response = httpx.Response(status, request=httpx.Request("POST", "http://groq.test/chat"))
+    return cls(f"HTTP {status}", response=response, body=None)
+
+
+def test_token_bucket_allows_a_burst_then_paces():
+    bucket = TokenBucket(rate=20, capacity=2)
+    started = time.monotonic()
+    bucket.acquire()
+    bucket.acquire()
+    assert time.monotonic() - started < 0.03  # The burst capacity is available immediately
+
+    for _ in range(4):
+        bucket.acquire()
+    assert time.monotonic() - started >= 4 / 20 - 0.01
+
+
+def test_gateway_paces_requests_with_its_token_bucket(monkeypatch):
+    stub = StubCompletions(delay=0)
+    gateway = make_gateway(monkeypatch, stub, max_concurrency=1, requests_per_minute=600)  # 10 per second
+    started = time.monotonic()
+    for i in range(4):
+        gateway.complete(prompt(str(i)))
+    assert time.monotonic() - started >= 3 / 10 - 0.01
+
+
+def test_sync_calls_share_the_concurrency_limit(monkeypatch):
+    stub = StubCompletions()
+    gateway = make_gateway(monkeypatch, stub)
+    results = {}
+
+    def call(i):
+        results[i] = gateway.complete(prompt(f"q{i}"))
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == {i: f"re: q{i}" for i in range(8)}
+    assert stub.peak == 2
+
+
+def test_sync_and_async_calls_share_one_limit(monkeypatch):
+    stub = StubCompletions()
+    gateway = make_gateway(monkeypatch, stub)
+    threads = [threading.Thread(target=gateway.complete, args=(prompt(f"sync{i}"),)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    results = gateway.complete_many([{"messages": prompt(f"async{i}")} for i in range(6)])
+    for thread in threads:
+        thread.join()
+
+    assert results == [f"re: async{i}" for i in range(6)]
+    assert stub.calls == 10
+    assert stub.peak == 2
+
+
+def test_async_callers_on_their_own_loop_are_limited(monkeypatch):
+    stub = StubCompletions()
+    gateway = make_gateway(monkeypatch, stub)
+
+    async def fan_out():
+        return await asyncio.gather(*(gateway.acomplete(prompt(f"q{i}")) for i in range(6)))
+
+    assert asyncio.run(fan_out()) == [f"re: q{i}" for i in range(6)]
+    assert stub.peak == 2
+
+
+def test_rate_limit_errors_are_retried(monkeypatch):
+    stub = StubCompletions(delay=0, failures=[http_error(groq.RateLimitError, 429),
+                                              http_error(groq.InternalServerError, 503)])
+    gateway = make_gateway(monkeypatch, stub)
+    assert gateway.complete(prompt("hello")) == "re: hello"
+    assert stub.calls == 3
+
+
+def test_client_errors_fail_without_retrying(monkeypatch):
+    stub = StubCompletions(delay=0, failures=[http_error(groq.BadRequestError, 400)])
+    gateway = make_gateway(monkeypatch, stub)
+    with pytest.raises(groq.BadRequestError):
+        gateway.complete(prompt("hello"))
+    assert stub.calls == 1
+
+
+def test_retries_give_up_after_max_retries(monkeypatch):
+    stub = StubCompletions(delay=0, failures=[http_error(groq.RateLimitError, 429)] * 3)
+    gateway = make_gateway(monkeypatch, stub)
+    gateway.max_retries = 2
+    with pytest.raises(groq.RateLimitError):
+        gateway.complete(prompt("hello"))
+    assert stub.calls == 3
+
+
+def test_fake_backend_answers_offline(monkeypatch):
+    monkeypatch.setenv("LLM_CACHE", "off")
+    gateway = LLMGateway(backend="fake")
+    titles = gateway.complete(prompt("Generate 5 title ideas. Number them."))
+    assert titles.splitlines()[0].startswith("1. ")
+    assert gateway.complete(prompt("Write a script")) == gateway.complete(prompt("Write a script"))
+    assert "".join(gateway.stream(prompt("Write a script"))).strip() == gateway.complete(prompt("Write a script"))
+    assert gateway.complete_many([{"messages": prompt("a")}, {"messages": prompt("b")}]) == [
+        gateway.complete(prompt("a")), gateway.complete(prompt("b"))
+    ]
@@ -0,0 +1,90 @@
+import os
+import json
+from agents.media_cache import MediaCache
+from agents.video_generator import VideoGenerator
+
+CLIP = b"\x00\x01fake-mp4" * 100000
+
+
+def pexels_stub(stub_server):
+    def handler(request):
+        if request["path"].startswith("/videos/search"):
+            return 200, {"Content-Type": "application/json"}, json.dumps({"videos": [{
+                "id": 42,
+                "video_files": [{"file_type": "video/mp4", "width": 1080, "height": 1920,
+                                 "link": f"{server.url}/files/42.mp4"}],
+            }]})
+        if request["path"] == "/files/42.mp4":
+            return 200, {"Content-Type": "video/mp4"}, CLIP
+        return 404, {}, b""
+
+    server = stub_server(handler)
+    return server
+
+
+def make_generator(monkeypatch, server):
+    monkeypatch.setenv("PEXELS_API_KEY", "test-key")
+    monkeypatch.setenv("PEXELS_API_URL", server.url)
+    return VideoGenerator()
+
+
+def test_repeat_query_is_served_from_cache(stub_server, monkeypatch):
+    server = pexels_stub(stub_server)
+    generator = make_generator(monkeypatch, server)
+
+    path = generator._fetch_pexels_video("nature")
+    with open(path, "rb") as f:
+        assert f.read() == CLIP
+    assert [r["path"].split("?")[0] for r in server.requests] == ["/videos/search", "/files/42.mp4"]
+    assert server.requests[0]["headers"]["Authorization"] == "test-key"
+
+    assert generator._fetch_pexels_video("nature") == path
+    assert len(server.requests) == 2  # Cache hits never touch the network
+
+
+def test_expired_search_refetches_json_but_not_the_clip(stub_server, monkeypatch):
+    server = pexels_stub(stub_server)
+    generator = make_generator(monkeypatch, server)
+    path = generator._fetch_pexels_video("ocean")
+
+    generator.search_cache_ttl = -1  # Every cached search response is now stale
+    assert generator._fetch_pexels_video("ocean") == path
+    assert [r["path"].split("?")[0] for r in server.requests] == ["/videos/search", "/files/42.mp4", "/videos/search"]
+
+
+def test_http_error_returns_none_and_caches_nothing(stub_server, monkeypatch):
+    server = stub_server(lambda request: (500, {}, b"boom"))
+    generator = make_generator(monkeypatch, server)
+
+    assert generator._fetch_pexels_video("forest") is None
+    assert generator._fetch_pexels_video("forest") is None
+    assert len(server.requests) == 2
+
+
+def test_media_cache_evicts_least_recently_used(tmp_path):
+    cache = MediaCache(str(tmp_path / "cache"), max_size_gb=250 / 1024 ** 3)
+    first = cache.put_bytes("first", b"a" * 100, ".mp4")
+    second = cache.put_bytes("second", b"b" * 100, ".mp4")
+    os.utime(first, (1, 1))
+    os.utime(second, (2, 2))
+    assert cache.get("first", ".mp4") == first  # A hit refreshes the entry
+
+    third = cache.put_bytes("third", b"c" * 100, ".mp4")
+    assert os.path.exists(first) and os.path.exists(third)
+    assert not os.path.exists(second)
+    assert cache.get("second", ".mp4") is None
+
+
+def test_media_cache_writes_atomically(tmp_path):
+    cache = MediaCache(str(tmp_path / "cache"))
+
+    def failing_chunks():
+        yield b"partial"
+        raise ConnectionError("dropped")
+
+    try:
+        cache.put_stream("clip", failing_chunks(), ".mp4")
+    except ConnectionError:
+        pass
+    assert cache.get("clip", ".mp4") is None
+    assert os.listdir(cache.root) == []
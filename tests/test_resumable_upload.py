@@ -0,0 +1,172 @@
+import json
+import time
+import pytest
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
+from googleapiclient.errors import HttpError
+from googleapiclient.http import build_http
+from agents.resumable_upload import ResumableUploader, CHUNK_ALIGNMENT
+
+UPLOAD_PATH = "/upload/youtube/v3/videos"
+SESSION_PATH = "/upload/session/s1"
+CLIENT_TIMEOUT = 0.5
+
+
+def content_range_of(request):
+    return next((v for k, v in request["headers"].items() if k.lower() == "content-range"), "")
+
+
+class ResumableEndpoint:
+    """
+    YouTube's resumable upload endpoint: POST opens a session, PUT stores a chunk and answers 308 with
+    the committed Range (or 200 with the video once complete), PUT 'bytes */<size>' queries the offset.
+    `faults` holds status codes served to the next chunk PUTs instead of storing them, or "timeout" to
+    store the chunk but answer too late for the client.
+    """
+
+    def __init__(self, stub_server, faults=()):
+        self.data = b""
+        self.sessions = 0
+        self.faults = list(faults)
+        self.expired = False
+        self.server = stub_server(self.handle)
+
+    def _committed(self):
+        headers = {"Range": f"bytes=0-{len(self.data) - 1}"} if self.data else {}
+        return 308, headers, b""
+
+    def handle(self, request):
+        if request["method"] == "POST" and request["path"].startswith(UPLOAD_PATH):
+            self.sessions += 1
+            self.data = b""
+            return 200, {"Location": self.server.url + SESSION_PATH}, b""
+        if request["method"] != "PUT" or request["path"] != SESSION_PATH:
+            return 404, {}, b""
+        if self.expired:
+            return 410, {}, b""
+        content_range = content_range_of(request)
+        if content_range.startswith("bytes */"):
+            return self._committed()
+        fault = self.faults.pop(0) if self.faults else None
+        if fault and fault != "timeout":
+            return fault, {}, b""
+        first, rest = content_range[len("bytes "):].split("-")
+        total = rest.split("/")[1]
+        if int(first) != len(self.data):
+            return 400, {}, b"chunk does not continue from the committed byte"
+        self.data += request["body"]
+        if len(self.data) == int(total):
+            reply = 200, {"Content-Type": "application/json"}, json.dumps({"id": "v1"})
+        else:
+            reply = self._committed()
+        if fault == "timeout":
+            time.sleep(CLIENT_TIMEOUT * 2)
+        return reply
+
+    @property
+    def status_queries(self):
+        return [r for r in self.server.requests if content_range_of(r).startswith("bytes */")]
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(bytes(range(256)) * (CHUNK_ALIGNMENT * 3 // 256 + 100))
+    return path
+
+
+def youtube_client(endpoint):
+    # The bundled YouTube discovery document, pointed at the local endpoint
+    document = json.loads(discovery_cache.get_static_doc("youtube", "v3"))
+    document["rootUrl"] = endpoint.server.url + "/"
+    http = build_http()
+    http.timeout = CLIENT_TIMEOUT
+    return build_from_document(document, http=http, developerKey="test-key")
+
+
+def make_uploader(tmp_path, monkeypatch, **kwargs):
+    monkeypatch.setattr(ResumableUploader, "_backoff", lambda self, attempt: 0)
+    return ResumableUploader(session_dir=str(tmp_path / "sessions"), chunk_size=CHUNK_ALIGNMENT, **kwargs)
+
+
+def test_uploads_in_chunks(stub_server, tmp_path, monkeypatch, video):
+    endpoint = ResumableEndpoint(stub_server)
+    progress = []
+    response = make_uploader(tmp_path, monkeypatch).upload(
+        youtube_client(endpoint), str(video), {"snippet": {"title": "t"}},
+        progress_callback=lambda sent, total: progress.append(sent))
+    assert response["id"] == "v1"
+    assert endpoint.data == video.read_bytes()
+    assert progress == [CHUNK_ALIGNMENT, 2 * CHUNK_ALIGNMENT, 3 * CHUNK_ALIGNMENT, video.stat().st_size]
+    assert list((tmp_path / "sessions").iterdir()) == []
+
+
+@pytest.mark.parametrize("fault", [503, "timeout"])
+def test_resumes_from_committed_byte_after_transient_error(stub_server, tmp_path, monkeypatch, video, fault):
+    endpoint = ResumableEndpoint(stub_server, faults=[None, fault])
+    uploader = make_uploader(tmp_path, monkeypatch)
+    response = uploader.upload(youtube_client(endpoint), str(video), {"snippet": {"title": "t"}})
+    assert response["id"] == "v1"
+    assert endpoint.data == video.read_bytes()
+    assert endpoint.sessions == 1
+    assert len(endpoint.status_queries) == 1
+
+
+def test_restart_resumes_saved_session(stub_server, tmp_path, monkeypatch, video):
+    endpoint = ResumableEndpoint(stub_server)
+    body = {"snippet": {"title": "t"}}
+    real_handle = endpoint.handle
+
+    def fail_second_chunk(request):
+        if request["method"] == "PUT" and endpoint.data and not endpoint.status_queries:
+            return 503, {}, b""
+        return real_handle(request)
+
+    endpoint.server.handler = fail_second_chunk
+    with pytest.raises(HttpError):
+        make_uploader(tmp_path, monkeypatch, max_retries=0).upload(youtube_client(endpoint), str(video), body)
+    assert len(endpoint.data) == CHUNK_ALIGNMENT
+
+    # A fresh uploader (as after a restart) asks the saved session for its offset and sends only the rest
+    endpoint.server.handler = real_handle
+    sent_before = len(endpoint.server.requests)
+    response = make_uploader(tmp_path, monkeypatch).upload(youtube_client(endpoint), str(video), body)
+    assert response["id"] == "v1"
+    assert endpoint.data == video.read_bytes()
+    assert endpoint.sessions == 1
+    resumed = endpoint.server.requests[sent_before:]
+    assert content_range_of(resumed[0]) == f"bytes */{video.stat().st_size}"
+    assert sum(len(r["body"]) for r in resumed) == video.stat().st_size - CHUNK_ALIGNMENT
+
+
+def test_expired_session_starts_over(stub_server, tmp_path, monkeypatch, video):
+    endpoint = ResumableEndpoint(stub_server)
+    body = {"snippet": {"title": "t"}}
+    uploader = make_uploader(tmp_path, monkeypatch)
+    uploader.sessions.put(uploader.fingerprint(str(video), body),
+                          {"resumable_uri": endpoint.server.url + SESSION_PATH, "video_path": str(video)})
+    endpoint.expired = True
+    real_handle = endpoint.handle
+
+    def revive_on_new_session(request):
+        if request["method"] == "POST":
+            endpoint.expired = False
+        return real_handle(request)
+
+    endpoint.server.handler = revive_on_new_session
+    response = uploader.upload(youtube_client(endpoint), str(video), body)
+    assert response["id"] == "v1"
+    assert endpoint.sessions == 1
+    assert endpoint.data == video.read_bytes()
+
+
+def test_non_retriable_errors_fail_fast(stub_server, tmp_path, monkeypatch, video):
+    endpoint = ResumableEndpoint(stub_server, faults=[403])
+    uploader = make_uploader(tmp_path, monkeypatch)
+    with pytest.raises(HttpError) as raised:
+        uploader.upload(youtube_client(endpoint), str(video), {"snippet": {"title": "t"}})
+    assert raised.value.resp.status == 403
+    assert len(endpoint.server.requests) == 2  # The session POST and the one rejected chunk
+
+    with pytest.raises(FileNotFoundError):
+        uploader.upload(youtube_client(endpoint), str(tmp_path / "missing.mp4"), {"snippet": {"title": "t"}})
@@ -0,0 +1,142 @@
+import json
+import time
+import wave
+import threading
+import pytest
+from agents.stt_generator import STTGenerator
+
+WORDS = [{"text": "hello", "start": 0, "end": 400}, {"text": "world", "start": 450, "end": 900}]
+
+
+class AssemblyAIStub:
+    """Upload, submit and poll endpoints of AssemblyAI; the transcript completes when `done` is set."""
+
+    def __init__(self, stub_server, on_submit=None):
+        self.done = threading.Event()
+        self.on_submit = on_submit
+        self.server = stub_server(self.handle)
+
+    def handle(self, request):
+        if request["method"] == "POST" and request["path"] == "/v2/upload":
+            return 200, {"Content-Type": "application/json"}, json.dumps({"upload_url": "https://cdn.test/audio"})
+        if request["method"] == "POST" and request["path"] == "/v2/transcript":
+            if self.on_submit:
+                self.on_submit(json.loads(request["body"]))
+            return 200, {"Content-Type": "application/json"}, json.dumps({"id": "t1", "status": "queued"})
+        if request["method"] == "GET" and request["path"] == "/v2/transcript/t1":
+            body = {"id": "t1", "status": "completed", "words": WORDS} if self.done.is_set() else {
+                "id": "t1", "status": "processing"}
+            return 200, {"Content-Type": "application/json"}, json.dumps(body)
+        return 404, {}, b""
+
+    @property
+    def polls(self):
+        return sum(1 for r in self.server.requests if r["method"] == "GET")
+
+
+@pytest.fixture
+def make_stt(monkeypatch):
+    def make(stub, **env):
+        monkeypatch.setenv("ASSEMBLYAI_API_KEY", "test-key")
+        monkeypatch.setenv("ASSEMBLYAI_API_URL", stub.server.url + "/v2")
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        return STTGenerator()
+    return make
+
+
+def write_wav(path, seconds, rate=8000):
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(b"\x00\x00" * int(seconds * rate))
+    return str(path)
+
+
+def test_poll_schedule_scales_with_audio_duration(stub_server, make_stt):
+    stt = make_stt(AssemblyAIStub(stub_server))
+    short_first, short_max, short_deadline = stt.poll_schedule(5)
+    long_first, long_max, long_deadline = stt.poll_schedule(1800)
+    assert short_first == 0.5 and long_first == 5.0
+    assert short_max < long_max <= 15.0
+    assert short_deadline == 120.0 and long_deadline == 3 * 1800 + 60
+
+
+def test_webhook_wakes_the_waiter_before_the_next_poll(stub_server, make_stt):
+    stub = AssemblyAIStub(stub_server)
+    stt = make_stt(stub)
+
+    def complete_and_notify():
+        time.sleep(0.3)
+        stub.done.set()
+        assert stt.notify("t1", "completed")
+
+    threading.Thread(target=complete_and_notify).start()
+    started = time.monotonic()
+    assert stt._wait_for_transcript("t1", audio_duration=600) == WORDS  # First poll would be after 5s
+    assert time.monotonic() - started < 2.0
+    assert stub.polls == 1
+    assert stt._pending == {}
+
+
+def test_webhook_that_arrives_before_the_waiter_is_kept(stub_server, make_stt):
+    stub = AssemblyAIStub(stub_server)
+    stt = make_stt(stub)
+    stub.done.set()
+    assert not stt.notify("t1", "completed")  # Nobody waits yet
+
+    started = time.monotonic()
+    assert stt._wait_for_transcript("t1", audio_duration=600) == WORDS
+    assert time.monotonic() - started < 2.0
+
+
+def test_transcription_completes_on_a_webhook_sent_during_submit(stub_server, make_stt, tmp_path):
+    def on_submit(body):
+        # AssemblyAI may call the webhook before the submit response reaches us
+        assert body["webhook_url"] == "https://app.test/stt_webhook"
+        assert body["webhook_auth_header_value"] == "s3cret"
+        stub.done.set()
+        threading.Thread(target=stt.notify, args=("t1", "completed")).start()
+
+    stub = AssemblyAIStub(stub_server, on_submit)
+    stt = make_stt(stub, ASSEMBLYAI_WEBHOOK_URL="https://app.test/stt_webhook", ASSEMBLYAI_WEBHOOK_SECRET="s3cret")
+    audio = write_wav(tmp_path / "voice.wav", seconds=60)  # First poll would be after 3s
+
+    started = time.monotonic()
+    assert stt.transcribe_audio(audio) == WORDS
+    assert time.monotonic() - started < 2.0
+
+
+def test_polling_alone_completes_without_a_webhook(stub_server, make_stt):
+    stub = AssemblyAIStub(stub_server)
+    stt = make_stt(stub)
+    threading.Timer(0.8, stub.done.set).start()
+    assert stt._wait_for_transcript("t1", audio_duration=5) == WORDS
+    assert stub.polls >= 2
+
+
+def test_deadline_stops_polling(stub_server, make_stt):
+    stub = AssemblyAIStub(stub_server)
+    stt = make_stt(stub, STT_TIMEOUT="1")
+    started = time.monotonic()
+    assert stt._wait_for_transcript("t1", audio_duration=5) is None
+    assert 0.9 < time.monotonic() - started < 2.0
+    assert stt._pending == {}
+
+
+def test_webhook_route_checks_the_secret(stub_server, make_stt, monkeypatch):
+    monkeypatch.setenv("AGENT_WARMUP", "")
+    import main
+
+    stt = make_stt(AssemblyAIStub(stub_server), ASSEMBLYAI_WEBHOOK_SECRET="s3cret")
+    monkeypatch.setitem(main.agent_registry._instances, "stt_gen", stt)
+    client = main.app.test_client()
+    body = {"transcript_id": "t1", "status": "completed"}
+
+    assert client.post("/stt_webhook", json=body).status_code == 403
+    assert client.post("/stt_webhook", json=body, headers={"X-Webhook-Secret": "wrong"}).status_code == 403
+    event = stt._register("t1")
+    response = client.post("/stt_webhook", json=body, headers={"X-Webhook-Secret": "s3cret"})
+    assert response.get_json() == {"received": True}
+    assert event.is_set()